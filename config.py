@@ -8,23 +8,183 @@ BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DATA_DIR = os.path.join(BASE_DIR, "data")
 TRAIN_DIR = os.path.join(DATA_DIR, "train")
 VAL_DIR = os.path.join(DATA_DIR, "val")
+SHARDS_DIR = os.path.join(DATA_DIR, "shards")
+SHARDS_TRAIN_DIR = os.path.join(SHARDS_DIR, "train")
+SHARDS_VAL_DIR = os.path.join(SHARDS_DIR, "val")
 CHECKPOINT_DIR = os.path.join(BASE_DIR, "checkpoints")
 RESULTS_DIR = os.path.join(BASE_DIR, "results")
+GALLERY_DIR = os.path.join(BASE_DIR, "gallery")
+CACHE_DIR = os.path.join(BASE_DIR, "cache")
+# Caras alineadas (scripts/align_faces.py) con la misma estructura que train/val
+ALIGNED_DIR = os.path.join(DATA_DIR, "aligned")
+ALIGNED_TRAIN_DIR = os.path.join(ALIGNED_DIR, "train")
+ALIGNED_VAL_DIR = os.path.join(ALIGNED_DIR, "val")
 
 # Imagen de entrada (estándar en reconocimiento facial)
 IMAGE_SIZE = 112
 INPUT_CHANNELS = 3
 
+# Detección y alineado de caras (src/alignment.py): "none" (redimensionar la foto
+# completa), "center" (cara centrada), "landmarks" (5 puntos por imagen en
+# FACE_LANDMARKS_FILE, rutas relativas a DATA_DIR) u "onnx" (detector local
+# FACE_DETECTOR_MODEL con entrada FACE_DETECTOR_INPUT_SIZE). Con un detector activo
+# el entrenamiento lee ALIGNED_DIR y la inferencia alinea (y cachea) cada imagen
+FACE_DETECTOR = "none"
+FACE_LANDMARKS_FILE = os.path.join(DATA_DIR, "landmarks.txt")
+FACE_DETECTOR_MODEL = os.path.join(BASE_DIR, "models", "face_detector.onnx")
+FACE_DETECTOR_INPUT_SIZE = 640
+FACE_DETECTOR_THRESHOLD = 0.5
+ALIGN_BATCH_SIZE = 64
+
 # Modelo
 EMBEDDING_DIM = 128
+# Backbone (src/model.py BACKBONES): "cnn" (4 ConvBlock + Dense 12544 -> 128) o
+# "mobilefacenet" (convoluciones separables en profundidad + pooling global, ~4x menos
+# parámetros)
+BACKBONE = "cnn"
+# Destilación (train.py --distill): el alumno (BACKBONE) imita los embeddings del
+# modelo de DISTILL_TEACHER_DIR; pérdida = clasificación + DISTILL_WEIGHT * (1 - coseno).
+# Los checkpoints del alumno van a DISTILL_CHECKPOINT_DIR
+DISTILL_TEACHER_DIR = CHECKPOINT_DIR
+DISTILL_CHECKPOINT_DIR = os.path.join(BASE_DIR, "checkpoints_student")
+DISTILL_WEIGHT = 1.0
+# Cabeza de clasificación: "softmax" (Dense + entropía cruzada), "arcface" o "cosface"
+# (centros normalizados con margen angular/coseno, src/losses.py)
+HEAD = "softmax"
+MARGIN_SCALE = 64.0
+ARCFACE_MARGIN = 0.5
+COSFACE_MARGIN = 0.35
+# Partial FC: centros de identidad usados por paso con arcface/cosface
+# (0 = todos; p. ej. 10% de las identidades con cientos de miles de clases)
+PARTIAL_FC_SAMPLES = 0
 
 # Entrenamiento
 BATCH_SIZE = 4  # Reducido para datasets pequeños (ajustar a 32 con más datos)
 EPOCHS = 30
 LEARNING_RATE = 1e-3
+# Precisión mixta: "O0" (float32), "O2" (float16 salvo BatchNorm) u "O3" (todo float16).
+# Escalado de pérdida en O2/O3: "dynamic" o "fixed" (en CPU MindSpore solo admite
+# escala fija sin descartar pasos con overflow)
+AMP_LEVEL = "O0"
+LOSS_SCALE = "dynamic"
+LOSS_SCALE_VALUE = 2 ** 12
+# Dataset sink mode: los datos se envían al dispositivo en bloques de SINK_SIZE pasos
+# (-1 = época completa) en lugar de un viaje de ida y vuelta al host por paso
+DATASET_SINK_MODE = False
+SINK_SIZE = -1
+# Leer shards empaquetados (scripts/pack_shards.py) en lugar de JPEG sueltos
+USE_SHARDS = False
+
+# Muestreo equilibrado P×K por identidad (src/dataset.py): cada lote de BATCH_SIZE
+# imágenes tiene BATCH_SIZE / PK_IMAGES_PER_IDENTITY identidades con
+# PK_IMAGES_PER_IDENTITY imágenes cada una. Lotes por época (0 = identidades / P) y
+# número de listas de ficheros por identidad en caché
+BALANCED_SAMPLER = False
+PK_IMAGES_PER_IDENTITY = 2
+PK_BATCHES_PER_EPOCH = 0
+PK_LIST_CACHE = 100000
+
+# Pipeline de datos (MindSpore dataset): workers en total, repartidos entre las etapas
+# (lectura/decodificación, transformaciones y batch) según DATASET_STAGE_SPLIT (al
+# menos 1 por etapa), procesos Python en lugar de hilos para fuentes y operaciones
+# Python, profundidad de prefetch por etapa y memoria compartida entre procesos
+# (tamaño máximo de fila en MB). Prefetch y memoria compartida son opciones globales
+# del proceso: las aplica train.py una vez (src/dataset.configure_pipeline)
+DATASET_WORKERS = max(1, min(32, os.cpu_count() or 1))
+DATASET_STAGE_SPLIT = (0.5, 0.4, 0.1)
+DATASET_PYTHON_MULTIPROCESSING = False
+DATASET_PREFETCH_SIZE = 16
+DATASET_SHARED_MEM = True
+DATASET_MAX_ROWSIZE = 16
+
+# Checkpoints (src/checkpoints.py): número de recientes que se conservan (además del
+# mejor), escritura en segundo plano, métrica de validación del manifiesto, si es
+# mejor cuanto mayor ("max", p. ej. acc) o cuanto menor ("min", p. ej. loss) y
+# checkpoint que carga la inferencia ("best" o "latest")
+CHECKPOINT_KEEP = 3
+CHECKPOINT_ASYNC = True
+CHECKPOINT_METRIC = "acc"
+CHECKPOINT_METRIC_MODE = "max"
+CHECKPOINT_SELECT = "best"
+
+# Plegar BatchNorm en las convoluciones al cargar el modelo para inferencia
+FUSE_BN_INFERENCE = True
+
+# Grafo exportado del backbone (scripts/export_model.py) y directorio donde se escribe
+# y se busca al cargar el modelo (None = el directorio de checkpoints)
+EXPORT_NAME = "face_embedding"
+EXPORT_DIR = None
+# Usar el backbone cuantizado INT8 (scripts/quantize_model.py) para inferencia
+USE_QUANTIZED_MODEL = False
+QUANTIZED_NAME = EXPORT_NAME + ".int8"
+
+# Inferencia por lotes (get_embeddings)
+INFERENCE_BATCH_SIZE = 32
+# Hilos de decodificación de imágenes en evaluación/enrolado (0 = sin pool)
+DECODE_WORKERS = min(8, os.cpu_count() or 1)
+# Decodificación JPEG a resolución reducida (modo draft de PIL, escalado en el dominio
+# DCT) conservando al menos DECODE_DRAFT_FACTOR * IMAGE_SIZE px por lado antes del resize.
+# El entrenamiento decodifica a resolución completa: la entrada difiere ligeramente
+# (coseno de los embeddings >= 0.9998, scripts/bench_decode.py); False la iguala
+DECODE_DRAFT = True
+DECODE_DRAFT_FACTOR = 2
+
+# Caché en disco de imágenes preprocesadas y embeddings (expulsión LRU)
+CACHE_ENABLED = True
+CACHE_MAX_BYTES = 2 * 1024 ** 3
 
 # Verificación (umbral de similitud coseno para considerar "misma persona")
 VERIFICATION_THRESHOLD = 0.5
+# Benchmark ROC de todos los pares (test.py --roc): FAR objetivo para el umbral
+# recomendado, tamaño de bloque del producto matricial e intervalos del histograma
+VERIFICATION_TARGET_FAR = 1e-3
+ROC_BLOCK_SIZE = 4096
+ROC_BINS = 20000
+
+# Verificación en streaming (test.py --stream): fotogramas por lote, uno de cada
+# STREAM_FRAME_STRIDE procesado (con STREAM_TARGET_FPS > 0 el salto se ajusta solo
+# hasta STREAM_MAX_STRIDE para seguir ese ritmo), peso del fotograma nuevo en la
+# media exponencial y detección de caras cada STREAM_DETECT_EVERY fotogramas procesados
+STREAM_BATCH_SIZE = 8
+STREAM_FRAME_STRIDE = 1
+STREAM_TARGET_FPS = 30
+STREAM_MAX_STRIDE = 10
+STREAM_SMOOTHING = 0.3
+STREAM_DETECT_EVERY = 5
+
+# Identificación 1:N (número de candidatos devueltos por la galería)
+IDENTIFY_TOP_K = 5
+# Shards de la galería, cada uno buscado por un proceso (1 = un solo proceso,
+# src/gallery_shards.py)
+GALLERY_SHARDS = 1
+# Enrolado masivo (scripts/enroll.py): estado reanudable, capacidad de las colas entre
+# etapas (en lotes de INFERENCE_BATCH_SIZE) e imágenes entre puntos de control
+ENROLL_STATE_DIR = os.path.join(BASE_DIR, "enroll_state")
+ENROLL_QUEUE_BATCHES = 4
+ENROLL_CHECKPOINT_EVERY = 2048
+
+# Servicio de inferencia (serve.py): dirección y micro-batching dinámico
+SERVER_HOST = "127.0.0.1"
+SERVER_PORT = 8000
+SERVER_MAX_BATCH = 32
+SERVER_MAX_WAIT_MS = 5
+# Imágenes por ruta ("path"): None = solo se aceptan imágenes en base64 (image_b64);
+# un directorio = se aceptan rutas dentro de él (el servidor abre esos ficheros)
+SERVER_PATH_ROOT = None
+
+# Instrumentación de la inferencia (src/metrics.py): tiempos por etapa, contadores e
+# histogramas (límites en ms). Con METRICS_PROFILE además se guarda el desglose de
+# cada llamada (verify_pair, get_embeddings...) en METRICS_PROFILE_FILE
+METRICS_ENABLED = False
+METRICS_PROFILE = False
+METRICS_BUCKETS_MS = [0.1, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000]
+METRICS_PROFILE_FILE = os.path.join(RESULTS_DIR, "profile.jsonl")
+
+# Índice aproximado IVF-PQ (galerías muy grandes): listas, subcuantizadores, listas visitadas
+ANN_NLIST = 1024
+ANN_M = 16
+ANN_NPROBE = 16
+ANN_RERANK = 4  # re-ordenar k * ANN_RERANK candidatos con los embeddings exactos (0 = sin re-ranking)
 
 # Semilla para reproducibilidad
 SEED = 42
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Detecta y alinea las caras de data/train y data/val por lotes (src/alignment.py).
+Escribe los recortes IMAGE_SIZE x IMAGE_SIZE en data/aligned/<split>/<identidad>/
+(PNG, sin pérdidas) para el entrenamiento y los guarda en la caché de imágenes,
+de modo que la evaluación y la inferencia sobre las fotos originales reutilizan
+los mismos píxeles sin volver a detectar. Las imágenes ya alineadas con la misma
+configuración se omiten (se puede interrumpir y relanzar).
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import time
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import (
+    TRAIN_DIR, VAL_DIR, ALIGNED_DIR, ALIGNED_TRAIN_DIR, ALIGNED_VAL_DIR, ALIGN_BATCH_SIZE, DECODE_WORKERS, FACE_DETECTOR,
+)
+from src.alignment import FaceAligner, create_detector
+from src.cache import FaceCache
+from src.dataset import list_image_files
+from src.inference import _ordered_map
+
+SIGNATURE_FILE = "alignment.json"
+
+
+def _decode(path):
+    try:
+        return np.asarray(Image.open(path).convert("RGB"))
+    except Exception as e:
+        print(f"❌ Error al leer {path}: {e}")
+        return None
+
+
+def _aligned_path(data_dir, out_dir, path):
+    rel = os.path.relpath(path, data_dir)
+    return os.path.join(out_dir, os.path.splitext(rel)[0] + ".png")
+
+
+def align_directory(aligner, data_dir, out_dir, batch_size=None, workers=None, cache=None):
+    """
+    Alinea data_dir/<identidad>/<imagen> en out_dir/<identidad>/<imagen>.png.
+    Devuelve (imágenes alineadas, ya existentes, errores).
+    """
+    batch_size = batch_size or ALIGN_BATCH_SIZE
+    workers = DECODE_WORKERS if workers is None else workers
+    paths, _, identities = list_image_files(data_dir)
+    for identity in identities:
+        # Misma estructura que el original (incluidas identidades sin imágenes)
+        os.makedirs(os.path.join(out_dir, identity), exist_ok=True)
+    todo = [p for p in paths if not os.path.isfile(_aligned_path(data_dir, out_dir, p))]
+    done = errors = 0
+
+    def flush(batch):
+        crops = aligner.align([image for _, image in batch], [path for path, _ in batch])
+        for (path, _), crop in zip(batch, crops):
+            if cache is not None:
+                cache.put_image(path, crop)
+            out = _aligned_path(data_dir, out_dir, path)
+            tmp = out + ".tmp.png"
+            Image.fromarray(crop).save(tmp)
+            os.replace(tmp, out)
+        batch.clear()
+
+    batch = []
+    for path, image in zip(todo, _ordered_map(_decode, todo, workers)):
+        if image is None:
+            errors += 1
+            continue
+        batch.append((path, image))
+        if len(batch) == batch_size:
+            done += len(batch)
+            flush(batch)
+            print(f"   {done}/{len(todo)} imágenes")
+    if batch:
+        done += len(batch)
+        flush(batch)
+    return done, len(paths) - len(todo), errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Detectar y alinear caras de train/val")
+    parser.add_argument("--detector", default=None, help="center, landmarks u onnx (default: FACE_DETECTOR)")
+    parser.add_argument("--batch-size", type=int, default=None, help="Imágenes por lote de detección")
+    parser.add_argument("--workers", type=int, default=None, help="Hilos de decodificación (default: DECODE_WORKERS)")
+    parser.add_argument("--no-cache", action="store_true", help="No guardar los recortes en la caché de inferencia")
+    args = parser.parse_args()
+
+    if not args.detector and FACE_DETECTOR == "none":
+        print("FACE_DETECTOR = 'none' en config.py: indica --detector (center, landmarks u onnx).")
+        return
+    detector = create_detector(args.detector)
+    aligner = FaceAligner(detector)
+    signature = aligner.signature()
+    cache = None if args.no_cache else FaceCache(variant=signature)
+
+    # Con otra configuración de alineado los recortes existentes no valen
+    signature_path = os.path.join(ALIGNED_DIR, SIGNATURE_FILE)
+    if os.path.isfile(signature_path):
+        with open(signature_path) as f:
+            previous = json.load(f).get("signature")
+        if previous != signature:
+            print(f"Alineado distinto ({previous}); se regeneran los recortes de {ALIGNED_DIR}")
+            for d in (ALIGNED_TRAIN_DIR, ALIGNED_VAL_DIR):
+                shutil.rmtree(d, ignore_errors=True)
+    os.makedirs(ALIGNED_DIR, exist_ok=True)
+    with open(signature_path, "w") as f:
+        json.dump({"signature": signature, "detector": detector.name}, f, indent=1)
+
+    t0 = time.perf_counter()
+    total = 0
+    for name, src, dst in (("train", TRAIN_DIR, ALIGNED_TRAIN_DIR), ("val", VAL_DIR, ALIGNED_VAL_DIR)):
+        if os.path.isdir(src):
+            print(f"\n📁 Alineando {name}: {src} -> {dst}")
+            done, skipped, errors = align_directory(aligner, src, dst, args.batch_size, args.workers, cache)
+            total += done
+            print(f"   → {done} alineadas, {skipped} ya existentes, {errors} errores")
+    elapsed = time.perf_counter() - t0
+    print(
+        f"\nDetector {detector.name}: {aligner.detected} caras detectadas, {aligner.fallbacks} sin detección "
+        f"(recorte centrado) | {total / elapsed if elapsed > 0 else 0:.1f} imágenes/s"
+    )
+    print(f"Con FACE_DETECTOR = {detector.name!r} en config.py, train.py lee {ALIGNED_DIR}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark del índice aproximado IVF-PQ frente a la búsqueda exacta de la galería:
+recall@k, consultas por segundo (QPS) y memoria, para varios valores de nprobe.
+Usa embeddings sintéticos agrupados (128-d, L2 normalizados) o una galería guardada.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import EMBEDDING_DIM, ANN_NLIST, ANN_M, ANN_RERANK, SEED
+from src.ann import IVFPQIndex
+from src.gallery import FaceGallery, l2_normalize
+
+
+def synthetic_gallery(n, dim, num_ids, rng):
+    """Embeddings tipo rostro: varias muestras ruidosas alrededor de cada identidad."""
+    centers = l2_normalize(rng.standard_normal((num_ids, dim)).astype(np.float32))
+    labels = rng.integers(0, num_ids, n)
+    noise = rng.standard_normal((n, dim)).astype(np.float32) * (0.5 / np.sqrt(dim))
+    return l2_normalize(centers[labels] + noise)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark IVF-PQ vs búsqueda exacta")
+    parser.add_argument("--gallery-dir", default=None, help="Usar una galería guardada en lugar de datos sintéticos")
+    parser.add_argument("--size", type=int, default=200000, help="Tamaño de la galería sintética")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--nlist", type=int, default=ANN_NLIST)
+    parser.add_argument("--m", type=int, default=ANN_M)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 8, 16, 32, 64])
+    parser.add_argument("--rerank", type=int, default=ANN_RERANK or 4)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(SEED)
+    if args.gallery_dir:
+        gallery = FaceGallery.load(args.gallery_dir, mmap=False)
+    else:
+        emb = synthetic_gallery(args.size, EMBEDDING_DIM, max(args.size // 20, 1), rng)
+        gallery = FaceGallery(emb, np.zeros(len(emb), dtype=np.int32), ["sintético"])
+    n = len(gallery)
+    picks = rng.choice(n, args.queries, replace=n < args.queries)
+    queries = l2_normalize(gallery.embeddings[picks] + 0.02 * rng.standard_normal((args.queries, gallery.embedding_dim)))
+    print(f"Galería: {n} x {gallery.embedding_dim} | consultas: {args.queries} | k={args.k}")
+
+    # Búsqueda exacta: una consulta cada vez (caso torno de acceso)
+    t0 = time.perf_counter()
+    truth = np.concatenate([gallery.search(q, k=args.k, exact=True)[0] for q in queries])
+    exact_qps = args.queries / (time.perf_counter() - t0)
+
+    t0 = time.perf_counter()
+    index = IVFPQIndex(nlist=args.nlist, m=args.m).train(gallery.embeddings)
+    index.add(gallery.embeddings)
+    print(f"Entrenamiento + inserción IVF-PQ: {time.perf_counter() - t0:.1f} s")
+    print(f"Memoria: exacta {gallery.embeddings.nbytes / 2**20:.1f} MiB | IVF-PQ {index.memory_bytes() / 2**20:.1f} MiB")
+
+    gallery.index = index
+
+    print(f"{'método':<24}{'recall@' + str(args.k):>12}{'QPS':>12}{'speedup':>10}")
+    print(f"{'exacta':<24}{1.0:>12.3f}{exact_qps:>12.1f}{1.0:>10.2f}")
+    for nprobe in args.nprobe:
+        for rerank in (0, args.rerank):
+            t0 = time.perf_counter()
+            found = np.concatenate([
+                gallery.search(q, k=args.k, nprobe=nprobe, rerank=rerank)[0] for q in queries
+            ])
+            qps = args.queries / (time.perf_counter() - t0)
+            recall = np.mean([len(set(f) & set(t)) / args.k for f, t in zip(found, truth)])
+            name = f"nprobe={nprobe}" + (f" rerank={rerank}" if rerank else "")
+            print(f"{name:<24}{recall:>12.3f}{qps:>12.1f}{qps / exact_qps:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
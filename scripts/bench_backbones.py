@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tabla de backbones (src/model.py BACKBONES) en CPU: parámetros, latencia de
+inferencia (BatchNorm plegado, lote 1 y lote N), exportación a ONNX (tamaño y
+coseno mínimo frente a MindSpore con onnxruntime) y, para los que tienen
+checkpoint (--checkpoints nombre=directorio), accuracy de clasificación y EER de
+verificación sobre data/val. Con --checkpoints cnn=checkpoints
+mobilefacenet=checkpoints_student compara el profesor con el alumno destilado.
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import mindspore as ms
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import EMBEDDING_DIM, IMAGE_SIZE, VAL_DIR, SEED
+from src.dataset import list_image_files
+from src.evaluation import evaluate
+from src.export import ExportedEmbeddingModel, export_backbone
+from src.inference import load_embedding_model
+from src.model import BACKBONES, create_backbone, fold_batchnorm
+from src.verification import verification_report
+
+
+def latency_ms(net, x, runs):
+    net(x).asnumpy()  # calentamiento
+    times = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        net(x).asnumpy()
+        times.append(time.perf_counter() - t0)
+    return 1000.0 * float(np.median(times))
+
+
+def onnx_export(net, x):
+    """
+    Exporta net a ONNX: (MiB, coseno mínimo entre sus embeddings y los de MindSpore, o
+    "-" sin onnxruntime). Se compara el coseno y no la diferencia absoluta porque con
+    pesos aleatorios las activaciones son tan pequeñas que el epsilon de la
+    normalización L2 domina la escala.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        path = export_backbone(net, os.path.join(tmp, "backbone"), "ONNX", batch_size=x.shape[0])
+        size = os.path.getsize(path) / 2**20
+        try:
+            exported = ExportedEmbeddingModel(path)
+        except ImportError:
+            return size, "-"
+        a, b = exported.get_embedding(x).asnumpy(), net(x).asnumpy()
+        cos = (a * b).sum(1) / (np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1) + 1e-30)
+        return size, f"{cos.min():.5f}"
+
+
+def accuracy(checkpoint_dir, data_dir):
+    """(accuracy de clasificación, EER de verificación) del modelo de checkpoint_dir."""
+    net = load_embedding_model(checkpoint_dir)
+    metrics, embeddings, _ = evaluate(net, data_dir)
+    _, labels, _ = list_image_files(data_dir)
+    report = verification_report(embeddings, labels)
+    return metrics["accuracy"], report["eer"], type(net.backbone).__name__
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latencia, parámetros y accuracy por backbone")
+    parser.add_argument("--backbones", nargs="+", default=list(BACKBONES), choices=list(BACKBONES))
+    parser.add_argument("--batch-size", type=int, default=8, help="Lote grande de la medida de latencia")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--checkpoints", nargs="*", default=[], metavar="NOMBRE=DIR",
+                        help="Checkpoints entrenados por backbone para medir accuracy")
+    parser.add_argument("--data-dir", default=VAL_DIR)
+    args = parser.parse_args()
+
+    checkpoints = dict(item.split("=", 1) for item in args.checkpoints)
+    rng = np.random.default_rng(SEED)
+    x1 = ms.Tensor(rng.standard_normal((1, 3, IMAGE_SIZE, IMAGE_SIZE)).astype(np.float32))
+    xn = ms.Tensor(rng.standard_normal((args.batch_size, 3, IMAGE_SIZE, IMAGE_SIZE)).astype(np.float32))
+    print(f"{'backbone':<16}{'parámetros':>12}{'ms lote 1':>11}{f'ms/img lote {args.batch_size}':>16}"
+          f"{'ONNX MiB':>10}{'ONNX cos':>10}{'accuracy':>10}{'EER':>8}")
+    for name in args.backbones:
+        net = create_backbone(name, embedding_dim=EMBEDDING_DIM)
+        params = sum(p.size for p in net.trainable_params())
+        net.set_train(False)
+        fused = fold_batchnorm(net)
+        t1 = latency_ms(fused, x1, args.runs)
+        tn = latency_ms(fused, xn, args.runs) / args.batch_size
+        onnx_mib, onnx_diff = onnx_export(fused, xn)
+        acc, eer = "-", "-"
+        if name in checkpoints:
+            value, rate, loaded = accuracy(checkpoints[name], args.data_dir)
+            if loaded != type(net).__name__:
+                print(f"Aviso: {checkpoints[name]} contiene un backbone {loaded}, no {name}")
+            acc, eer = f"{value:.3f}", f"{rate:.3f}"
+        print(f"{name:<16}{params:>12,}{t1:>11.1f}{tn:>16.1f}{onnx_mib:>10.1f}{onnx_diff:>10}{acc:>10}{eer:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark de lectura del dataset de entrenamiento: JPEG por fichero
+(ImageFolderDataset) frente a shards empaquetados (scripts/pack_shards.py).
+Informa de muestras/segundo del pipeline completo (lectura + transformaciones + batch).
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from config import TRAIN_DIR, BATCH_SIZE, SHARDS_TRAIN_DIR
+from src.dataset import configure_pipeline, create_train_dataset, SHARD_INDEX_FILE
+from pack_shards import pack_directory
+
+
+def samples_per_second(dataset, epochs):
+    """Recorre el dataset epochs veces y devuelve muestras/s."""
+    n = 0
+    t0 = time.perf_counter()
+    for _ in range(epochs):
+        for batch in dataset.create_tuple_iterator(num_epochs=1, output_numpy=True):
+            n += batch[0].shape[0]
+    return n / (time.perf_counter() - t0), n
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark JPEG vs shards empaquetados")
+    parser.add_argument("--data-dir", default=TRAIN_DIR)
+    parser.add_argument("--shard-dir", default=None, help="Shards ya empaquetados (default: empaquetar en temporal)")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--epochs", type=int, default=2)
+    args = parser.parse_args()
+    configure_pipeline()
+
+    shard_dir = args.shard_dir
+    if shard_dir is None:
+        if os.path.isfile(os.path.join(SHARDS_TRAIN_DIR, SHARD_INDEX_FILE)) and args.data_dir == TRAIN_DIR:
+            shard_dir = SHARDS_TRAIN_DIR
+        else:
+            shard_dir = tempfile.mkdtemp(prefix="bench_shards_")
+            t0 = time.perf_counter()
+            pack_directory(args.data_dir, shard_dir)
+            print(f"Empaquetado (una vez): {time.perf_counter() - t0:.1f} s")
+
+    jpeg_rate, n = samples_per_second(create_train_dataset(args.data_dir, args.batch_size), args.epochs)
+    shard_rate, _ = samples_per_second(create_train_dataset(batch_size=args.batch_size, shard_dir=shard_dir), args.epochs)
+    print(f"Muestras por época x {args.epochs} épocas: {n}")
+    print(f"{'fuente':<12}{'muestras/s':>14}")
+    print(f"{'JPEG':<12}{jpeg_rate:>14.1f}")
+    print(f"{'shards':<12}{shard_rate:>14.1f}")
+    print(f"Speedup: {shard_rate / jpeg_rate:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark del pipeline de datos por etapas (sin modelo), sobre las mismas etapas
+que comprueba debug_dataset.py: lectura de ficheros, decodificación JPEG,
+transformaciones y batch. Informa de imágenes/segundo acumuladas hasta cada etapa
+para distintos números de workers; la etapa en la que cae el ritmo es el cuello
+de botella.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import mindspore.dataset as ds
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import TRAIN_DIR, BATCH_SIZE, DATASET_WORKERS
+from src.dataset import (
+    IMAGE_EXTENSIONS,
+    _parallel_options,
+    configure_pipeline,
+    create_train_dataset,
+    get_train_transforms,
+)
+
+
+def _source(data_dir, decode, workers):
+    return ds.ImageFolderDataset(
+        data_dir, decode=decode, shuffle=True, extensions=IMAGE_EXTENSIONS, num_parallel_workers=workers
+    )
+
+
+def build_stages(data_dir, batch_size, workers):
+    """
+    Pipelines acumulativos: (nombre, dataset, filas por iteración = imágenes), con
+    workers en total repartidos entre etapas como en src/dataset.py.
+    """
+    (source_workers, map_workers, _), _ = _parallel_options(workers)
+    transformed = _source(data_dir, True, source_workers).map(
+        get_train_transforms(), input_columns="image", num_parallel_workers=map_workers
+    )
+    return [
+        ("lectura", _source(data_dir, False, source_workers), 1),
+        ("decodificación", _source(data_dir, True, source_workers), 1),
+        ("transformaciones", transformed, 1),
+        ("batch", create_train_dataset(data_dir, batch_size, workers=workers), batch_size),
+    ]
+
+
+def images_per_second(dataset, rows, epochs):
+    """Recorre el dataset epochs veces (la primera se descarta como calentamiento)."""
+    for _ in dataset.create_tuple_iterator(num_epochs=1, output_numpy=True):
+        pass
+    n = 0
+    t0 = time.perf_counter()
+    for _ in range(epochs):
+        for _ in dataset.create_tuple_iterator(num_epochs=1, output_numpy=True):
+            n += rows
+    return n / (time.perf_counter() - t0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Imágenes/s por etapa del pipeline de datos")
+    parser.add_argument("--data-dir", default=TRAIN_DIR)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--epochs", type=int, default=2)
+    parser.add_argument("--workers", default=f"1,{DATASET_WORKERS}", help="Lista de workers en total, p. ej. 1,4,16")
+    parser.add_argument("--prefetch", type=int, default=None, help="Profundidad de prefetch (default: config)")
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.data_dir):
+        print(f"No existe {args.data_dir}")
+        return
+    configure_pipeline(prefetch_size=args.prefetch)
+    workers_list = sorted({max(1, min(int(w), os.cpu_count() or 1)) for w in args.workers.split(",")})
+    print(f"Datos: {args.data_dir} | batch {args.batch_size} | CPUs: {os.cpu_count()}")
+    print(f"{'etapa':<18}" + "".join(f"{f'w={w}':>12}" for w in workers_list))
+    results = {w: build_stages(args.data_dir, args.batch_size, w) for w in workers_list}
+    names = [name for name, _, _ in results[workers_list[0]]]
+    for i, name in enumerate(names):
+        rates = [images_per_second(results[w][i][1], results[w][i][2], args.epochs) for w in workers_list]
+        print(f"{name:<18}" + "".join(f"{r:>12.1f}" for r in rates))
+    print("(imágenes/s acumuladas hasta cada etapa)")
+
+
+if __name__ == "__main__":
+    main()
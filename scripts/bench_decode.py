@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark del preprocesado de inferencia: ruta anterior (decodificación completa,
+ida y vuelta uint8 -> float32 -> uint8, resize y normalización con copias) frente a
+la actual (decodificación reducida en modo draft de JPEG y normalización directa en
+el buffer de lote). Usa fotos grandes (12 MP por defecto) generadas a partir de
+data/val (o sintéticas) y comprueba la equivalencia de las imágenes y, con
+--embeddings N, de los embeddings de N fotos.
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from bench_utils import benchmark_images, load_model_or_random, timed
+from config import VAL_DIR, IMAGE_SIZE, SEED
+import src.inference as inference
+from src.inference import MEAN, STD, _preprocess_image, get_embeddings
+
+
+def legacy_preprocess(path):
+    """Preprocesado anterior, reproducido para comparar."""
+    pil = Image.open(path).convert("RGB")
+    arr = np.array(pil, dtype=np.float32) / 255.0
+    img = Image.fromarray((arr * 255).astype(np.uint8))
+    img = img.resize((IMAGE_SIZE, IMAGE_SIZE), Image.BILINEAR)
+    arr = np.array(img).astype(np.float32) / 255.0
+    arr = np.transpose(arr, (2, 0, 1))
+    return (arr - MEAN.reshape(3, 1, 1)) / STD.reshape(3, 1, 1)
+
+
+def large_photos(data_dir, count, size, directory):
+    """Fotos JPEG de size (ancho, alto) ampliando imágenes de data_dir (o ruido suave)."""
+    rng = np.random.default_rng(SEED)
+    sources = benchmark_images(data_dir, count) if data_dir and os.path.isdir(data_dir) else []
+    paths = []
+    for i in range(count):
+        if sources:
+            base = Image.open(sources[i]).convert("RGB")
+        else:
+            base = Image.fromarray(rng.integers(0, 256, (48, 64, 3), dtype=np.uint8))
+        path = os.path.join(directory, f"foto_{i:04d}.jpg")
+        base.resize(size, Image.BICUBIC).save(path, "JPEG", quality=92)
+        paths.append(path)
+    return paths
+
+
+def run(paths, fn):
+    buffer = np.empty((len(paths), 3, IMAGE_SIZE, IMAGE_SIZE), dtype=np.float32)
+    for i, path in enumerate(paths):
+        fn(path, buffer[i])
+    return buffer
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de decodificación reducida de JPEG")
+    parser.add_argument("--images", type=int, default=16)
+    parser.add_argument("--width", type=int, default=4000)
+    parser.add_argument("--height", type=int, default=3000)
+    parser.add_argument("--data-dir", default=VAL_DIR)
+    parser.add_argument("--embeddings", type=int, default=0, help="Comparar los embeddings de N fotos (usa el modelo)")
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix="bench_decode_")
+    paths = large_photos(args.data_dir, args.images, (args.width, args.height), directory)
+    print(f"{len(paths)} fotos {args.width}x{args.height} en {directory}")
+
+    def legacy(path, out):
+        out[...] = legacy_preprocess(path)
+
+    def current(path, out):
+        _preprocess_image(path, out=out)
+
+    results, base_ms = {}, None
+    print(f"{'ruta':<28}{'ms/img':>10}{'speedup':>10}{'máx |dif|':>12}{'media |dif|':>13}")
+    for name, fn, draft in (("anterior", legacy, False), ("actual sin draft", current, False),
+                            ("actual con draft", current, True)):
+        inference.DECODE_DRAFT = draft
+        results[name], seconds = timed(run, paths, fn, repeat=2)
+        ms_img = 1000.0 * seconds / len(paths)
+        base_ms = base_ms or ms_img
+        diff = np.abs(results[name] - results["anterior"])
+        print(f"{name:<28}{ms_img:>10.2f}{base_ms / ms_img:>10.2f}{diff.max():>12.4f}{diff.mean():>13.5f}")
+
+    if args.embeddings:
+        model = load_model_or_random()
+        subset = paths[:args.embeddings]
+        a, b = (
+            model.get_embedding(inference.ms.Tensor(results[name][:len(subset)])).asnumpy()
+            for name in ("anterior", "actual con draft")
+        )
+        cos = np.sum(a * b, axis=1) / (np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1) + 1e-8)
+        print(f"Coseno entre embeddings (anterior vs draft): mín {cos.min():.5f} | media {cos.mean():.5f}")
+        inference.DECODE_DRAFT = True
+        full = get_embeddings(model, subset, batch_size=len(subset))
+        cos = np.sum(full * b, axis=1) / (np.linalg.norm(full, axis=1) * np.linalg.norm(b, axis=1) + 1e-8)
+        print(f"get_embeddings (buffer de lote) vs draft: mín {cos.min():.6f}")
+    shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
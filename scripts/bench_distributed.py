@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark de escalado del entrenamiento con paralelismo de datos: lanza train.py
+con 1, 2 y 4 procesos locales (scripts/train_distributed.py) y compara muestras/s
+(sin el primer paso de compilación). Los checkpoints van a un directorio temporal.
+"""
+
+import argparse
+import os
+import re
+import shutil
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from train_distributed import launch
+
+
+def run(nproc, epochs, master_port):
+    """Entrena con nproc procesos y devuelve las muestras/s del proceso 0 (None si falla)."""
+    tmp = tempfile.mkdtemp(prefix="bench_dist_")
+    try:
+        log_dir = os.path.join(tmp, "logs")
+        code = launch(
+            nproc, ["--epochs", str(epochs), "--checkpoint-dir", os.path.join(tmp, "ckpt")],
+            master_port=master_port, log_dir=log_dir,
+        )
+        with open(os.path.join(log_dir, "worker_0.log"), errors="replace") as f:
+            found = re.findall(r"Rendimiento: ([\d.]+) muestras/s", f.read())
+        return float(found[-1]) if code == 0 and found else None
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Escalado del entrenamiento distribuido")
+    parser.add_argument("--nprocs", default="1,2,4", help="Lista de números de procesos")
+    parser.add_argument("--epochs", type=int, default=2)
+    parser.add_argument("--master-port", type=int, default=8118)
+    args = parser.parse_args()
+
+    results = []
+    for nproc in [int(n) for n in args.nprocs.split(",")]:
+        results.append((nproc, run(nproc, args.epochs, args.master_port)))
+    base = results[0][1]
+    print(f"CPUs: {os.cpu_count()}")
+    print(f"{'procesos':<10}{'muestras/s':>14}{'speedup':>10}{'eficiencia':>12}")
+    for nproc, rate in results:
+        if rate is None:
+            print(f"{nproc:<10}{'error':>14}")
+            continue
+        speedup = rate / base if base else float("nan")
+        print(f"{nproc:<10}{rate:>14.1f}{speedup:>10.2f}{speedup / nproc * results[0][0]:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark de extracción de embeddings: bucle imagen a imagen (get_embedding)
+frente a la API por lotes (get_embeddings).
+"""
+
+import argparse
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from config import VAL_DIR
+from src.inference import get_embedding, get_embeddings
+from bench_utils import benchmark_images, load_model_or_random, timed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de throughput de embeddings")
+    parser.add_argument("--data-dir", default=VAL_DIR, help="Árbol de imágenes (default: data/val)")
+    parser.add_argument("--num-images", type=int, default=256)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[8, 32, 64])
+    args = parser.parse_args()
+
+    model = load_model_or_random()
+    paths = benchmark_images(args.data_dir, args.num_images)
+    n = len(paths)
+    print(f"Imágenes: {n}")
+
+    # Calentamiento (compilación del grafo)
+    get_embedding(model, paths[0])
+    loop_embs, t_loop = timed(lambda: np.stack([get_embedding(model, p) for p in paths]))
+    print(f"{'modo':<16}{'img/s':>10}{'seg':>10}{'speedup':>10}")
+    print(f"{'por imagen':<16}{n / t_loop:>10.1f}{t_loop:>10.2f}{1.0:>10.2f}")
+
+    for bs in args.batch_sizes:
+        get_embeddings(model, paths[:bs], batch_size=bs)
+        embs, t = timed(get_embeddings, model, paths, batch_size=bs)
+        max_diff = float(np.abs(embs - loop_embs).max())
+        print(f"{'lote=' + str(bs):<16}{n / t:>10.1f}{t:>10.2f}{t_loop / t:>10.2f}  (max |Δ| = {max_diff:.2e})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Comprueba que el backbone con BatchNorm plegado (fold_batchnorm) da embeddings
+numéricamente equivalentes al original y mide la latencia de ambos, para cada
+backbone registrado (src/model.BACKBONES). El del checkpoint usa sus pesos; el
+resto (o todos, sin checkpoint) pesos aleatorios con estadísticas de BatchNorm no
+triviales. Además del embedding normalizado se compara el embedding sin normalizar
+(embed_features) en error relativo, que no se esconde tras activaciones pequeñas.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import mindspore as ms
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import CHECKPOINT_DIR, IMAGE_SIZE, EMBEDDING_DIM, SEED
+from src.inference import load_embedding_model
+from src.model import BACKBONES, _bn_units, create_backbone, fold_batchnorm
+
+
+def random_backbone(name, rng):
+    """Backbone con estadísticas de BatchNorm aleatorias (para que el plegado no sea trivial)."""
+    net = create_backbone(name, embedding_dim=EMBEDDING_DIM)
+    for block in _bn_units(net):
+        c = block.bn.gamma.shape[0]
+        block.bn.gamma.set_data(ms.Tensor(rng.uniform(0.5, 2.0, c).astype(np.float32)))
+        block.bn.beta.set_data(ms.Tensor(rng.normal(0.0, 0.5, c).astype(np.float32)))
+        block.bn.moving_mean.set_data(ms.Tensor(rng.normal(0.0, 0.5, c).astype(np.float32)))
+        block.bn.moving_variance.set_data(ms.Tensor(rng.uniform(0.5, 2.0, c).astype(np.float32)))
+    net.set_train(False)
+    return net
+
+
+def latency(net, x, runs):
+    net(x).asnumpy()  # calentamiento
+    t0 = time.perf_counter()
+    for _ in range(runs):
+        net(x).asnumpy()
+    return (time.perf_counter() - t0) / runs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Equivalencia y latencia: BatchNorm plegado")
+    parser.add_argument("--checkpoint-dir", default=CHECKPOINT_DIR)
+    parser.add_argument("--backbones", nargs="+", default=list(BACKBONES), choices=list(BACKBONES))
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 32])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--atol", type=float, default=1e-5, help="Tolerancia absoluta del embedding normalizado")
+    parser.add_argument("--rtol", type=float, default=1e-4, help="Tolerancia relativa del embedding sin normalizar")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(SEED)
+    try:
+        trained = load_embedding_model(args.checkpoint_dir, fuse_bn=False).backbone
+    except FileNotFoundError:
+        print("Sin checkpoint: usando pesos aleatorios.")
+        trained = None
+
+    print(f"{'backbone':<16}{'pesos':<12}{'lote':>6}{'original ms':>14}{'plegado ms':>14}{'speedup':>10}"
+          f"{'max |Δ|':>12}{'rel Δ':>12}")
+    for name in args.backbones:
+        if trained is not None and isinstance(trained, BACKBONES[name]):
+            backbone, weights = trained, "checkpoint"
+        else:
+            backbone, weights = random_backbone(name, rng), "aleatorios"
+        fused = fold_batchnorm(backbone)
+        for bs in args.batch_sizes:
+            x = ms.Tensor(rng.standard_normal((bs, 3, IMAGE_SIZE, IMAGE_SIZE)).astype(np.float32))
+            diff = float(np.abs(backbone(x).asnumpy() - fused(x).asnumpy()).max())
+            ref = backbone.embed_features(x).asnumpy()
+            rel = float(np.abs(ref - fused.embed_features(x).asnumpy()).max() / (np.abs(ref).max() + 1e-30))
+            if diff > args.atol or rel > args.rtol:
+                raise AssertionError(
+                    f"{name}: embeddings no equivalentes (max |Δ| = {diff:.2e}, rel Δ = {rel:.2e})"
+                )
+            t_orig, t_fused = latency(backbone, x, args.runs), latency(fused, x, args.runs)
+            print(f"{name:<16}{weights:<12}{bs:>6}{t_orig * 1e3:>14.2f}{t_fused * 1e3:>14.2f}"
+                  f"{t_orig / t_fused:>10.2f}{diff:>12.2e}{rel:>12.2e}")
+    print("Equivalencia OK")
+
+
+if __name__ == "__main__":
+    main()
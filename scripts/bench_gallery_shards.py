@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark de la galería repartida en shards (src/gallery_shards.py): consultas por
+segundo (QPS) de search e identify según el número de shards, frente a la galería
+en un solo proceso. Comprueba además que los resultados coinciden con la búsqueda
+exacta. Con N shards cada proceso usa CPUs / N hilos de BLAS.
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from bench_ann import synthetic_gallery
+from config import EMBEDDING_DIM, SEED
+from src.gallery import FaceGallery, l2_normalize
+from src.gallery_shards import ShardedGallery, save_sharded
+
+
+def measure(gallery, queries, k, batch):
+    """QPS de search (uno a uno y en lotes de batch) e identify uno a uno."""
+    t0 = time.perf_counter()
+    single = [gallery.search(q, k=k)[0][0] for q in queries]
+    single_qps = len(queries) / (time.perf_counter() - t0)
+    t0 = time.perf_counter()
+    batched = np.concatenate([gallery.search(queries[i:i + batch], k=k)[0] for i in range(0, len(queries), batch)])
+    batch_qps = len(queries) / (time.perf_counter() - t0)
+    t0 = time.perf_counter()
+    identified = [gallery.identify(q, k=k) for q in queries]
+    identify_qps = len(queries) / (time.perf_counter() - t0)
+    return np.stack(single), batched, identified, (single_qps, batch_qps, identify_qps)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de la galería repartida en shards")
+    parser.add_argument("--size", type=int, default=500000, help="Tamaño de la galería sintética")
+    parser.add_argument("--identities", type=int, default=None, help="Identidades (default: size / 20)")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--batch", type=int, default=32, help="Consultas por lote en search por lotes")
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 2, 4])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(SEED)
+    num_ids = args.identities or max(args.size // 20, 1)
+    emb = synthetic_gallery(args.size, EMBEDDING_DIM, num_ids, rng)
+    labels = rng.integers(0, num_ids, args.size).astype(np.int32)
+    gallery = FaceGallery(emb, labels, [f"id_{i:06d}" for i in range(num_ids)])
+    picks = rng.choice(args.size, args.queries, replace=args.size < args.queries)
+    queries = l2_normalize(emb[picks] + 0.02 * rng.standard_normal((args.queries, EMBEDDING_DIM)))
+    print(f"Galería: {args.size} x {EMBEDDING_DIM}, {num_ids} identidades | consultas: {args.queries} | "
+          f"k={args.k} | CPUs: {os.cpu_count()}")
+
+    truth, _, truth_ids, base = measure(gallery, queries, args.k, args.batch)
+    print(f"{'galería':<16}{'search QPS':>12}{'lote QPS':>12}{'identify QPS':>14}{'iguales':>10}")
+    print(f"{'un proceso':<16}{base[0]:>12.1f}{base[1]:>12.1f}{base[2]:>14.1f}{'-':>10}")
+
+    root = tempfile.mkdtemp(prefix="bench_gallery_shards_")
+    try:
+        for num_shards in args.shards:
+            directory = os.path.join(root, f"shards-{num_shards}")
+            save_sharded(gallery, num_shards, directory)
+            with ShardedGallery(directory) as sharded:
+                sharded.search(queries[0], k=args.k)  # calentamiento
+                single, batched, identified, qps = measure(sharded, queries, args.k, args.batch)
+            same = (
+                np.array_equal(np.sort(single, axis=1), np.sort(truth, axis=1))
+                and np.array_equal(np.sort(batched, axis=1), np.sort(truth, axis=1))
+                and [[n for n, _ in r] for r in identified] == [[n for n, _ in r] for r in truth_ids]
+            )
+            print(f"{f'{num_shards} shards':<16}{qps[0]:>12.1f}{qps[1]:>12.1f}{qps[2]:>14.1f}{'sí' if same else 'NO':>10}")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
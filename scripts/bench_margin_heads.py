@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark de memoria y tiempo por paso de la cabeza de clasificación frente al
+número de identidades: softmax (Dense), ArcFace con todos los centros y ArcFace
+con Partial FC (centros muestreados). Se entrena solo la cabeza sobre embeddings
+fijos (el backbone no depende del número de clases); cada configuración corre en
+un proceso aparte para medir su pico de memoria (RSS).
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import EMBEDDING_DIM, MARGIN_SCALE
+
+
+def _rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def run_worker(head, num_classes, batch_size, num_sampled, steps):
+    """Entrena la cabeza steps pasos (modo grafo) e imprime un JSON con tiempos y memoria."""
+    import mindspore as ms
+    import numpy as np
+    from mindspore import nn
+
+    from src.losses import MarginSoftmaxLoss
+    from src.model import CosineClassifier
+
+    ms.set_context(mode=ms.GRAPH_MODE, device_target="CPU")
+    rng = np.random.default_rng(0)
+    emb = rng.standard_normal((batch_size, EMBEDDING_DIM)).astype(np.float32)
+    emb /= np.linalg.norm(emb, axis=1, keepdims=True)
+    x = ms.Tensor(emb)
+    y = ms.Tensor(rng.integers(0, num_classes, batch_size).astype(np.int32))
+
+    if head == "softmax":
+        cell = nn.WithLossCell(
+            nn.Dense(EMBEDDING_DIM, num_classes), nn.SoftmaxCrossEntropyWithLogits(sparse=True, reduction="mean")
+        )
+    else:
+        classifier = CosineClassifier(EMBEDDING_DIM, num_classes, scale=MARGIN_SCALE)
+        loss = MarginSoftmaxLoss(num_classes, batch_size, head=head, scale=MARGIN_SCALE, num_sampled=num_sampled)
+
+        class HeadCell(nn.Cell):
+            def __init__(self):
+                super().__init__()
+                self.classifier = classifier
+                self.loss = loss
+
+            def construct(self, e, label):
+                return self.loss(e, self.classifier.weight, label)
+
+        cell = HeadCell()
+    params = cell.trainable_params()
+    step = nn.TrainOneStepCell(cell, nn.Adam(params, learning_rate=1e-3))
+    rss_init = _rss_mb()
+    step(x, y)  # compilación
+    t0 = time.perf_counter()
+    for _ in range(steps):
+        step(x, y).asnumpy()
+    step_ms = 1000 * (time.perf_counter() - t0) / steps
+    columns = num_sampled if 0 < num_sampled < num_classes else num_classes
+    print(json.dumps({
+        "step_ms": step_ms,
+        "rss_init_mb": rss_init,
+        "rss_peak_mb": _rss_mb(),
+        "logits_mb": batch_size * columns * 4 / 1024 ** 2,
+        "weights_mb": sum(p.size for p in params) * 4 / 1024 ** 2,
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Memoria/tiempo por paso de la cabeza frente al número de clases")
+    parser.add_argument("--classes", default="1000,10000,100000,300000")
+    parser.add_argument("--batch-size", type=int, default=128)
+    parser.add_argument("--sample-rate", type=float, default=0.1, help="Fracción de centros con Partial FC")
+    parser.add_argument("--steps", type=int, default=10)
+    parser.add_argument("--worker", nargs=3, metavar=("HEAD", "CLASSES", "SAMPLED"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        head, classes, sampled = args.worker
+        run_worker(head, int(classes), args.batch_size, int(sampled), args.steps)
+        return
+
+    print(f"batch {args.batch_size} | dim {EMBEDDING_DIM} | Partial FC: {args.sample_rate:.0%} de los centros")
+    print(f"{'clases':>8}  {'cabeza':<16}{'ms/paso':>10}{'pico RSS MB':>13}{'paso MB':>10}{'logits MB':>11}{'pesos MB':>10}")
+    for classes in [int(c) for c in args.classes.split(",")]:
+        sampled = max(args.batch_size + 1, int(classes * args.sample_rate))
+        for head, label, num_sampled in [
+            ("softmax", "softmax", 0),
+            ("arcface", "arcface", 0),
+            ("arcface", "arcface+pfc", sampled),
+        ]:
+            cmd = [
+                sys.executable, os.path.abspath(__file__), "--worker", head, str(classes), str(num_sampled),
+                "--batch-size", str(args.batch_size), "--steps", str(args.steps),
+            ]
+            out = subprocess.run(cmd, capture_output=True, text=True).stdout.strip().splitlines()
+            if not out or not out[-1].startswith("{"):
+                print(f"{classes:>8}  {label:<16}{'error':>10}")
+                continue
+            r = json.loads(out[-1])
+            print(
+                f"{classes:>8}  {label:<16}{r['step_ms']:>10.1f}{r['rss_peak_mb']:>13.0f}"
+                f"{r['rss_peak_mb'] - r['rss_init_mb']:>10.0f}{r['logits_mb']:>11.1f}{r['weights_mb']:>10.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
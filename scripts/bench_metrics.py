@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Coste de la instrumentación (src/metrics.py): tiempo de una etapa vacía y del
+preprocesado de imágenes con las métricas desactivadas, activadas y en modo de
+perfilado. Con --pairs N verifica además N pares con el modelo y muestra el
+desglose por etapa de verify_pair.
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from bench_utils import benchmark_images, load_model_or_random, timed
+from config import VAL_DIR
+from src.inference import _preprocess_image, verify_pair
+from src.metrics import METRICS, profile_call, stage
+
+
+def empty_stages(n):
+    for _ in range(n):
+        with stage("vacía"):
+            pass
+
+
+def profiled_stages(n):
+    for _ in range(n):
+        with profile_call("llamada"):
+            with stage("vacía"):
+                pass
+
+
+def preprocess(paths):
+    for path in paths:
+        _preprocess_image(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Coste de la instrumentación de la inferencia")
+    parser.add_argument("--iterations", type=int, default=200000, help="Etapas vacías medidas")
+    parser.add_argument("--images", type=int, default=64, help="Imágenes preprocesadas")
+    parser.add_argument("--pairs", type=int, default=0, help="Pares verificados con el modelo (0 = ninguno)")
+    parser.add_argument("--data-dir", default=VAL_DIR)
+    args = parser.parse_args()
+
+    paths = benchmark_images(args.data_dir, args.images)
+    preprocess(paths[:4])  # calentamiento (caché de ficheros del sistema)
+    METRICS.profile_file = os.path.join(tempfile.mkdtemp(prefix="bench_metrics_"), "profile.jsonl")
+    print(f"{'modo':<14}{'etapa vacía ns':>16}{'preprocesado ms/img':>22}")
+    for mode in ("desactivadas", "activadas", "perfilado"):
+        METRICS.reset()
+        METRICS.enabled = mode != "desactivadas"
+        METRICS.profile = mode == "perfilado"
+        fn = profiled_stages if METRICS.profile else empty_stages
+        _, empty = timed(fn, args.iterations, repeat=3)
+        _, prep = timed(preprocess, paths, repeat=3)
+        print(f"{mode:<14}{1e9 * empty / args.iterations:>16.0f}{1000 * prep / len(paths):>22.3f}")
+
+    if args.pairs:
+        model = load_model_or_random()
+        METRICS.reset()
+        METRICS.enable(profile=True)
+        t0 = time.perf_counter()
+        for i in range(args.pairs):
+            verify_pair(model, paths[(2 * i) % len(paths)], paths[(2 * i + 1) % len(paths)])
+        print(f"\n{args.pairs} pares en {time.perf_counter() - t0:.1f} s")
+        print(METRICS.summary_table())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark del muestreador P×K frente a ImageFolderDataset con un árbol sintético
+de N identidades (enlaces a unas pocas imágenes reales): tiempo hasta el primer
+lote (arranque, que con ImageFolderDataset crece con el número de ficheros) y
+equilibrio de identidades en los lotes.
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+from collections import Counter
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import TRAIN_DIR, BATCH_SIZE, PK_IMAGES_PER_IDENTITY
+from src.dataset import configure_pipeline, create_train_dataset, list_image_files
+
+
+def make_tree(sources, num_identities, root, rng):
+    """Crea root/id_<i>/ con entre 1 y 2 * len(sources) enlaces (identidades desiguales)."""
+    for i in range(num_identities):
+        identity_dir = os.path.join(root, f"id_{i:07d}")
+        os.makedirs(identity_dir)
+        for j in range(int(rng.integers(1, 2 * len(sources) + 1))):
+            os.symlink(sources[j % len(sources)], os.path.join(identity_dir, f"{j}.jpg"))
+
+
+def first_batches(dataset, n):
+    """Segundos hasta el primer lote y etiquetas de los n primeros lotes."""
+    t0 = time.perf_counter()
+    labels, first = [], None
+    for i, (_, label) in enumerate(dataset.create_tuple_iterator(num_epochs=1, output_numpy=True)):
+        if first is None:
+            first = time.perf_counter() - t0
+        labels.append(label)
+        if i + 1 >= n:
+            break
+    return first, labels
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Arranque y equilibrio: P×K vs ImageFolderDataset")
+    parser.add_argument("--data-dir", default=TRAIN_DIR, help="Imágenes reales de las que se enlazan copias")
+    parser.add_argument("--identities", default="1000,10000,100000")
+    parser.add_argument("--batch-size", type=int, default=max(BATCH_SIZE, 4 * PK_IMAGES_PER_IDENTITY))
+    parser.add_argument("--batches", type=int, default=20)
+    args = parser.parse_args()
+    configure_pipeline()
+
+    sources = [os.path.abspath(p) for p in list_image_files(args.data_dir)[0][:8]]
+    if not sources:
+        print(f"No hay imágenes en {args.data_dir}")
+        return
+    rng = np.random.default_rng(0)
+    print(f"batch {args.batch_size} | K = {PK_IMAGES_PER_IDENTITY}")
+    print(f"{'identidades':>12}  {'cargador':<14}{'1er lote s':>12}{'ids/lote':>10}{'máx. por id':>13}")
+    for n in [int(x) for x in args.identities.split(",")]:
+        root = tempfile.mkdtemp(prefix="bench_sampler_")
+        try:
+            make_tree(sources, n, root, rng)
+            for name, balanced in [("ImageFolder", False), ("P×K", True)]:
+                first, labels = first_batches(
+                    create_train_dataset(root, args.batch_size, balanced=balanced), args.batches
+                )
+                ids_per_batch = np.mean([len(set(b.tolist())) for b in labels])
+                max_per_id = np.mean([max(Counter(b.tolist()).values()) for b in labels])
+                print(f"{n:>12}  {name:<14}{first:>12.2f}{ids_per_batch:>10.1f}{max_per_id:>13.1f}")
+        finally:
+            shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
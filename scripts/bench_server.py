@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Generador de carga para el servicio de inferencia (serve.py).
+Lanza peticiones /embed concurrentes y mide latencia p50/p99 y throughput.
+Sin --url arranca el servicio en el propio proceso para cada --max-batch indicado.
+"""
+
+import argparse
+import http.client
+import json
+import os
+import sys
+import threading
+import time
+from urllib.parse import urlparse
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from config import VAL_DIR, SERVER_MAX_WAIT_MS
+from bench_utils import benchmark_images, load_model_or_random
+
+
+def run_load(host, port, paths, concurrency, requests_per_client):
+    """Cada cliente usa una conexión keep-alive; devuelve (latencias en s, duración total)."""
+    latencies = []
+    lock = threading.Lock()
+
+    def client(offset):
+        conn = http.client.HTTPConnection(host, port, timeout=600)
+        local = []
+        for i in range(requests_per_client):
+            body = json.dumps({"image": paths[(offset + i) % len(paths)]})
+            t0 = time.perf_counter()
+            conn.request("POST", "/embed", body, {"Content-Type": "application/json"})
+            resp = conn.getresponse()
+            resp.read()
+            if resp.status != 200:
+                raise RuntimeError(f"HTTP {resp.status}")
+            local.append(time.perf_counter() - t0)
+        conn.close()
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=client, args=(c * requests_per_client,)) for c in range(concurrency)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return np.array(latencies), time.perf_counter() - t0
+
+
+def get_stats(host, port):
+    conn = http.client.HTTPConnection(host, port, timeout=60)
+    conn.request("GET", "/stats")
+    stats = json.loads(conn.getresponse().read())
+    conn.close()
+    return stats
+
+
+def report(name, latencies, elapsed, stats):
+    print(
+        f"{name:<14}{len(latencies) / elapsed:>10.1f}{np.percentile(latencies, 50) * 1e3:>10.1f}"
+        f"{np.percentile(latencies, 99) * 1e3:>10.1f}{stats.get('mean_batch', 0):>12.2f}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de carga del servicio de inferencia")
+    parser.add_argument("--url", default=None,
+                        help="Servicio ya arrancado con --path-root DATA_DIR (p. ej. http://127.0.0.1:8000)")
+    parser.add_argument("--data-dir", default=VAL_DIR)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=8, help="Peticiones por cliente")
+    parser.add_argument("--max-batch", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--max-wait-ms", type=float, default=SERVER_MAX_WAIT_MS)
+    args = parser.parse_args()
+
+    paths = benchmark_images(args.data_dir, 64)
+    print(f"Clientes: {args.concurrency} x {args.requests} peticiones")
+    print(f"{'config':<14}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'lote medio':>12}")
+
+    if args.url:
+        u = urlparse(args.url)
+        latencies, elapsed = run_load(u.hostname, u.port, paths, args.concurrency, args.requests)
+        report("servicio", latencies, elapsed, get_stats(u.hostname, u.port))
+        return
+
+    from src.server import InferenceService, create_server
+
+    model = load_model_or_random()
+    for max_batch in args.max_batch:
+        service = InferenceService(model=model, max_batch=max_batch, max_wait_ms=args.max_wait_ms,
+                                   path_root=args.data_dir)
+        server = create_server(service, host="127.0.0.1", port=0)
+        host, port = server.server_address[:2]
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        # Calentamiento: compila las formas de lote usadas
+        run_load(host, port, paths, min(args.concurrency, max_batch), 1)
+        before = service.stats()
+        latencies, elapsed = run_load(host, port, paths, args.concurrency, args.requests)
+        after = service.stats()
+        batches = after["batches"] - before["batches"]
+        mean_batch = (after["images"] - before["images"]) / batches if batches else 0.0
+        report(f"max_batch={max_batch}", latencies, elapsed, {"mean_batch": mean_batch})
+        server.shutdown()
+        server.server_close()
+        service.batcher.close()
+
+
+if __name__ == "__main__":
+    main()
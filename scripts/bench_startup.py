@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark de arranque en frío: tiempo hasta el primer embedding y memoria residente
+máxima al cargar el checkpoint completo frente al grafo MindIR exportado.
+Cada variante se mide en un proceso nuevo.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from config import CHECKPOINT_DIR, EXPORT_NAME, EXPORT_DIR, VAL_DIR
+from bench_utils import benchmark_images
+
+CHILD = r"""
+import json, os, resource, sys, time
+t0 = time.perf_counter()
+sys.path.insert(0, {root!r})
+from src.inference import get_embedding, load_embedding_model
+from src.export import ExportedEmbeddingModel
+t_import = time.perf_counter()
+model = ExportedEmbeddingModel({path!r}) if {path!r} else load_embedding_model({ckpt_dir!r})
+t_load = time.perf_counter()
+get_embedding(model, {image!r})
+t_first = time.perf_counter()
+print(json.dumps({{
+    "import": t_import - t0, "load": t_load - t_import, "first": t_first - t_load,
+    "total": t_first - t0, "rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+}}))
+"""
+
+
+def measure(path, ckpt_dir, image):
+    code = CHILD.format(root=ROOT, path=path, ckpt_dir=ckpt_dir, image=image)
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Arranque en frío: checkpoint vs MindIR")
+    parser.add_argument("--checkpoint-dir", default=CHECKPOINT_DIR)
+    parser.add_argument("--data-dir", default=VAL_DIR)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    mindir = os.path.join(EXPORT_DIR or args.checkpoint_dir, EXPORT_NAME + ".mindir")
+    if not os.path.isfile(mindir):
+        print(f"No existe {mindir}. Ejecuta antes: python scripts/export_model.py")
+        return
+    image = benchmark_images(args.data_dir, 1)[0]
+    print(f"{'modelo':<12}{'import s':>10}{'carga s':>10}{'1er emb s':>11}{'total s':>10}{'RSS MiB':>10}")
+    for name, path in (("checkpoint", ""), ("mindir", mindir)):
+        runs = [measure(path, args.checkpoint_dir, image) for _ in range(args.runs)]
+        best = min(runs, key=lambda r: r["total"])
+        print(
+            f"{name:<12}{best['import']:>10.2f}{best['load']:>10.2f}{best['first']:>11.2f}"
+            f"{best['total']:>10.2f}{best['rss_mb']:>10.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark de verificación en streaming: fotogramas/s de verify_pair por fotograma
+(referencia re-procesada cada vez, lote 1) frente a StreamVerifier (referencia una
+vez, lotes, decodificación solapada) sin salto, con salto fijo y con salto
+adaptativo para seguir target_fps. Usa fotogramas JPEG sintéticos (640x480).
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import mindspore as ms
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from config import IMAGE_SIZE, VERIFICATION_THRESHOLD, STREAM_TARGET_FPS
+from src.inference import verify_pair
+from src.stream import StreamVerifier
+from bench_utils import load_model_or_random, synthetic_images
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fotogramas/s de la verificación en streaming")
+    parser.add_argument("--frames", type=int, default=120)
+    parser.add_argument("--baseline-frames", type=int, default=8, help="Fotogramas para verify_pair (es lento)")
+    parser.add_argument("--batch-size", type=int, default=None)
+    parser.add_argument("--stride", type=int, default=3, help="Salto fijo a comparar")
+    parser.add_argument("--target-fps", type=float, default=STREAM_TARGET_FPS)
+    args = parser.parse_args()
+
+    frames_dir = tempfile.mkdtemp(prefix="bench_stream_")
+    frames = synthetic_images(args.frames, size=(640, 480), directory=frames_dir)
+    reference = frames[0]
+    model = load_model_or_random()
+    verify_pair(model, reference, frames[1])  # compilación
+
+    t0 = time.perf_counter()
+    for path in frames[:args.baseline_frames]:
+        verify_pair(model, reference, path, threshold=VERIFICATION_THRESHOLD)
+    baseline = args.baseline_frames / (time.perf_counter() - t0)
+
+    print(f"{args.frames} fotogramas 640x480 | objetivo {args.target_fps:g} fps")
+    print(f"{'modo':<28}{'fotogramas/s':>14}{'procesados/s':>14}{'stride final':>14}")
+    print(f"{'verify_pair por fotograma':<28}{baseline:>14.1f}{baseline:>14.1f}{1:>14}")
+    for label, stride, target in (
+        ("streaming (sin salto)", 1, 0),
+        (f"streaming (stride {args.stride})", args.stride, 0),
+        ("streaming (adaptativo)", 1, args.target_fps),
+    ):
+        verifier = StreamVerifier(model, reference, batch_size=args.batch_size, stride=stride, target_fps=target)
+        model.get_embedding(ms.Tensor(np.zeros((verifier.batch_size, 3, IMAGE_SIZE, IMAGE_SIZE), np.float32)))
+        _, summary = verifier.run(frames_dir)
+        print(f"{label:<28}{summary['fps']:>14.1f}{summary['processed_fps']:>14.1f}{summary['final_stride']:>14}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark de modos de entrenamiento: niveles de precisión mixta (O0/O2/O3) con y
+sin dataset sink mode. Lanza train.py para cada combinación (checkpoints en un
+directorio temporal) e informa de tiempo por paso, muestras/s y accuracy final en
+validación, para elegir la opción más rápida que converge.
+"""
+
+import argparse
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from config import SINK_SIZE
+
+
+def run(amp_level, sink, sink_size, epochs):
+    """Entrena una combinación y devuelve (ms/paso, muestras/s, accuracy) o None si falla."""
+    tmp = tempfile.mkdtemp(prefix="bench_train_")
+    cmd = [
+        sys.executable, os.path.join(ROOT, "train.py"),
+        "--epochs", str(epochs), "--checkpoint-dir", tmp, "--amp-level", amp_level,
+        "--sink" if sink else "--no-sink", "--sink-size", str(sink_size),
+    ]
+    try:
+        out = subprocess.run(cmd, cwd=ROOT, capture_output=True, text=True).stdout
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    speed = re.search(r"Rendimiento: ([\d.]+) muestras/s \(([\d.]+) ms/paso\)", out)
+    if speed is None:
+        return None
+    acc = re.search(r"Precisión en validación: \{'acc': (?:np\.float64\()?([\d.]+)", out)
+    return float(speed.group(2)), float(speed.group(1)), float(acc.group(1)) if acc else float("nan")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tiempo por paso y accuracy por nivel AMP y sink mode")
+    parser.add_argument("--amp-levels", default="O0,O2,O3")
+    parser.add_argument("--sink-size", type=int, default=SINK_SIZE)
+    parser.add_argument("--epochs", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'AMP':<6}{'sink':<7}{'ms/paso':>10}{'muestras/s':>13}{'acc val':>10}")
+    for amp_level in args.amp_levels.split(","):
+        for sink in (False, True):
+            result = run(amp_level, sink, args.sink_size, args.epochs)
+            label = f"{amp_level:<6}{str(sink):<7}"
+            if result is None:
+                print(label + f"{'error':>10}")
+                continue
+            step_ms, rate, acc = result
+            print(label + f"{step_ms:>10.1f}{rate:>13.1f}{acc:>10.4f}")
+
+
+if __name__ == "__main__":
+    main()
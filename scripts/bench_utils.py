@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+"""Utilidades comunes para los scripts de benchmark (todo local)."""
+
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+
+# Añadir raíz del proyecto
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import EMBEDDING_DIM, SEED
+from src.dataset import list_image_files
+
+
+def load_model_or_random(checkpoint_dir=None):
+    """
+    Carga el modelo entrenado; si no hay checkpoint usa pesos aleatorios
+    (el rendimiento no depende de los pesos).
+    """
+    from src.inference import load_embedding_model
+    from src.model import FaceBiometricsNet
+
+    try:
+        return load_embedding_model(checkpoint_dir)
+    except FileNotFoundError as e:
+        print(f"Aviso: {e}. Usando pesos aleatorios.")
+        net = FaceBiometricsNet(embedding_dim=EMBEDDING_DIM, num_classes=2)
+        net.set_train(False)
+        return net
+
+
+def synthetic_images(num_images, size=(640, 480), directory=None):
+    """Genera num_images JPEG aleatorios y devuelve sus rutas."""
+    directory = directory or tempfile.mkdtemp(prefix="bench_faces_")
+    rng = np.random.default_rng(SEED)
+    paths = []
+    for i in range(num_images):
+        path = os.path.join(directory, f"img_{i:06d}.jpg")
+        if not os.path.isfile(path):
+            arr = rng.integers(0, 256, size=(size[1], size[0], 3), dtype=np.uint8)
+            Image.fromarray(arr).save(path, "JPEG", quality=90)
+        paths.append(path)
+    return paths
+
+
+def benchmark_images(data_dir, num_images):
+    """Rutas de imágenes de data_dir (si existen) o sintéticas en su defecto."""
+    paths, _, _ = list_image_files(data_dir) if data_dir else ([], [], [])
+    if not paths:
+        return synthetic_images(num_images)
+    reps = -(-num_images // len(paths))
+    return (paths * reps)[:num_images]
+
+
+def timed(fn, *args, repeat=1, **kwargs):
+    """Ejecuta fn repeat veces y devuelve (resultado, mejor tiempo en segundos)."""
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn(*args, **kwargs)
+        best = min(best, time.perf_counter() - t0)
+    return result, best
@@ -3,10 +3,15 @@
 """
 Script para convertir imágenes WEBP a JPG en el dataset.
 Convierte todas las imágenes .webp en data/train/ y data/val/ a formato .jpg
+usando un pool de procesos; con --keep-webp un manifiesto (mtime y tamaño) permite
+re-ejecuciones incrementales, y --max-side reduce las fotos al convertirlas.
 """
 
+import argparse
+import json
 import os
 import sys
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from PIL import Image
 
@@ -14,61 +19,136 @@ from PIL import Image
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from config import DATA_DIR, TRAIN_DIR, VAL_DIR
 
+MANIFEST_NAME = ".convert_manifest.json"
 
-def convert_webp_to_jpg(directory):
+
+def _convert_one(task):
+    """
+    Convierte un .webp a .jpg (se ejecuta en un proceso del pool).
+    Devuelve (ruta_webp, error o None).
+    """
+    webp_path, max_side, keep_webp = task
+    jpg_path = os.path.splitext(webp_path)[0] + '.jpg'
+    try:
+        # Abrir imagen WEBP y convertir a RGB
+        img = Image.open(webp_path)
+
+        # Convertir a RGB (necesario para JPG)
+        if img.mode in ('RGBA', 'LA', 'P'):
+            # Crear fondo blanco para imágenes con transparencia
+            background = Image.new('RGB', img.size, (255, 255, 255))
+            if img.mode == 'P':
+                img = img.convert('RGBA')
+            background.paste(img, mask=img.split()[-1] if img.mode in ('RGBA', 'LA') else None)
+            img = background
+        elif img.mode != 'RGB':
+            img = img.convert('RGB')
+
+        # Reducir al lado máximo (conserva proporción)
+        if max_side and max(img.size) > max_side:
+            img.thumbnail((max_side, max_side), Image.BILINEAR)
+
+        # Guardar como JPG (escritura atómica)
+        tmp_path = jpg_path + '.tmp'
+        img.save(tmp_path, 'JPEG', quality=95)
+        os.replace(tmp_path, jpg_path)
+
+        # Eliminar archivo WEBP original
+        if not keep_webp:
+            os.remove(webp_path)
+        return webp_path, None
+    except Exception as e:
+        return webp_path, str(e)
+
+
+def _load_manifest(directory):
+    path = os.path.join(directory, MANIFEST_NAME)
+    if not os.path.isfile(path):
+        return {}
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_manifest(directory, manifest):
+    path = os.path.join(directory, MANIFEST_NAME)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(manifest, f)
+    os.replace(path + '.tmp', path)
+
+
+def convert_webp_to_jpg(directory, workers=None, max_side=None, keep_webp=False):
     """
     Convierte todas las imágenes .webp en un directorio a .jpg
-    
+
     Args:
         directory: Ruta del directorio a procesar
+        workers: Procesos en paralelo (default: número de CPUs)
+        max_side: Si se indica, reduce las imágenes a ese lado máximo en píxeles
+        keep_webp: Conservar los .webp originales. El manifiesto (mtime y tamaño)
+            hace que en ejecuciones posteriores solo se procesen los nuevos o modificados.
     """
     if not os.path.exists(directory):
         print(f"⚠️  Directorio no encontrado: {directory}")
         return 0
-    
-    converted_count = 0
-    
+
+    manifest = _load_manifest(directory)
+    tasks, stats = [], {}
+
     # Recorrer recursivamente todas las carpetas
     for root, dirs, files in os.walk(directory):
         for filename in files:
             if filename.lower().endswith('.webp'):
                 webp_path = os.path.join(root, filename)
-                
-                # Crear nombre del archivo JPG
-                jpg_filename = os.path.splitext(filename)[0] + '.jpg'
-                jpg_path = os.path.join(root, jpg_filename)
-                
-                try:
-                    # Abrir imagen WEBP y convertir a RGB
-                    img = Image.open(webp_path)
-                    
-                    # Convertir a RGB (necesario para JPG)
-                    if img.mode in ('RGBA', 'LA', 'P'):
-                        # Crear fondo blanco para imágenes con transparencia
-                        background = Image.new('RGB', img.size, (255, 255, 255))
-                        if img.mode == 'P':
-                            img = img.convert('RGBA')
-                        background.paste(img, mask=img.split()[-1] if img.mode == 'RGBA' else None)
-                        img = background
-                    elif img.mode != 'RGB':
-                        img = img.convert('RGB')
-                    
-                    # Guardar como JPG
-                    img.save(jpg_path, 'JPEG', quality=95)
-                    
-                    # Eliminar archivo WEBP original
-                    os.remove(webp_path)
-                    
-                    converted_count += 1
-                    print(f"✅ Convertido: {os.path.relpath(webp_path, directory)} → {jpg_filename}")
-                    
-                except Exception as e:
-                    print(f"❌ Error al convertir {webp_path}: {e}")
-    
+                rel = os.path.relpath(webp_path, directory)
+                st = os.stat(webp_path)
+                stats[rel] = [st.st_mtime_ns, st.st_size]
+                if keep_webp and manifest.get(rel) == stats[rel] \
+                        and os.path.isfile(os.path.splitext(webp_path)[0] + '.jpg'):
+                    continue
+                tasks.append((webp_path, max_side, keep_webp))
+
+    total = len(tasks)
+    if not total:
+        return 0
+    converted_count, errors = 0, []
+    step = max(1, total // 100)
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        for done, (webp_path, error) in enumerate(pool.map(_convert_one, tasks, chunksize=16), 1):
+            rel = os.path.relpath(webp_path, directory)
+            if error is None:
+                converted_count += 1
+                if keep_webp:
+                    manifest[rel] = stats[rel]
+                else:
+                    manifest.pop(rel, None)
+            else:
+                errors.append((webp_path, error))
+            if done % step == 0 or done == total:
+                print(f"\r   Progreso: {done}/{total} ({100 * done // total}%)", end="", flush=True)
+            # Guardar el manifiesto periódicamente para poder reanudar
+            if keep_webp and done % (50 * step) == 0:
+                _save_manifest(directory, manifest)
+    print()
+    if keep_webp or os.path.isfile(os.path.join(directory, MANIFEST_NAME)):
+        _save_manifest(directory, manifest)
+    for webp_path, error in errors:
+        print(f"❌ Error al convertir {webp_path}: {error}")
+
     return converted_count
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Convertir .webp a .jpg en data/train y data/val")
+    parser.add_argument("--workers", type=int, default=None, help="Procesos en paralelo (default: CPUs)")
+    parser.add_argument("--max-side", type=int, default=None, help="Reducir imágenes a este lado máximo (px)")
+    parser.add_argument("--keep-webp", action="store_true",
+                        help="Conservar los .webp (re-ejecuciones solo procesan nuevos/modificados)")
+    args = parser.parse_args()
+    options = dict(workers=args.workers, max_side=args.max_side, keep_webp=args.keep_webp)
+
     print("=" * 60)
     print("Conversión de imágenes WEBP a JPG")
     print("=" * 60)
@@ -78,14 +158,14 @@ def main():
     # Convertir en train/
     if os.path.exists(TRAIN_DIR):
         print(f"\n📁 Procesando: {TRAIN_DIR}")
-        count = convert_webp_to_jpg(TRAIN_DIR)
+        count = convert_webp_to_jpg(TRAIN_DIR, **options)
         total_converted += count
         print(f"   → {count} imágenes convertidas en train/")
     
     # Convertir en val/
     if os.path.exists(VAL_DIR):
         print(f"\n📁 Procesando: {VAL_DIR}")
-        count = convert_webp_to_jpg(VAL_DIR)
+        count = convert_webp_to_jpg(VAL_DIR, **options)
         total_converted += count
         print(f"   → {count} imágenes convertidas en val/")
     
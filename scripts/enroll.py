@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Enrolado masivo de data/train (o --data-dir) en la galería (src/enrollment.py).
+Decodificación, forward por lotes y escritura corren en paralelo unidas por colas
+acotadas; el progreso se guarda en ENROLL_STATE_DIR, así que si se interrumpe
+(Ctrl+C, caída) basta con relanzar el mismo comando para continuar (--retry-failed
+reintenta además las imágenes que dieron error). Muestra el
+rendimiento y la ocupación de las colas, y guarda las estadísticas en results/.
+"""
+
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import TRAIN_DIR, GALLERY_DIR, RESULTS_DIR, CACHE_ENABLED
+from src.enrollment import BulkEnroller
+from src.export import load_inference_model
+from src.gallery_shards import save_gallery
+
+
+def _progress(stats):
+    q = stats["queues"]
+    print(
+        f"   {stats['resumed'] + stats['processed']}/{stats['total']} | {stats['images_per_s']:.1f} img/s | "
+        f"forward ocupado {stats['forward_busy_pct']:.0f}% | cola imágenes {q['images']['occupancy']:.0%} "
+        f"| cola lotes {q['batches']['occupancy']:.0%}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Enrolado masivo reanudable en la galería")
+    parser.add_argument("--data-dir", default=TRAIN_DIR, help="Carpeta <identidad>/<imagen> a enrolar")
+    parser.add_argument("--batch-size", type=int, default=None, help="Lote del forward (default: INFERENCE_BATCH_SIZE)")
+    parser.add_argument("--workers", type=int, default=None, help="Decodificadores (default: DECODE_WORKERS)")
+    parser.add_argument("--processes", action="store_true", help="Decodificar en un pool de procesos en lugar de hilos")
+    parser.add_argument("--queue-batches", type=int, default=None, help="Capacidad de las colas en lotes")
+    parser.add_argument("--checkpoint-every", type=int, default=None, help="Imágenes entre puntos de control")
+    parser.add_argument("--restart", action="store_true", help="Descartar el progreso guardado y empezar de cero")
+    parser.add_argument("--retry-failed", action="store_true",
+                        help="Al reanudar, volver a procesar las imágenes que dieron error")
+    parser.add_argument("--keep-state", action="store_true", help="No borrar el progreso al terminar")
+    parser.add_argument("--progress-every", type=float, default=10.0, help="Segundos entre líneas de progreso")
+    parser.add_argument("--shards", type=int, default=None, help="Repartir la galería en N shards (default: GALLERY_SHARDS)")
+    parser.add_argument("--ann", action="store_true", help="Construir el índice aproximado IVF-PQ")
+    parser.add_argument("--no-cache", action="store_true", help="No usar la caché de imágenes")
+    args = parser.parse_args()
+
+    cache = None
+    if CACHE_ENABLED and not args.no_cache:
+        from src.cache import FaceCache
+
+        cache = FaceCache()
+    model = load_inference_model()
+    enroller = BulkEnroller(
+        model, batch_size=args.batch_size, workers=args.workers, processes=args.processes,
+        queue_batches=args.queue_batches, checkpoint_every=args.checkpoint_every, cache=cache,
+    )
+    print(f"📁 Enrolando {args.data_dir} (estado en {enroller.state_dir})")
+    gallery, stats = enroller.run(args.data_dir, restart=args.restart, progress_every=args.progress_every,
+                                  callback=_progress, retry_failed=args.retry_failed)
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    stats_path = os.path.join(RESULTS_DIR, "enroll_stats.json")
+    with open(stats_path, "w") as f:
+        json.dump(stats, f, indent=1)
+    q = stats["queues"]
+    resumed = f", {stats['resumed']} ya enroladas antes" if stats["resumed"] else ""
+    print(f"\nProcesadas: {stats['processed']} ({stats['failed']} errores{resumed}) en {stats['elapsed_s']:.1f} s "
+          f"| {stats['images_per_s']:.1f} imágenes/s | forward ocupado {stats['forward_busy_pct']:.0f}%")
+    print(f"{'cola':<10}{'capacidad':>10}{'media':>8}{'ocupación':>11}{'llena %':>9}{'vacía %':>9}{'pico':>6}")
+    for name, s in q.items():
+        print(f"{name:<10}{s['capacity']:>10}{s['mean']:>8.1f}{s['occupancy']:>11.0%}"
+              f"{s['full_pct']:>9.0f}{s['empty_pct']:>9.0f}{s['peak']:>6}")
+    print(f"Estadísticas: {stats_path}")
+
+    if gallery is None:
+        print("\nInterrumpido: el progreso está guardado; relanza el mismo comando para continuar.")
+        sys.exit(130)
+    save_gallery(gallery, shards=args.shards, ann=args.ann)
+    if stats["failed_total"]:
+        hint = "" if args.keep_state else " (relanza con --keep-state para conservarlas y --retry-failed para reintentarlas)"
+        print(f"\n{stats['failed_total']} imágenes con error no están en la galería{hint}")
+    if not args.keep_state:
+        enroller.remove_state()
+    print(f"\nGalería: {len(gallery)} imágenes, {len(gallery.identities)} identidades -> {GALLERY_DIR}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Exporta el backbone de embeddings (FaceEmbeddingNet, sin la cabeza de clasificación)
+del checkpoint elegido por CHECKPOINT_SELECT a MindIR con lote dinámico y, opcionalmente,
+a ONNX. test.py y serve.py cargan el MindIR directamente mientras ese siga siendo el
+checkpoint seleccionado (ver <grafo>.json).
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import CHECKPOINT_DIR
+from src.export import default_export_dir, export_embedding_model
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Exportar el backbone de embeddings")
+    parser.add_argument("--checkpoint-dir", default=CHECKPOINT_DIR)
+    parser.add_argument("--output-dir", default=None, help="Directorio de salida (default: EXPORT_DIR o checkpoint-dir)")
+    parser.add_argument("--onnx", action="store_true", help="Exportar también a ONNX")
+    parser.add_argument("--onnx-batch", type=int, default=1,
+                        help="Lote del grafo ONNX (se vuelve dinámico si está instalado el paquete onnx)")
+    args = parser.parse_args()
+    output_dir = args.output_dir or default_export_dir(args.checkpoint_dir)
+    if os.path.abspath(output_dir) != os.path.abspath(default_export_dir(args.checkpoint_dir)):
+        print(f"Aviso: test.py y serve.py buscan el grafo en {default_export_dir(args.checkpoint_dir)}; "
+              f"para que usen el de {output_dir}, pon EXPORT_DIR = {output_dir!r} en config.py")
+
+    path = export_embedding_model(args.checkpoint_dir, output_dir, file_format="MINDIR")
+    print(f"MindIR (lote dinámico): {path} ({os.path.getsize(path) / 2**20:.1f} MiB)")
+    if args.onnx:
+        path = export_embedding_model(args.checkpoint_dir, output_dir, file_format="ONNX", batch_size=args.onnx_batch)
+        print(f"ONNX: {path} ({os.path.getsize(path) / 2**20:.1f} MiB)")
+
+
+if __name__ == "__main__":
+    main()
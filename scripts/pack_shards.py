@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Empaqueta data/train y data/val en shards binarios para entrenamiento rápido.
+Cada shard es un .npy uint8 (N, IMAGE_SIZE, IMAGE_SIZE, 3) con las caras ya
+redimensionadas (o alineadas si hay un detector configurado, src/alignment.py),
+más un .npy de etiquetas; index.json guarda identidades y ficheros.
+src/dataset.py los lee con memory-map (USE_SHARDS = True en config.py).
+"""
+
+import argparse
+import json
+import os
+import sys
+from multiprocessing import Pool
+
+import numpy as np
+
+# Añadir raíz del proyecto
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import TRAIN_DIR, VAL_DIR, SHARDS_TRAIN_DIR, SHARDS_VAL_DIR, IMAGE_SIZE
+from src.dataset import list_image_files, SHARD_INDEX_FILE
+from src.inference import _load_resized
+
+
+def _load(path):
+    try:
+        return _load_resized(path)
+    except Exception as e:
+        print(f"❌ Error al leer {path}: {e}")
+        return None
+
+
+def pack_directory(data_dir, out_dir, shard_size=50000, workers=None):
+    """
+    Empaqueta data_dir/<identidad>/<imagen> en out_dir.
+    Devuelve el número de imágenes escritas.
+    """
+    paths, labels, identities = list_image_files(data_dir)
+    if not paths:
+        print(f"⚠️  Sin imágenes en {data_dir}")
+        return 0
+    os.makedirs(out_dir, exist_ok=True)
+    shards = []
+    written = 0
+    with Pool(workers or os.cpu_count()) as pool:
+        for start in range(0, len(paths), shard_size):
+            chunk = paths[start:start + shard_size]
+            images = np.lib.format.open_memmap(
+                os.path.join(out_dir, f"tmp-{len(shards):05d}.npy"), mode="w+",
+                dtype=np.uint8, shape=(len(chunk), IMAGE_SIZE, IMAGE_SIZE, 3),
+            )
+            keep = []
+            for i, arr in enumerate(pool.imap(_load, chunk, chunksize=64)):
+                if arr is not None:
+                    images[len(keep)] = arr
+                    keep.append(start + i)
+            # Compactar si alguna imagen falló
+            name = f"images-{len(shards):05d}.npy"
+            if len(keep) < len(chunk):
+                np.save(os.path.join(out_dir, name), np.asarray(images[:len(keep)]))
+                del images
+                os.remove(os.path.join(out_dir, f"tmp-{len(shards):05d}.npy"))
+            else:
+                images.flush()
+                del images
+                os.replace(os.path.join(out_dir, f"tmp-{len(shards):05d}.npy"), os.path.join(out_dir, name))
+            label_name = f"labels-{len(shards):05d}.npy"
+            np.save(os.path.join(out_dir, label_name), np.asarray([labels[i] for i in keep], dtype=np.int32))
+            shards.append({"images": name, "labels": label_name, "count": len(keep)})
+            written += len(keep)
+            print(f"   shard {len(shards)}: {written}/{len(paths)} imágenes")
+
+    with open(os.path.join(out_dir, SHARD_INDEX_FILE), "w") as f:
+        json.dump({"identities": identities, "image_size": IMAGE_SIZE, "shards": shards}, f, indent=1)
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Empaquetar train/val en shards binarios")
+    parser.add_argument("--shard-size", type=int, default=50000, help="Imágenes por shard")
+    parser.add_argument("--workers", type=int, default=None, help="Procesos de decodificación (default: CPUs)")
+    args = parser.parse_args()
+
+    for name, src, dst in (("train", TRAIN_DIR, SHARDS_TRAIN_DIR), ("val", VAL_DIR, SHARDS_VAL_DIR)):
+        if os.path.isdir(src):
+            print(f"\n📁 Empaquetando {name}: {src} -> {dst}")
+            count = pack_directory(src, dst, shard_size=args.shard_size, workers=args.workers)
+            print(f"   → {count} imágenes en {dst}")
+    print("\nActiva USE_SHARDS = True en config.py para entrenar desde los shards.")
+
+
+if __name__ == "__main__":
+    main()
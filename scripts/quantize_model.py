@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Cuantización post-entrenamiento INT8 del backbone de embeddings.
+Exporta el backbone a ONNX, calibra con un subconjunto de data/train y compara el
+modelo INT8 con el float: deriva coseno, accuracy de verificación, velocidad y tamaño.
+Requiere: pip install onnx onnxruntime
+"""
+
+import argparse
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import CHECKPOINT_DIR, TRAIN_DIR, VAL_DIR, QUANTIZED_NAME, SEED
+from src.dataset import list_image_files
+from src.export import ExportedEmbeddingModel, export_embedding_model
+from src.quantization import compare_models, quantize_embedding_model
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cuantización INT8 post-entrenamiento")
+    parser.add_argument("--mode", choices=["static", "dynamic"], default="static")
+    parser.add_argument("--checkpoint-dir", default=CHECKPOINT_DIR)
+    parser.add_argument("--calib-dir", default=TRAIN_DIR, help="Imágenes de calibración (default: data/train)")
+    parser.add_argument("--calib-size", type=int, default=200, help="Número de imágenes de calibración")
+    parser.add_argument("--eval-dir", default=VAL_DIR, help="Imágenes para comparar float vs INT8")
+    parser.add_argument("--eval-size", type=int, default=500)
+    parser.add_argument("--threshold", type=float, default=None, help="Umbral de verificación (default: config)")
+    args = parser.parse_args()
+
+    float_path = export_embedding_model(args.checkpoint_dir, file_format="ONNX")
+    out_path = os.path.join(os.path.dirname(float_path), QUANTIZED_NAME + ".onnx")
+
+    rng = random.Random(SEED)
+    calib_paths, _, _ = list_image_files(args.calib_dir)
+    calib_paths = rng.sample(calib_paths, min(args.calib_size, len(calib_paths)))
+    print(f"Cuantizando ({args.mode}) con {len(calib_paths)} imágenes de calibración...")
+    quantize_embedding_model(float_path, out_path, calib_paths, mode=args.mode)
+
+    eval_paths, eval_labels, _ = list_image_files(args.eval_dir)
+    if not eval_paths:
+        eval_paths, eval_labels, _ = list_image_files(args.calib_dir)
+    pairs = list(zip(eval_paths, eval_labels))
+    pairs = rng.sample(pairs, min(args.eval_size, len(pairs)))
+    paths, labels = [p for p, _ in pairs], [l for _, l in pairs]
+
+    r = compare_models(
+        ExportedEmbeddingModel(float_path), ExportedEmbeddingModel(out_path), paths, labels, threshold=args.threshold
+    )
+    float_mb, int8_mb = os.path.getsize(float_path) / 2**20, os.path.getsize(out_path) / 2**20
+    print(f"\nImágenes de evaluación: {len(paths)}")
+    print(f"{'modelo':<8}{'MiB':>8}{'img/s':>10}{'acc verif':>12}")
+    print(f"{'float':<8}{float_mb:>8.2f}{r['float_img_per_s']:>10.1f}{r['float_verif_acc']:>12.4f}")
+    print(f"{'int8':<8}{int8_mb:>8.2f}{r['int8_img_per_s']:>10.1f}{r['int8_verif_acc']:>12.4f}")
+    print(f"Tamaño: {float_mb / int8_mb:.2f}x menor | velocidad: {r['int8_img_per_s'] / r['float_img_per_s']:.2f}x")
+    print(f"Deriva coseno float vs int8: media {r['cos_mean']:.4f}, mínima {r['cos_min']:.4f}")
+    print(f"Δ accuracy de verificación: {r['int8_verif_acc'] - r['float_verif_acc']:+.4f}")
+    print(f"\nModelo INT8: {out_path} (activa USE_QUANTIZED_MODEL en config.py para usarlo)")
+
+
+if __name__ == "__main__":
+    main()
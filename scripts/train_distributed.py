@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Lanza train.py en modo de paralelismo de datos con varios procesos locales (msrun).
+Cada proceso entrena con su parte del dataset; los gradientes se promedian en cada
+paso y solo el proceso 0 guarda checkpoints. Los logs de cada proceso quedan en
+--log-dir (worker_<rank>.log).
+
+Ejemplo:
+    python scripts/train_distributed.py --nproc 4 -- --epochs 10
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def launch(nproc, train_args=(), master_port=8118, log_dir=None, join=True):
+    """Ejecuta nproc procesos de train.py --distributed en esta máquina. Devuelve el código de salida."""
+    log_dir = log_dir or os.path.join(ROOT, "results", "distributed_logs")
+    cmd = [
+        "msrun",
+        f"--worker_num={nproc}",
+        f"--local_worker_num={nproc}",
+        f"--master_port={master_port}",
+        f"--log_dir={log_dir}",
+        f"--join={join}",
+        os.path.join(ROOT, "train.py"),
+        "--distributed",
+        *train_args,
+    ]
+    return subprocess.run(cmd, cwd=ROOT).returncode
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Entrenamiento con paralelismo de datos en procesos locales")
+    parser.add_argument("--nproc", type=int, default=2, help="Número de procesos")
+    parser.add_argument("--master-port", type=int, default=8118)
+    parser.add_argument("--log-dir", default=None)
+    parser.add_argument("train_args", nargs=argparse.REMAINDER, help="Argumentos para train.py (tras --)")
+    args = parser.parse_args()
+    train_args = [a for a in args.train_args if a != "--"]
+    sys.exit(launch(args.nproc, train_args, args.master_port, args.log_dir))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""
+Servicio local de verificación/identificación facial.
+Carga el modelo una vez y atiende peticiones HTTP (o por socket Unix) agrupándolas
+en micro-lotes. Ver src/server.py para los endpoints.
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from config import SERVER_HOST, SERVER_PORT, SERVER_MAX_BATCH, SERVER_MAX_WAIT_MS, CACHE_ENABLED
+from src.server import InferenceService, create_server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servicio de inferencia con micro-batching")
+    parser.add_argument("--host", default=SERVER_HOST)
+    parser.add_argument("--port", type=int, default=SERVER_PORT)
+    parser.add_argument("--unix-socket", default=None, help="Escuchar en un socket Unix en lugar de TCP")
+    parser.add_argument("--max-batch", type=int, default=SERVER_MAX_BATCH, help="Tamaño máximo de micro-lote")
+    parser.add_argument("--max-wait-ms", type=float, default=SERVER_MAX_WAIT_MS, help="Espera máxima para formar un lote")
+    parser.add_argument("--no-gallery", action="store_true", help="No cargar la galería (sin /identify)")
+    parser.add_argument("--no-cache", action="store_true", help="No usar la caché de imágenes")
+    parser.add_argument("--path-root", default=None,
+                        help="Aceptar imágenes por ruta dentro de este directorio (por defecto solo image_b64)")
+    parser.add_argument("--metrics", action="store_true", help="Medir cada etapa (GET /metrics, /stats)")
+    args = parser.parse_args()
+    if args.metrics:
+        from src.metrics import METRICS
+
+        METRICS.enable()
+
+    gallery = None
+    if not args.no_gallery:
+        from src.gallery_shards import load_gallery
+
+        try:
+            gallery = load_gallery()
+        except FileNotFoundError as e:
+            print(f"Aviso: {e}. /identify deshabilitado.")
+    cache = None
+    if CACHE_ENABLED and not args.no_cache:
+        from src.cache import FaceCache
+
+        cache = FaceCache()
+
+    service = InferenceService(gallery=gallery, cache=cache, max_batch=args.max_batch, max_wait_ms=args.max_wait_ms,
+                               path_root=args.path_root)
+    server = create_server(service, host=args.host, port=args.port, unix_socket=args.unix_socket)
+    where = args.unix_socket or f"http://{args.host}:{args.port}"
+    print(f"Servicio escuchando en {where} (max_batch={args.max_batch}, max_wait={args.max_wait_ms} ms)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.batcher.close()
+        if hasattr(gallery, "close"):
+            gallery.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,296 @@
+# -*- coding: utf-8 -*-
+"""
+Detección y alineado de caras (preprocesado previo al backbone).
+- Un detector devuelve 5 puntos faciales por imagen (ojos, nariz, comisuras).
+- La transformación de semejanza (escala, rotación, traslación) que lleva esos
+  puntos a la plantilla de ArcFace se estima por mínimos cuadrados (Umeyama) para
+  todo el lote a la vez, y el recorte IMAGE_SIZE x IMAGE_SIZE se obtiene con
+  interpolación bilineal en NumPy.
+- Detectores (FACE_DETECTOR en config): "center" (cara centrada, fotos ya
+  recortadas), "landmarks" (puntos precalculados en un fichero de texto) y "onnx"
+  (modelo local con onnxruntime). Sin cara detectada se usa "center".
+Los recortes se guardan en la caché de imágenes (src/cache.py) y en
+data/aligned (scripts/align_faces.py), de modo que entrenamiento, evaluación e
+inferencia usan exactamente los mismos píxeles.
+"""
+
+import hashlib
+import os
+import sys
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import (
+    IMAGE_SIZE,
+    DATA_DIR,
+    FACE_DETECTOR,
+    FACE_LANDMARKS_FILE,
+    FACE_DETECTOR_MODEL,
+    FACE_DETECTOR_INPUT_SIZE,
+    FACE_DETECTOR_THRESHOLD,
+)
+
+# Plantilla de 5 puntos de ArcFace para recortes de 112x112 (x, y)
+REFERENCE_LANDMARKS = np.array(
+    [
+        [38.2946, 51.6963],  # ojo izquierdo
+        [73.5318, 51.5014],  # ojo derecho
+        [56.0252, 71.7366],  # nariz
+        [41.5493, 92.3655],  # comisura izquierda
+        [70.7299, 92.2041],  # comisura derecha
+    ],
+    dtype=np.float32,
+)
+
+
+def reference_landmarks(size=None):
+    """Plantilla de puntos escalada a un recorte size x size."""
+    return REFERENCE_LANDMARKS * ((size or IMAGE_SIZE) / 112.0)
+
+
+def estimate_similarity(src, dst):
+    """
+    Transformaciones de semejanza que llevan src (B, N, 2) a dst (N, 2) por mínimos
+    cuadrados (Umeyama, 1991). Devuelve matrices afines (B, 2, 3).
+    """
+    src = np.asarray(src, dtype=np.float64)
+    dst = np.asarray(dst, dtype=np.float64)
+    n = src.shape[1]
+    src_mean = src.mean(axis=1)
+    dst_mean = dst.mean(axis=0)
+    src_c = src - src_mean[:, None, :]
+    dst_c = dst - dst_mean
+    cov = np.einsum("ni,bnj->bij", dst_c, src_c) / n
+    u, s, vt = np.linalg.svd(cov)
+    # Reflexión: se invierte el último eje si det(U V^T) < 0
+    d = np.sign(np.linalg.det(u) * np.linalg.det(vt))
+    d[d == 0] = 1.0
+    u[:, :, 1] *= d[:, None]
+    rotation = u @ vt
+    src_var = (src_c ** 2).sum(axis=(1, 2)) / n
+    scale = (s[:, 0] + d * s[:, 1]) / np.maximum(src_var, 1e-12)
+    linear = scale[:, None, None] * rotation
+    translation = dst_mean - np.einsum("bij,bj->bi", linear, src_mean)
+    return np.concatenate([linear, translation[:, :, None]], axis=2)
+
+
+def warp_faces(images, matrices, size=None):
+    """
+    Recortes alineados (B, size, size, 3) uint8: el píxel (x, y) del recorte toma el
+    valor bilineal de la imagen en M^-1 (x, y); fuera de la imagen, negro.
+    images: lista de arrays uint8 HWC (pueden tener tamaños distintos).
+    """
+    size = size or IMAGE_SIZE
+    matrices = np.asarray(matrices, dtype=np.float64)
+    ys, xs = np.mgrid[0:size, 0:size]
+    grid = np.stack([xs.ravel(), ys.ravel()], axis=1).astype(np.float64)  # (P, 2)
+    # Inversa de la semejanza para todo el lote: p = A^-1 (q - t)
+    inv_linear = np.linalg.inv(matrices[:, :, :2])
+    coords = np.einsum("bij,bpj->bpi", inv_linear, grid[None] - matrices[:, None, :, 2])
+    out = np.zeros((len(images), size * size, 3), dtype=np.float32)
+    for b, image in enumerate(images):
+        h, w = image.shape[:2]
+        x, y = coords[b, :, 0], coords[b, :, 1]
+        x0 = np.floor(x).astype(np.int64)
+        y0 = np.floor(y).astype(np.int64)
+        fx = (x - x0)[:, None]
+        fy = (y - y0)[:, None]
+        flat = image.reshape(-1, image.shape[2])
+        for dy, dx, weight in (
+            (0, 0, (1 - fx) * (1 - fy)),
+            (0, 1, fx * (1 - fy)),
+            (1, 0, (1 - fx) * fy),
+            (1, 1, fx * fy),
+        ):
+            xi, yi = x0 + dx, y0 + dy
+            inside = (xi >= 0) & (xi < w) & (yi >= 0) & (yi < h)
+            index = np.clip(yi, 0, h - 1) * w + np.clip(xi, 0, w - 1)
+            out[b] += np.where(inside[:, None], flat[index], 0) * weight
+    return np.clip(np.rint(out), 0, 255).astype(np.uint8).reshape(len(images), size, size, 3)
+
+
+class CenterDetector:
+    """Supone una cara centrada que ocupa la imagen (fotos ya recortadas)."""
+
+    name = "center"
+
+    def signature(self):
+        return self.name
+
+    def detect(self, images, paths=None):
+        """Puntos (5, 2) de la plantilla escalados a cada imagen, conservando la proporción."""
+        result = []
+        for image in images:
+            h, w = image.shape[:2]
+            side = min(h, w)
+            offset = np.array([(w - side) / 2.0, (h - side) / 2.0], dtype=np.float32)
+            result.append(REFERENCE_LANDMARKS * (side / 112.0) + offset)
+        return result
+
+
+class LandmarkFileDetector:
+    """
+    Puntos precalculados (p. ej. anotaciones del dataset o un detector ejecutado
+    aparte). Cada línea del fichero: ruta x1 y1 ... x5 y5, separados por espacios
+    o comas; la ruta es relativa a root (por defecto DATA_DIR) o absoluta.
+    """
+
+    name = "landmarks"
+
+    def __init__(self, path=None, root=None):
+        self.path = path or FACE_LANDMARKS_FILE
+        self.root = os.path.abspath(root or DATA_DIR)
+        if not os.path.isfile(self.path):
+            raise FileNotFoundError(f"No existe el fichero de puntos faciales: {self.path}")
+        self.landmarks = {}
+        with open(self.path) as f:
+            for line in f:
+                parts = line.replace(",", " ").split()
+                if len(parts) < 11 or parts[0].startswith("#"):
+                    continue
+                points = np.array([float(v) for v in parts[-10:]], dtype=np.float32).reshape(5, 2)
+                self.landmarks[self._key(" ".join(parts[:-10]))] = points
+
+    def _key(self, path):
+        path = path if os.path.isabs(path) else os.path.join(self.root, path)
+        return os.path.normpath(os.path.abspath(path))
+
+    def signature(self):
+        st = os.stat(self.path)
+        return f"{self.name}:{os.path.abspath(self.path)}:{st.st_size}:{st.st_mtime_ns}"
+
+    def detect(self, images, paths=None):
+        if paths is None:
+            return [None] * len(images)
+        return [
+            self.landmarks.get(os.path.normpath(os.path.abspath(p))) if isinstance(p, str) else None for p in paths
+        ]
+
+
+class OnnxDetector:
+    """
+    Detector en un modelo ONNX local (onnxruntime). Contrato del modelo:
+    - entrada (B, 3, S, S) float32 RGB en [0, 1], S = FACE_DETECTOR_INPUT_SIZE;
+    - salidas: puntuaciones (B, N) y puntos (B, N, 10) en píxeles de la entrada
+      (modelos tipo RetinaFace/SCRFD exportados con el decodificado de anclas).
+    Las imágenes se reducen a S (sin deformar, relleno negro) y se detecta todo el
+    lote en una llamada; de cada imagen se toma la cara de mayor puntuación.
+    """
+
+    name = "onnx"
+
+    def __init__(self, model_path=None, input_size=None, threshold=None):
+        try:
+            import onnxruntime as ort
+        except ImportError as e:
+            raise ImportError("El detector ONNX requiere onnxruntime: pip install onnxruntime") from e
+        self.model_path = model_path or FACE_DETECTOR_MODEL
+        if not os.path.isfile(self.model_path):
+            raise FileNotFoundError(f"No existe el modelo de detección: {self.model_path}")
+        self.input_size = input_size or FACE_DETECTOR_INPUT_SIZE
+        self.threshold = FACE_DETECTOR_THRESHOLD if threshold is None else threshold
+        self.session = ort.InferenceSession(self.model_path, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def signature(self):
+        with open(self.model_path, "rb") as f:
+            digest = hashlib.sha1(f.read()).hexdigest()[:16]
+        return f"{self.name}:{digest}:{self.input_size}:{self.threshold}"
+
+    def detect(self, images, paths=None):
+        s = self.input_size
+        batch = np.zeros((len(images), s, s, 3), dtype=np.uint8)
+        scales = np.empty(len(images), dtype=np.float32)
+        for i, image in enumerate(images):
+            h, w = image.shape[:2]
+            scales[i] = s / max(h, w)
+            nw, nh = max(1, round(w * scales[i])), max(1, round(h * scales[i]))
+            batch[i, :nh, :nw] = np.asarray(Image.fromarray(image).resize((nw, nh), Image.BILINEAR))
+        inputs = batch.transpose(0, 3, 1, 2).astype(np.float32) / 255.0
+        scores, points = self.session.run(None, {self.input_name: inputs})[:2]
+        best = scores.argmax(axis=1)
+        rows = np.arange(len(images))
+        found = scores[rows, best] >= self.threshold
+        points = points[rows, best].reshape(-1, 5, 2) / scales[:, None, None]
+        return [points[i] if found[i] else None for i in rows]
+
+
+DETECTORS = {
+    CenterDetector.name: CenterDetector,
+    LandmarkFileDetector.name: LandmarkFileDetector,
+    OnnxDetector.name: OnnxDetector,
+}
+
+
+def create_detector(name=None, **kwargs):
+    """Instancia el detector name (por defecto FACE_DETECTOR)."""
+    name = name or FACE_DETECTOR
+    if name not in DETECTORS:
+        raise ValueError(f"Detector desconocido: {name} ({', '.join(DETECTORS)})")
+    return DETECTORS[name](**kwargs)
+
+
+class FaceAligner:
+    """
+    Etapa de alineado por lotes: detecta puntos, estima las semejanzas y recorta.
+    Las imágenes sin cara detectada se alinean con CenterDetector.
+    """
+
+    def __init__(self, detector=None, size=None):
+        self.detector = detector if detector is not None else create_detector()
+        self.size = size or IMAGE_SIZE
+        self._fallback = CenterDetector()
+        self.detected = 0
+        self.fallbacks = 0
+        # Máscara de caras detectadas del último lote (False: recorte centrado)
+        self.last_found = np.zeros(0, dtype=bool)
+
+    def signature(self):
+        """Identifica la configuración de alineado (para claves de caché)."""
+        return f"align-{self.size}-{self.detector.signature()}"
+
+    def align(self, images, paths=None):
+        """Recortes alineados (B, size, size, 3) uint8 de imágenes uint8 HWC RGB."""
+        if not len(images):
+            return np.zeros((0, self.size, self.size, 3), dtype=np.uint8)
+        landmarks = self.detector.detect(images, paths)
+        missing = [i for i, points in enumerate(landmarks) if points is None]
+        self.last_found = np.array([points is not None for points in landmarks], dtype=bool)
+        if missing:
+            fallback = self._fallback.detect([images[i] for i in missing])
+            for i, points in zip(missing, fallback):
+                landmarks[i] = points
+        self.detected += len(images) - len(missing)
+        self.fallbacks += len(missing)
+        matrices = estimate_similarity(np.stack(landmarks), reference_landmarks(self.size))
+        images = list(images)
+        for i, matrix in enumerate(matrices):
+            # Cara mucho mayor que el recorte: reducir antes por un factor entero
+            # (media por bloques) evita el aliasing del muestreo bilineal y abarata el recorte
+            factor = int(1.0 / np.sqrt(abs(np.linalg.det(matrix[:, :2]))))
+            if factor >= 2:
+                images[i] = np.asarray(Image.fromarray(images[i]).reduce(factor))
+                offset = (factor - 1) / 2.0
+                matrix[:, 2] += matrix[:, :2] @ np.array([offset, offset])
+                matrix[:, :2] *= factor
+        return warp_faces(images, matrices, self.size)
+
+    def align_paths(self, paths):
+        """Decodifica y alinea un lote de ficheros."""
+        images = [np.asarray(Image.open(p).convert("RGB")) for p in paths]
+        return self.align(images, paths)
+
+
+_aligner = None
+
+
+def get_aligner():
+    """FaceAligner de la configuración (FACE_DETECTOR), o None si está desactivado."""
+    global _aligner
+    if FACE_DETECTOR == "none":
+        return None
+    if _aligner is None:
+        _aligner = FaceAligner()
+    return _aligner
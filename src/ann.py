@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+"""
+Índice aproximado (IVF + cuantización de producto) en NumPy puro para galerías
+muy grandes de embeddings L2 normalizados.
+- IVF: k-means grueso; cada embedding va a la lista de su centroide más cercano.
+- PQ: el residuo (embedding - centroide) se divide en m subvectores y cada uno se
+  codifica con 1 byte (256 centroides por subespacio).
+Una consulta solo recorre las nprobe listas más cercanas usando tablas de distancias.
+"""
+
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import ANN_NLIST, ANN_M, ANN_NPROBE, SEED
+
+PQ_KSUB = 256  # centroides por subespacio (códigos uint8)
+ASSIGN_CHUNK = 16384  # filas por bloque al asignar centroides (acota las matrices N x K)
+
+
+def _sq_dists(x, c):
+    """Distancias euclídeas al cuadrado entre filas de x (N, D) y c (K, D)."""
+    d = (x * x).sum(1)[:, None] - 2.0 * (x @ c.T) + (c * c).sum(1)[None, :]
+    return np.maximum(d, 0.0)
+
+
+def _nearest(x, c, chunk=ASSIGN_CHUNK):
+    """Índice del centroide más cercano de cada fila de x, por bloques de chunk filas."""
+    out = np.empty(x.shape[0], dtype=np.int64)
+    for start in range(0, x.shape[0], chunk):
+        out[start:start + chunk] = _sq_dists(x[start:start + chunk], c).argmin(1)
+    return out
+
+
+def kmeans(x, k, n_iter=20, seed=SEED, max_points=None):
+    """
+    k-means de Lloyd en NumPy. Entrena sobre una submuestra de como mucho
+    max_points puntos (por defecto 256 * k). Devuelve centroides (k, D) float32.
+    """
+    rng = np.random.default_rng(seed)
+    x = np.asarray(x, dtype=np.float32)
+    max_points = max_points or 256 * k
+    if x.shape[0] > max_points:
+        x = x[rng.choice(x.shape[0], max_points, replace=False)]
+    if x.shape[0] < k:
+        raise ValueError(f"Se necesitan al menos {k} puntos para entrenar k-means ({x.shape[0]} dados)")
+    centroids = x[rng.choice(x.shape[0], k, replace=False)].copy()
+    for _ in range(n_iter):
+        assign = _nearest(x, centroids)
+        counts = np.bincount(assign, minlength=k).astype(np.float32)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, x)
+        nonempty = counts > 0
+        centroids[nonempty] = sums[nonempty] / counts[nonempty, None]
+        # Clusters vacíos: reiniciar en puntos aleatorios
+        empty = np.flatnonzero(~nonempty)
+        if empty.size:
+            centroids[empty] = x[rng.choice(x.shape[0], empty.size, replace=False)]
+    return centroids
+
+
+class IVFPQIndex:
+    """
+    Índice IVF-PQ para búsqueda aproximada por similitud coseno.
+    Uso: index = IVFPQIndex(); index.train(emb); index.add(emb); index.search(q, k).
+    """
+
+    def __init__(self, nlist=None, m=None, nprobe=None, seed=SEED):
+        self.nlist = nlist or ANN_NLIST
+        self.m = m or ANN_M
+        self.nprobe = nprobe or ANN_NPROBE
+        self.seed = seed
+        self.coarse = None    # (nlist, D)
+        self.codebooks = None  # (m, ksub, D/m), ksub = min(256, puntos de entrenamiento)
+        # Listas invertidas en formato CSR (ordenadas por lista)
+        self.codes = np.zeros((0, self.m), dtype=np.uint8)
+        self.ids = np.zeros((0,), dtype=np.int64)
+        self.offsets = np.zeros((self.nlist + 1,), dtype=np.int64)
+
+    def __len__(self):
+        return int(self.ids.shape[0])
+
+    @property
+    def is_trained(self):
+        return self.coarse is not None
+
+    def memory_bytes(self):
+        """Memoria ocupada por códigos, ids y tablas del índice."""
+        total = self.codes.nbytes + self.ids.nbytes + self.offsets.nbytes
+        if self.is_trained:
+            total += self.coarse.nbytes + self.codebooks.nbytes
+        return int(total)
+
+    def train(self, x):
+        """
+        Entrena centroides gruesos y libros de códigos PQ sobre x (N, D).
+        Con menos de 256 puntos cada subespacio usa tantos centroides como puntos.
+        """
+        x = np.asarray(x, dtype=np.float32)
+        if x.shape[1] % self.m:
+            raise ValueError(f"La dimensión {x.shape[1]} no es divisible por m={self.m}")
+        self.coarse = kmeans(x, self.nlist, seed=self.seed)
+        # Los libros de códigos se entrenan sobre una submuestra (como kmeans)
+        ksub = min(PQ_KSUB, x.shape[0])
+        if x.shape[0] > 256 * ksub:
+            rng = np.random.default_rng(self.seed)
+            x = x[rng.choice(x.shape[0], 256 * ksub, replace=False)]
+        residuals = x - self.coarse[_nearest(x, self.coarse)]
+        dsub = x.shape[1] // self.m
+        self.codebooks = np.stack([
+            kmeans(residuals[:, j * dsub:(j + 1) * dsub], ksub, seed=self.seed + j)
+            for j in range(self.m)
+        ])
+        return self
+
+    def _encode(self, x, lists):
+        """Códigos PQ (N, m) del residuo de cada fila respecto a su centroide, por bloques."""
+        dsub = self.codebooks.shape[2]
+        codes = np.empty((x.shape[0], self.m), dtype=np.uint8)
+        for start in range(0, x.shape[0], ASSIGN_CHUNK):
+            end = start + ASSIGN_CHUNK
+            residuals = x[start:end] - self.coarse[lists[start:end]]
+            for j in range(self.m):
+                codes[start:end, j] = _sq_dists(residuals[:, j * dsub:(j + 1) * dsub], self.codebooks[j]).argmin(1)
+        return codes
+
+    def add(self, x, ids=None):
+        """Añade embeddings (N, D); ids por defecto consecutivos desde len(self)."""
+        if not self.is_trained:
+            raise RuntimeError("El índice no está entrenado: llama antes a train()")
+        x = np.asarray(x, dtype=np.float32)
+        if ids is None:
+            ids = np.arange(len(self), len(self) + x.shape[0], dtype=np.int64)
+        lists = _nearest(x, self.coarse)
+        codes = self._encode(x, lists)
+        # Reconstruir el CSR fusionando con las listas existentes
+        old_lists = np.repeat(np.arange(self.nlist), np.diff(self.offsets))
+        all_lists = np.concatenate([old_lists, lists])
+        order = np.argsort(all_lists, kind="stable")
+        self.codes = np.concatenate([self.codes, codes])[order]
+        self.ids = np.concatenate([self.ids, np.asarray(ids, dtype=np.int64)])[order]
+        self.offsets = np.concatenate([[0], np.cumsum(np.bincount(all_lists, minlength=self.nlist))])
+        return self
+
+    def search(self, queries, k=5, nprobe=None):
+        """
+        Top-k aproximado para cada consulta (Q, D).
+        Devuelve (ids (Q, k), similitudes coseno aproximadas (Q, k)); -1 si faltan candidatos.
+        """
+        nprobe = min(nprobe or self.nprobe, self.nlist)
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        dsub = self.codebooks.shape[2]
+        out_ids = np.full((queries.shape[0], k), -1, dtype=np.int64)
+        out_sims = np.full((queries.shape[0], k), -np.inf, dtype=np.float32)
+        coarse_d = _sq_dists(queries, self.coarse)
+        probes = np.argpartition(coarse_d, nprobe - 1, axis=1)[:, :nprobe]
+        sub_idx = np.arange(self.m)
+        for qi, q in enumerate(queries):
+            lists = probes[qi]
+            starts, ends = self.offsets[lists], self.offsets[lists + 1]
+            sizes = ends - starts
+            if sizes.sum() == 0:
+                continue
+            rows = np.concatenate([np.arange(s, e) for s, e in zip(starts, ends)])
+            owner = np.repeat(np.arange(nprobe), sizes)
+            # Tablas de distancias (nprobe, m, ksub) entre residuo de la consulta y códigos
+            r = (q[None, :] - self.coarse[lists]).reshape(nprobe, self.m, 1, dsub)
+            lut = ((r - self.codebooks[None]) ** 2).sum(-1)
+            dist = lut[owner[:, None], sub_idx[None, :], self.codes[rows]].sum(1)
+            kk = min(k, dist.shape[0])
+            top = np.argpartition(dist, kk - 1)[:kk]
+            top = top[np.argsort(dist[top])]
+            out_ids[qi, :kk] = self.ids[rows[top]]
+            # Vectores unitarios: ||a - b||^2 = 2 - 2 cos(a, b)
+            out_sims[qi, :kk] = 1.0 - 0.5 * dist[top]
+        return out_ids, out_sims
+
+    def save(self, path):
+        """Guarda el índice en un .npz."""
+        np.savez(
+            path, coarse=self.coarse, codebooks=self.codebooks, codes=self.codes,
+            ids=self.ids, offsets=self.offsets, params=np.array([self.nlist, self.m, self.nprobe, self.seed]),
+        )
+
+    @classmethod
+    def load(cls, path):
+        """Carga un índice guardado con save()."""
+        data = np.load(path)
+        nlist, m, nprobe, seed = (int(v) for v in data["params"])
+        index = cls(nlist=nlist, m=m, nprobe=nprobe, seed=seed)
+        index.coarse = data["coarse"]
+        index.codebooks = data["codebooks"]
+        index.codes = data["codes"]
+        index.ids = data["ids"]
+        index.offsets = data["offsets"]
+        return index
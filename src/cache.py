@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+"""
+Caché en disco de imágenes preprocesadas y embeddings.
+- Clave: hash del contenido del fichero (+ tamaño de imagen, + checkpoint para embeddings).
+- Imágenes: array uint8 (IMAGE_SIZE, IMAGE_SIZE, 3) ya redimensionado o alineado
+  (sin decodificar JPEG ni detectar la cara); la clave incluye la configuración de
+  alineado (src/alignment.py) o, sin alineado, el modo de decodificación (DECODE_DRAFT).
+- Embeddings: vector float32 del backbone (sin pasada forward).
+Expulsión LRU (por fecha de último acceso) con límite de tamaño total.
+"""
+
+import hashlib
+import os
+import sys
+import threading
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import CACHE_DIR, CACHE_MAX_BYTES, IMAGE_SIZE, DECODE_DRAFT, DECODE_DRAFT_FACTOR
+from src.alignment import get_aligner
+
+
+def file_digest(path, chunk_size=1 << 20):
+    """Hash SHA-1 del contenido de un fichero."""
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class FaceCache:
+    """Caché LRU en disco (ficheros .npy) con tamaño máximo en bytes."""
+
+    def __init__(self, cache_dir=None, max_bytes=None, variant=None):
+        self.cache_dir = cache_dir or CACHE_DIR
+        self.max_bytes = CACHE_MAX_BYTES if max_bytes is None else max_bytes
+        self.hits = 0
+        self.misses = 0
+        # Preprocesado de las imágenes (alineado activo o decodificación reducida), parte de la clave
+        if variant is None:
+            aligner = get_aligner()
+            if aligner is not None:
+                variant = aligner.signature()
+            else:
+                variant = f"draft-{DECODE_DRAFT_FACTOR}" if DECODE_DRAFT else ""
+        self.variant = hashlib.sha1(variant.encode()).hexdigest()[:12] if variant else ""
+        self._lock = threading.Lock()
+        # (ruta, mtime, tamaño) -> hash, para no releer ficheros ya vistos en este proceso
+        self._digests = {}
+        # ruta en caché -> [último acceso, bytes]
+        self._entries = {}
+        self._total_bytes = 0
+        self._scan()
+
+    def _scan(self):
+        if not os.path.isdir(self.cache_dir):
+            return
+        for root, _, files in os.walk(self.cache_dir):
+            for f in files:
+                if f.endswith(".npy"):
+                    path = os.path.join(root, f)
+                    st = os.stat(path)
+                    self._entries[path] = [st.st_mtime, st.st_size]
+                    self._total_bytes += st.st_size
+
+    def digest(self, image_path):
+        """Hash del contenido de image_path (memoizado por mtime y tamaño)."""
+        st = os.stat(image_path)
+        key = (os.path.abspath(image_path), st.st_mtime_ns, st.st_size)
+        digest = self._digests.get(key)
+        if digest is None:
+            digest = file_digest(image_path)
+            self._digests[key] = digest
+        return digest
+
+    def _path(self, kind, key):
+        return os.path.join(self.cache_dir, kind, key[:2], key + ".npy")
+
+    def _get(self, path):
+        try:
+            arr = np.load(path)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is None:
+                # Escrito por otro proceso tras el escaneo inicial
+                entry = self._entries[path] = [0.0, os.path.getsize(path)]
+                self._total_bytes += entry[1]
+            entry[0] = _touch(path)
+        self.hits += 1
+        return arr
+
+    def _put(self, path, arr):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            np.save(f, arr)
+        os.replace(tmp, path)
+        size = os.path.getsize(path)
+        with self._lock:
+            old = self._entries.get(path)
+            if old is not None:
+                self._total_bytes -= old[1]
+            self._entries[path] = [os.path.getmtime(path), size]
+            self._total_bytes += size
+            self._evict()
+
+    def _evict(self):
+        if self._total_bytes <= self.max_bytes:
+            return
+        # Expulsar los menos usados recientemente hasta bajar al 90% del límite
+        target = int(self.max_bytes * 0.9)
+        for path, (_, size) in sorted(self._entries.items(), key=lambda kv: kv[1][0]):
+            if self._total_bytes <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            del self._entries[path]
+            self._total_bytes -= size
+
+    @property
+    def total_bytes(self):
+        return self._total_bytes
+
+    def image_key(self, image_path):
+        key = f"{self.digest(image_path)}-{IMAGE_SIZE}"
+        return f"{key}-{self.variant}" if self.variant else key
+
+    def get_image(self, image_path):
+        """Imagen redimensionada uint8 (HWC) o None si no está en caché."""
+        return self._get(self._path("images", self.image_key(image_path)))
+
+    def put_image(self, image_path, arr):
+        self._put(self._path("images", self.image_key(image_path)), np.asarray(arr, dtype=np.uint8))
+
+    def embedding_key(self, image_path, model_key):
+        return hashlib.sha1(f"{self.image_key(image_path)}-{model_key}".encode()).hexdigest()
+
+    def get_embedding(self, image_path, model_key):
+        """Embedding float32 calculado con el checkpoint model_key, o None."""
+        return self._get(self._path("embeddings", self.embedding_key(image_path, model_key)))
+
+    def put_embedding(self, image_path, model_key, emb):
+        self._put(self._path("embeddings", self.embedding_key(image_path, model_key)), np.asarray(emb, dtype=np.float32))
+
+    def clear(self):
+        """Vacía la caché."""
+        with self._lock:
+            for path in list(self._entries):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            self._entries.clear()
+            self._total_bytes = 0
+
+
+def _touch(path):
+    """Actualiza la fecha de acceso/modificación (orden LRU) y la devuelve."""
+    try:
+        os.utime(path, None)
+        return os.path.getmtime(path)
+    except OSError:
+        return 0.0
+
+
+def checkpoint_key(ckpt_path):
+    """Identificador del checkpoint (nombre, tamaño y fecha) para invalidar embeddings."""
+    st = os.stat(ckpt_path)
+    raw = f"{os.path.abspath(ckpt_path)}-{st.st_size}-{st.st_mtime_ns}"
+    return hashlib.sha1(raw.encode()).hexdigest()[:16]
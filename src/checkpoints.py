@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+"""
+Checkpoints de entrenamiento: guardado asíncrono, manifiesto y selección.
+- Cada checkpoint incluye los pesos de la red y el estado del optimizador, para
+  poder reanudar el entrenamiento.
+- La copia de los parámetros se hace en el paso de entrenamiento; la escritura a
+  disco, en un hilo aparte (no bloquea el siguiente paso).
+- El manifiesto (checkpoints.json) registra época, paso global y métrica de
+  validación (con su modo, "max" o "min") de cada checkpoint; la inferencia lo usa
+  para cargar el mejor de forma determinista.
+"""
+
+import json
+import os
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import mindspore as ms
+import numpy as np
+from mindspore.train.callback import Callback
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import (
+    CHECKPOINT_DIR,
+    CHECKPOINT_KEEP,
+    CHECKPOINT_ASYNC,
+    CHECKPOINT_METRIC,
+    CHECKPOINT_METRIC_MODE,
+    CHECKPOINT_SELECT,
+)
+
+CHECKPOINT_PREFIX = "face_biometrics"
+MANIFEST_FILE = "checkpoints.json"
+METRIC_MODES = ("max", "min")
+
+
+def load_manifest(checkpoint_dir=None):
+    """Entradas del manifiesto cuyo fichero existe (lista vacía si no hay manifiesto)."""
+    checkpoint_dir = checkpoint_dir or CHECKPOINT_DIR
+    path = os.path.join(checkpoint_dir, MANIFEST_FILE)
+    if not os.path.isfile(path):
+        return []
+    with open(path) as f:
+        entries = json.load(f)["checkpoints"]
+    return [e for e in entries if os.path.isfile(os.path.join(checkpoint_dir, e["file"]))]
+
+
+def _write_manifest(checkpoint_dir, entries):
+    path = os.path.join(checkpoint_dir, MANIFEST_FILE)
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump({"checkpoints": entries}, f, indent=2)
+    os.replace(tmp, path)
+
+
+def _check_mode(mode):
+    if mode not in METRIC_MODES:
+        raise ValueError(f"Modo de métrica desconocido: {mode!r} (usa 'max' o 'min')")
+    return mode
+
+
+def _best(entries, mode=None):
+    """
+    Entrada con mejor métrica: la mayor con mode "max", la menor con "min" (por
+    defecto, el modo guardado en el manifiesto o CHECKPOINT_METRIC_MODE). Empate o
+    sin métrica: la más reciente.
+    """
+    scored = [e for e in entries if e.get("metric") is not None]
+    if not scored:
+        return max(entries, key=lambda e: e["step"])
+    mode = _check_mode(mode or scored[-1].get("mode", CHECKPOINT_METRIC_MODE))
+    sign = 1.0 if mode == "max" else -1.0
+    return max(scored, key=lambda e: (sign * e["metric"], e["step"]))
+
+
+def _step_from_name(name):
+    """Época y paso de un nombre face_biometrics-<época>_<paso>.ckpt (ModelCheckpoint)."""
+    match = re.search(r"-(\d+)_(\d+)\.ckpt$", name)
+    return (int(match.group(1)), int(match.group(2))) if match else (0, 0)
+
+
+def select_checkpoint(checkpoint_dir=None, select=None):
+    """
+    Ruta del checkpoint a cargar: "best" (mejor métrica de validación) o "latest"
+    (último paso) según el manifiesto. Sin manifiesto, el de mayor época/paso
+    según el nombre y, a igualdad, el más reciente.
+    """
+    checkpoint_dir = checkpoint_dir or CHECKPOINT_DIR
+    select = select or CHECKPOINT_SELECT
+    entries = load_manifest(checkpoint_dir)
+    if entries:
+        entry = _best(entries) if select == "best" else max(entries, key=lambda e: e["step"])
+        return os.path.join(checkpoint_dir, entry["file"])
+    ckpts = [
+        f for f in os.listdir(checkpoint_dir) if f.startswith(CHECKPOINT_PREFIX) and f.endswith(".ckpt")
+    ] if os.path.isdir(checkpoint_dir) else []
+    if not ckpts:
+        raise FileNotFoundError(f"No hay .ckpt en {checkpoint_dir}")
+    newest = max(ckpts, key=lambda f: (_step_from_name(f), os.path.getmtime(os.path.join(checkpoint_dir, f))))
+    return os.path.join(checkpoint_dir, newest)
+
+
+def resume_training(net, optimizer, checkpoint_dir=None):
+    """
+    Carga en net y optimizer el último checkpoint del manifiesto (pesos y estado
+    del optimizador). Devuelve el paso global ya completado (0 si no hay nada que
+    reanudar): la "época" de MindSpore depende de sink mode y sink_size, así que
+    quien llama la calcula con los ajustes actuales.
+    """
+    entries = load_manifest(checkpoint_dir or CHECKPOINT_DIR)
+    if not entries:
+        return 0
+    entry = max(entries, key=lambda e: e["step"])
+    param_dict = ms.load_checkpoint(os.path.join(checkpoint_dir or CHECKPOINT_DIR, entry["file"]))
+    ms.load_param_into_net(net, param_dict)
+    ms.load_param_into_net(optimizer, param_dict)
+    return entry["step"]
+
+
+class CheckpointManager(Callback):
+    """
+    Sustituye a ModelCheckpoint: al final de cada época evalúa (eval_fn, opcional),
+    guarda red + optimizador de forma asíncrona, actualiza el manifiesto y conserva
+    los keep checkpoints más recientes más el mejor por métrica (mayor o menor según
+    mode). Con reset se
+    descarta el manifiesto de un entrenamiento anterior. Los parámetros cuyo nombre
+    empieza por algún prefijo de exclude no se guardan (p. ej. el profesor en destilación).
+    """
+
+    def __init__(self, directory=None, eval_fn=None, keep=None, metric=None, mode=None, async_save=None,
+                 reset=False, exclude=()):
+        super().__init__()
+        self.directory = directory or CHECKPOINT_DIR
+        self.eval_fn = eval_fn
+        self.keep = keep or CHECKPOINT_KEEP
+        self.metric = metric or CHECKPOINT_METRIC
+        self.mode = _check_mode(mode or CHECKPOINT_METRIC_MODE)
+        self.async_save = CHECKPOINT_ASYNC if async_save is None else async_save
+        self.exclude = tuple(exclude)
+        self._pool = ThreadPoolExecutor(max_workers=1) if self.async_save else None
+        self._pending = None
+        self._lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+        manifest = os.path.join(self.directory, MANIFEST_FILE)
+        if reset and os.path.isfile(manifest):
+            # Entrenamiento nuevo (sin reanudar): el manifiesto anterior deja de aplicar
+            os.remove(manifest)
+
+    def on_train_epoch_end(self, run_context):
+        cb_params = run_context.original_args()
+        metric = None
+        if self.eval_fn is not None:
+            value = self.eval_fn().get(self.metric)
+            metric = float(value) if value is not None else None
+            print(f"Época {cb_params.cur_epoch_num}: {self.metric} validación = {metric}")
+        # Copia de los parámetros en este hilo; la escritura puede ir en segundo plano
+        snapshot = [
+            {"name": p.name, "data": ms.Tensor(np.array(p.asnumpy(), copy=True))}
+            for p in cb_params.train_network.get_parameters()
+            if not (self.exclude and p.name.startswith(self.exclude))
+        ]
+        # cur_step_num vuelve a empezar al reanudar; global_step del optimizador no
+        optimizer = getattr(cb_params, "optimizer", None)
+        step = cb_params.cur_step_num
+        if optimizer is not None:
+            step = int(optimizer.global_step.asnumpy().reshape(-1)[0])
+        entry = {
+            "file": f"{CHECKPOINT_PREFIX}-{cb_params.cur_epoch_num}_{step}.ckpt",
+            "epoch": cb_params.cur_epoch_num,
+            "step": step,
+            "metric": metric,
+            "mode": self.mode,
+            "time": time.time(),
+        }
+        if self._pool is None:
+            self._save(snapshot, entry)
+        else:
+            self.wait()  # como mucho una escritura en curso
+            self._pending = self._pool.submit(self._save, snapshot, entry)
+
+    def on_train_end(self, run_context):
+        self.wait()
+
+    def wait(self):
+        """Espera a que termine la escritura en curso (y propaga sus errores)."""
+        if self._pending is not None:
+            self._pending.result()
+            self._pending = None
+
+    def _save(self, snapshot, entry):
+        path = os.path.join(self.directory, entry["file"])
+        # Fichero temporal oculto (.ckpt: MindSpore añade la extensión si falta)
+        tmp = os.path.join(self.directory, "." + entry["file"])
+        ms.save_checkpoint(snapshot, tmp)
+        os.replace(tmp, path)
+        with self._lock:
+            entries = [e for e in load_manifest(self.directory) if e["file"] != entry["file"]] + [entry]
+            entries.sort(key=lambda e: e["step"])
+            best = _best(entries, self.mode)
+            kept = entries[-self.keep:] + ([best] if best not in entries[-self.keep:] else [])
+            for e in entries:
+                if e not in kept:
+                    os.remove(os.path.join(self.directory, e["file"]))
+            _write_manifest(self.directory, sorted(kept, key=lambda e: e["step"]))
@@ -1,19 +1,51 @@
 # -*- coding: utf-8 -*-
 """Carga y preprocesado de datos para entrenamiento y prueba (100% local)."""
 
+import json
 import os
+from functools import lru_cache
+
+import numpy as np
 import mindspore.dataset as ds
 from mindspore.dataset import vision
 
 import sys
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from config import TRAIN_DIR, VAL_DIR, IMAGE_SIZE, BATCH_SIZE
+from config import (
+    TRAIN_DIR,
+    VAL_DIR,
+    IMAGE_SIZE,
+    BATCH_SIZE,
+    USE_SHARDS,
+    SHARDS_TRAIN_DIR,
+    SHARDS_VAL_DIR,
+    ALIGNED_TRAIN_DIR,
+    ALIGNED_VAL_DIR,
+    FACE_DETECTOR,
+    DATASET_WORKERS,
+    DATASET_STAGE_SPLIT,
+    DATASET_PYTHON_MULTIPROCESSING,
+    DATASET_PREFETCH_SIZE,
+    DATASET_SHARED_MEM,
+    DATASET_MAX_ROWSIZE,
+    BALANCED_SAMPLER,
+    PK_IMAGES_PER_IDENTITY,
+    PK_BATCHES_PER_EPOCH,
+    PK_LIST_CACHE,
+    SEED,
+)
+
+IMAGE_EXTENSIONS = [".jpg", ".jpeg", ".png", ".bmp"]
+SHARD_INDEX_FILE = "index.json"
 
 
-def get_train_transforms():
-    """Transformaciones para entrenamiento (imagen ya decodificada con decode=True)."""
-    return [
-        vision.Resize((IMAGE_SIZE, IMAGE_SIZE)),
+def get_train_transforms(resize=True):
+    """
+    Transformaciones para entrenamiento (imagen ya decodificada con decode=True).
+    resize=False para shards empaquetados (caras ya redimensionadas).
+    """
+    transforms = [vision.Resize((IMAGE_SIZE, IMAGE_SIZE))] if resize else []
+    return transforms + [
         vision.RandomHorizontalFlip(0.5),
         vision.HWC2CHW(),
         vision.Normalize(
@@ -24,10 +56,10 @@ def get_train_transforms():
     ]
 
 
-def get_eval_transforms():
+def get_eval_transforms(resize=True):
     """Transformaciones para validación/prueba: resize y normalización."""
-    return [
-        vision.Resize((IMAGE_SIZE, IMAGE_SIZE)),
+    transforms = [vision.Resize((IMAGE_SIZE, IMAGE_SIZE))] if resize else []
+    return transforms + [
         vision.HWC2CHW(),
         vision.Normalize(
             mean=[0.485, 0.456, 0.406],
@@ -37,13 +69,253 @@ def get_eval_transforms():
     ]
 
 
-def create_train_dataset(data_dir=None, batch_size=None, shuffle=True):
+def configure_pipeline(prefetch_size=None, shared_mem=None):
+    """
+    Opciones globales del pipeline de MindSpore (prefetch y memoria compartida).
+    Afectan a todo el proceso: se llama una vez al arrancar (train.py, benchmarks).
+    """
+    ds.config.set_prefetch_size(prefetch_size or DATASET_PREFETCH_SIZE)
+    ds.config.set_enable_shared_mem(DATASET_SHARED_MEM if shared_mem is None else shared_mem)
+
+
+def _parallel_options(workers=None, python_multiprocessing=None):
+    """
+    Workers de (fuente, map, batch): el total (workers o DATASET_WORKERS, como mucho
+    las CPUs) se reparte según DATASET_STAGE_SPLIT sin superarlo. Map y batch se
+    redondean a la baja y la fuente (lectura/decodificación) se queda con el resto.
+    MindSpore exige al menos 1 worker por etapa: solo por debajo de 3 en total se
+    excede el presupuesto, con (1, 1, 1).
+    """
+    total = max(1, min(workers or DATASET_WORKERS, os.cpu_count() or 1))
+    rest = [max(1, int(total * share)) for share in DATASET_STAGE_SPLIT[1:]]
+    # El mínimo de 1 en map y batch no puede dejar a la fuente sin workers
+    while sum(rest) > total - 1 and max(rest) > 1:
+        rest[rest.index(max(rest))] -= 1
+    stages = (max(1, total - sum(rest)), *rest)
+    if python_multiprocessing is None:
+        python_multiprocessing = DATASET_PYTHON_MULTIPROCESSING
+    return stages, python_multiprocessing
+
+
+class PackedFaceShards:
+    """
+    Fuente de acceso aleatorio sobre shards empaquetados por scripts/pack_shards.py:
+    arrays uint8 (N, IMAGE_SIZE, IMAGE_SIZE, 3) en .npy abiertos con memory-map
+    más sus etiquetas. Evita abrir y decodificar un JPEG por muestra y época.
+    """
+
+    def __init__(self, shard_dir):
+        index = load_shard_index(shard_dir)
+        self.identities = index["identities"]
+        self._images = [
+            np.load(os.path.join(shard_dir, sh["images"]), mmap_mode="r") for sh in index["shards"]
+        ]
+        self._labels = np.concatenate(
+            [np.load(os.path.join(shard_dir, sh["labels"])) for sh in index["shards"]]
+        ).astype(np.int32) if index["shards"] else np.zeros((0,), dtype=np.int32)
+        self._offsets = np.cumsum([0] + [len(a) for a in self._images])
+
+    def __len__(self):
+        return int(self._offsets[-1])
+
+    @property
+    def labels(self):
+        """Etiquetas (N,) int32 de todas las muestras, en orden de índice (solo lectura)."""
+        view = self._labels.view()
+        view.flags.writeable = False
+        return view
+
+    def __getitem__(self, idx):
+        shard = int(np.searchsorted(self._offsets, idx, side="right")) - 1
+        image = np.array(self._images[shard][idx - self._offsets[shard]])
+        return image, np.array(self._labels[idx], dtype=np.int32)
+
+
+class IdentityBalancedSampler:
+    """
+    Fuente iterable de lotes equilibrados P×K: en cada lote, P identidades distintas
+    al azar y K imágenes de cada una (con reemplazo si la identidad tiene menos de K).
+    Al inicio solo se listan las carpetas de identidad; los ficheros de cada
+    identidad se listan la primera vez que sale (caché LRU acotada). Con shard_dir
+    las posiciones de cada identidad salen de las etiquetas de los shards.
+    Emite filas (bytes del fichero o imagen HWC de los shards, etiqueta) en orden
+    de lote, para usar con GeneratorDataset(shuffle=False) y batch(P * K).
+    """
+
+    def __init__(self, data_dir=None, shard_dir=None, identities_per_batch=2, images_per_identity=None,
+                 batches_per_epoch=None, seed=None, list_cache=None):
+        self.data_dir = data_dir or TRAIN_DIR
+        self.p = identities_per_batch
+        self.k = images_per_identity or PK_IMAGES_PER_IDENTITY
+        self.seed = SEED if seed is None else seed
+        self._epoch = 0
+        self._shards = None
+        if shard_dir:
+            self._shards = PackedFaceShards(shard_dir)
+            self.identities = self._shards.identities
+            labels = self._shards.labels
+            self._order = np.argsort(labels, kind="stable")
+            self._starts = np.searchsorted(labels[self._order], np.arange(len(self.identities) + 1))
+            self._nonempty = np.flatnonzero(np.diff(self._starts) > 0)
+        else:
+            self._nonempty = None  # se calcula solo si hace falta (ver _sample_identities)
+            with os.scandir(self.data_dir) as entries:
+                self.identities = sorted(e.name for e in entries if e.is_dir())
+        available = len(self.identities) if self._nonempty is None else len(self._nonempty)
+        if available < self.p:
+            raise ValueError(f"Se necesitan al menos {self.p} identidades con imágenes para lotes P×K; hay {available}")
+        batches_per_epoch = PK_BATCHES_PER_EPOCH if batches_per_epoch is None else batches_per_epoch
+        self.batches_per_epoch = batches_per_epoch or max(1, len(self.identities) // self.p)
+        self._files = lru_cache(maxsize=list_cache or PK_LIST_CACHE)(self._list_identity)
+
+    def __len__(self):
+        return self.batches_per_epoch * self.p * self.k
+
+    def _list_identity(self, label):
+        if self._shards is not None:
+            return self._order[self._starts[label]:self._starts[label + 1]]
+        identity_dir = os.path.join(self.data_dir, self.identities[label])
+        return sorted(
+            os.path.join(identity_dir, f) for f in os.listdir(identity_dir)
+            if os.path.splitext(f)[1].lower() in IMAGE_EXTENSIONS
+        )
+
+    def _nonempty_labels(self):
+        """Identidades con al menos una imagen (lista todas las carpetas una vez)."""
+        if self._nonempty is None:
+            self._nonempty = np.array(
+                [label for label in range(len(self.identities)) if len(self._list_identity(label))], dtype=np.int64
+            )
+            if len(self._nonempty) < self.p:
+                raise ValueError(
+                    f"Se necesitan al menos {self.p} identidades con imágenes para lotes P×K; "
+                    f"hay {len(self._nonempty)} en {self.data_dir}"
+                )
+        return self._nonempty
+
+    def _sample_identities(self, rng):
+        """
+        P identidades distintas con al menos una imagen (O(P), sin permutar todas).
+        Si hay muchas carpetas vacías, se elige entre las identidades con imágenes.
+        """
+        chosen = []
+        for _ in range(8 * self.p):
+            label = int(rng.integers(len(self.identities)))
+            if label not in chosen and len(self._files(label)):
+                chosen.append(label)
+                if len(chosen) == self.p:
+                    return chosen
+        return [int(label) for label in rng.choice(self._nonempty_labels(), self.p, replace=False)]
+
+    def __iter__(self):
+        rng = np.random.default_rng([self.seed, self._epoch])
+        self._epoch += 1
+        for _ in range(self.batches_per_epoch):
+            for label in self._sample_identities(rng):
+                files = self._files(label)
+                picks = rng.choice(len(files), self.k, replace=len(files) < self.k)
+                for i in picks:
+                    if self._shards is not None:
+                        image = self._shards[int(files[i])][0]
+                    else:
+                        image = np.fromfile(files[i], dtype=np.uint8)
+                    yield image, np.array(label, dtype=np.int32)
+
+
+def load_shard_index(shard_dir):
+    """Lee el índice (identidades y ficheros) de un directorio de shards."""
+    index_path = os.path.join(shard_dir, SHARD_INDEX_FILE)
+    if not os.path.isfile(index_path):
+        raise FileNotFoundError(
+            f"No se encontró {index_path}. Empaqueta los datos con: python scripts/pack_shards.py"
+        )
+    with open(index_path) as f:
+        return json.load(f)
+
+
+def _create_shard_dataset(shard_dir, shuffle, workers, python_multiprocessing, num_shards=None, shard_id=None):
+    return ds.GeneratorDataset(
+        PackedFaceShards(shard_dir),
+        column_names=["image", "label"],
+        shuffle=shuffle,
+        num_shards=num_shards,
+        shard_id=shard_id,
+        num_parallel_workers=workers[0],
+        python_multiprocessing=python_multiprocessing,
+        max_rowsize=DATASET_MAX_ROWSIZE,
+    )
+
+
+def _create_pipeline(source, transforms, batch_size, drop_remainder, workers, python_multiprocessing):
+    """map + batch con los workers de cada etapa (workers: (fuente, map, batch))."""
+    _, map_workers, batch_workers = workers
+    dataset = source.map(
+        transforms,
+        input_columns="image",
+        num_parallel_workers=map_workers,
+        python_multiprocessing=python_multiprocessing,
+        max_rowsize=DATASET_MAX_ROWSIZE,
+    )
+    return dataset.batch(batch_size, drop_remainder=drop_remainder, num_parallel_workers=batch_workers)
+
+
+def _image_dir(data_dir, source_dir, aligned_dir):
+    """
+    Árbol de imágenes a leer: data_dir si se indica; si no, las caras alineadas
+    (aligned_dir) con un detector configurado, o source_dir. Devuelve (ruta, alineado).
+    """
+    if data_dir or FACE_DETECTOR == "none":
+        return data_dir or source_dir, False
+    if os.path.isdir(source_dir) and not os.path.isdir(aligned_dir):
+        raise FileNotFoundError(
+            f"No hay caras alineadas en {aligned_dir} (FACE_DETECTOR = {FACE_DETECTOR!r}). "
+            "Genéralas con: python scripts/align_faces.py"
+        )
+    return aligned_dir, True
+
+
+def _create_balanced_dataset(data_dir, shard_dir, batch_size, workers, python_multiprocessing, shard_id,
+                             aligned=False):
+    """Dataset de entrenamiento con lotes P×K (IdentityBalancedSampler)."""
+    k = PK_IMAGES_PER_IDENTITY
+    if batch_size % k:
+        raise ValueError(f"BATCH_SIZE ({batch_size}) debe ser múltiplo de PK_IMAGES_PER_IDENTITY ({k})")
+    # En distribuido cada proceso muestrea con su propia semilla en lugar de repartir ficheros
+    sampler = IdentityBalancedSampler(data_dir, shard_dir, batch_size // k, k, seed=SEED + (shard_id or 0))
+    dataset = ds.GeneratorDataset(sampler, column_names=["image", "label"], shuffle=False)
+    transforms = get_train_transforms(resize=not (shard_dir or aligned))
+    if not shard_dir:
+        transforms = [vision.Decode()] + transforms
+    return _create_pipeline(dataset, transforms, batch_size, True, workers, python_multiprocessing)
+
+
+def create_train_dataset(data_dir=None, batch_size=None, shuffle=True, shard_dir=None, workers=None,
+                         python_multiprocessing=None, num_shards=None, shard_id=None,
+                         balanced=None):
     """
     Crea el dataset de entrenamiento desde carpetas por identidad.
     Estructura esperada: data_dir/identidad_1/img1.jpg, img2.jpg ...
+    Con shard_dir (o USE_SHARDS en config) lee los shards empaquetados y, con un
+    detector de caras en config, las caras alineadas de ALIGNED_TRAIN_DIR.
+    workers / python_multiprocessing: workers en total y procesos en lugar de hilos (default: config).
+    num_shards / shard_id: parte del dataset de este proceso en entrenamiento distribuido.
+    balanced (por defecto BALANCED_SAMPLER): lotes P×K equilibrados por identidad.
     """
-    data_dir = data_dir or TRAIN_DIR
     batch_size = batch_size or BATCH_SIZE
+    workers, python_multiprocessing = _parallel_options(workers, python_multiprocessing)
+    shard_dir = shard_dir or (SHARDS_TRAIN_DIR if USE_SHARDS and not data_dir else None)
+    aligned = False
+    if not shard_dir:
+        data_dir, aligned = _image_dir(data_dir, TRAIN_DIR, ALIGNED_TRAIN_DIR)
+    if BALANCED_SAMPLER if balanced is None else balanced:
+        return _create_balanced_dataset(
+            data_dir, shard_dir, batch_size, workers, python_multiprocessing, shard_id, aligned=aligned
+        )
+    if shard_dir:
+        dataset = _create_shard_dataset(shard_dir, shuffle, workers, python_multiprocessing, num_shards, shard_id)
+        return _create_pipeline(
+            dataset, get_train_transforms(resize=False), batch_size, True, workers, python_multiprocessing
+        )
     if not os.path.isdir(data_dir):
         raise FileNotFoundError(
             f"Directorio de entrenamiento no encontrado: {data_dir}. "
@@ -53,32 +325,66 @@ def create_train_dataset(data_dir=None, batch_size=None, shuffle=True):
         data_dir,
         decode=True,
         shuffle=shuffle,
-        extensions=[".jpg", ".jpeg", ".png", ".bmp"],
+        extensions=IMAGE_EXTENSIONS,
+        num_parallel_workers=workers[0],
+        num_shards=num_shards,
+        shard_id=shard_id,
+    )
+    return _create_pipeline(
+        dataset, get_train_transforms(resize=not aligned), batch_size, True, workers, python_multiprocessing
     )
-    dataset = dataset.map(get_train_transforms(), input_columns="image")
-    dataset = dataset.batch(batch_size, drop_remainder=True)
-    return dataset
 
 
-def create_val_dataset(data_dir=None, batch_size=None):
+def create_val_dataset(data_dir=None, batch_size=None, shard_dir=None, workers=None, python_multiprocessing=None):
     """Crea el dataset de validación."""
-    data_dir = data_dir or VAL_DIR
     batch_size = batch_size or BATCH_SIZE
+    workers, python_multiprocessing = _parallel_options(workers, python_multiprocessing)
+    shard_dir = shard_dir or (SHARDS_VAL_DIR if USE_SHARDS and not data_dir else None)
+    if shard_dir:
+        if not os.path.isfile(os.path.join(shard_dir, SHARD_INDEX_FILE)):
+            return None
+        dataset = _create_shard_dataset(shard_dir, False, workers, python_multiprocessing)
+        return _create_pipeline(
+            dataset, get_eval_transforms(resize=False), batch_size, False, workers, python_multiprocessing
+        )
+    data_dir, aligned = _image_dir(data_dir, VAL_DIR, ALIGNED_VAL_DIR)
     if not os.path.isdir(data_dir):
         return None
     dataset = ds.ImageFolderDataset(
         data_dir,
         decode=True,
         shuffle=False,
-        extensions=[".jpg", ".jpeg", ".png", ".bmp"],
+        extensions=IMAGE_EXTENSIONS,
+        num_parallel_workers=workers[0],
+    )
+    return _create_pipeline(
+        dataset, get_eval_transforms(resize=not aligned), batch_size, False, workers, python_multiprocessing
     )
-    dataset = dataset.map(get_eval_transforms(), input_columns="image")
-    dataset = dataset.batch(batch_size, drop_remainder=False)
-    return dataset
 
 
 def get_num_classes_from_dir(data_dir):
-    """Obtiene el número de clases (identidades) contando subcarpetas."""
+    """Obtiene el número de clases (identidades) contando subcarpetas (o del índice de shards)."""
+    if os.path.isfile(os.path.join(data_dir, SHARD_INDEX_FILE)):
+        return len(load_shard_index(data_dir)["identities"])
     if not os.path.isdir(data_dir):
         return 0
     return len([d for d in os.listdir(data_dir) if os.path.isdir(os.path.join(data_dir, d))])
+
+
+def list_image_files(data_dir):
+    """
+    Lista las imágenes de un árbol data_dir/<identidad>/<imagen>.
+    Devuelve (rutas, etiquetas, identidades); las etiquetas siguen el orden alfabético
+    de carpetas, igual que ImageFolderDataset.
+    """
+    if not os.path.isdir(data_dir):
+        return [], [], []
+    identities = sorted(d for d in os.listdir(data_dir) if os.path.isdir(os.path.join(data_dir, d)))
+    paths, labels = [], []
+    for label, identity in enumerate(identities):
+        identity_dir = os.path.join(data_dir, identity)
+        for f in sorted(os.listdir(identity_dir)):
+            if os.path.splitext(f)[1].lower() in IMAGE_EXTENSIONS:
+                paths.append(os.path.join(identity_dir, f))
+                labels.append(label)
+    return paths, labels, identities
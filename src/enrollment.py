@@ -0,0 +1,327 @@
+# -*- coding: utf-8 -*-
+"""
+Enrolado masivo en tuberías: decodificación (pool de hilos o procesos), forward por
+lotes y escritura de resultados corren a la vez, unidas por colas acotadas.
+- El progreso se guarda en ENROLL_STATE_DIR (embeddings y estado por imagen con
+  memory-map) cada ENROLL_CHECKPOINT_EVERY imágenes: una ejecución interrumpida
+  continúa donde se quedó. Las imágenes que fallaron no se reintentan al reanudar
+  salvo con retry_failed (p. ej. tras arreglar ficheros corruptos o un disco caído).
+- Cada cola mide su ocupación media ponderada en el tiempo y el porcentaje de tiempo
+  llena o vacía: una cola de imágenes casi siempre vacía indica que la
+  decodificación es el cuello de botella; casi siempre llena, el forward.
+"""
+
+import functools
+import hashlib
+import json
+import os
+import queue
+import shutil
+import sys
+import threading
+import time
+
+import mindspore as ms
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import (
+    TRAIN_DIR,
+    IMAGE_SIZE,
+    INFERENCE_BATCH_SIZE,
+    DECODE_WORKERS,
+    ENROLL_STATE_DIR,
+    ENROLL_QUEUE_BATCHES,
+    ENROLL_CHECKPOINT_EVERY,
+)
+from src.dataset import list_image_files
+from src.gallery import FaceGallery
+from src.inference import _embedding_dim, _normalize, _ordered_map, _resized_image
+
+STATE_FILE = "state.json"
+EMBEDDINGS_FILE = "embeddings.npy"
+STATUS_FILE = "status.npy"
+PENDING, DONE, FAILED = 0, 1, 2
+
+
+class MonitoredQueue(queue.Queue):
+    """Cola acotada que mide su ocupación (ponderada en el tiempo), llena y vacía."""
+
+    def __init__(self, maxsize):
+        super().__init__(maxsize)
+        self._last = time.perf_counter()
+        self._area = 0.0
+        self._full = 0.0
+        self._empty = 0.0
+        self._elapsed = 0.0
+        self.peak = 0
+
+    def _account(self):
+        # Se llama con el mutex de la cola tomado, antes de cada cambio de tamaño
+        now = time.perf_counter()
+        dt, size = now - self._last, len(self.queue)
+        self._last = now
+        self._elapsed += dt
+        self._area += size * dt
+        if size >= self.maxsize:
+            self._full += dt
+        elif size == 0:
+            self._empty += dt
+
+    def _put(self, item):
+        self._account()
+        super()._put(item)
+        self.peak = max(self.peak, len(self.queue))
+
+    def _get(self):
+        self._account()
+        return super()._get()
+
+    def stats(self):
+        with self.mutex:
+            self._account()
+            elapsed = self._elapsed or 1.0
+            return {
+                "capacity": self.maxsize,
+                "mean": self._area / elapsed,
+                "occupancy": self._area / elapsed / self.maxsize,
+                "full_pct": 100.0 * self._full / elapsed,
+                "empty_pct": 100.0 * self._empty / elapsed,
+                "peak": self.peak,
+            }
+
+
+class EnrollmentState:
+    """
+    Progreso reanudable: embeddings (N, D) float32 y estado (N,) uint8 por imagen
+    (pendiente, hecha, error) en memory-map. Si cambian las imágenes o el modelo se
+    empieza de cero; con retry_failed las imágenes con error vuelven a pendientes.
+    """
+
+    def __init__(self, state_dir, paths, embedding_dim, model_key=None, restart=False, retry_failed=False):
+        self.state_dir = state_dir
+        fingerprint = hashlib.sha1("\n".join(paths).encode())
+        fingerprint.update(str(model_key).encode())
+        self.fingerprint = fingerprint.hexdigest()
+        info_path = os.path.join(state_dir, STATE_FILE)
+        info = None
+        if not restart and os.path.isfile(info_path):
+            with open(info_path) as f:
+                info = json.load(f)
+        n = len(paths)
+        if info is not None and info.get("fingerprint") == self.fingerprint:
+            self.embeddings = np.load(os.path.join(state_dir, EMBEDDINGS_FILE), mmap_mode="r+")
+            self.status = np.load(os.path.join(state_dir, STATUS_FILE), mmap_mode="r+")
+        else:
+            if os.path.isdir(state_dir):
+                shutil.rmtree(state_dir)
+            os.makedirs(state_dir)
+            self.embeddings = np.lib.format.open_memmap(
+                os.path.join(state_dir, EMBEDDINGS_FILE), mode="w+", dtype=np.float32, shape=(n, embedding_dim)
+            )
+            self.status = np.lib.format.open_memmap(
+                os.path.join(state_dir, STATUS_FILE), mode="w+", dtype=np.uint8, shape=(n,)
+            )
+            self.flush()
+        if retry_failed:
+            self.status[self.status == FAILED] = PENDING
+        self.resumed = int((self.status != PENDING).sum())
+
+    def pending(self):
+        return np.flatnonzero(self.status == PENDING)
+
+    def flush(self):
+        """Punto de control: los embeddings se escriben antes que el estado que los valida."""
+        self.embeddings.flush()
+        self.status.flush()
+        tmp = os.path.join(self.state_dir, STATE_FILE + ".tmp")
+        with open(tmp, "w") as f:
+            json.dump({"fingerprint": self.fingerprint, "total": len(self.status),
+                       "done": int((self.status == DONE).sum()), "failed": int((self.status == FAILED).sum())}, f)
+        os.replace(tmp, os.path.join(self.state_dir, STATE_FILE))
+
+    def remove(self):
+        del self.embeddings, self.status
+        shutil.rmtree(self.state_dir, ignore_errors=True)
+
+
+def _decode(item, cache=None):
+    """(posición, ruta) -> (posición, imagen uint8 redimensionada o None si falla)."""
+    pos, path = item
+    try:
+        return pos, _resized_image(path, cache)
+    except Exception as e:
+        print(f"❌ Error al leer {path}: {e}")
+        return pos, None
+
+
+def _put(q, item, stop):
+    """put bloqueante que abandona si se pide parar (evita bloqueos al interrumpir)."""
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+
+def _get(q, stop):
+    while not stop.is_set():
+        try:
+            return q.get(timeout=0.1)
+        except queue.Empty:
+            pass
+    return None
+
+
+class BulkEnroller:
+    """
+    Enrola data_dir/<identidad>/<imagen> con tres etapas concurrentes:
+    decodificación -> [cola de imágenes] -> forward por lotes -> [cola de lotes] -> escritura.
+    """
+
+    def __init__(self, model, batch_size=None, workers=None, processes=False, queue_batches=None,
+                 checkpoint_every=None, state_dir=None, cache=None):
+        self.model = model
+        self.batch_size = batch_size or INFERENCE_BATCH_SIZE
+        self.workers = DECODE_WORKERS if workers is None else workers
+        # La caché en disco solo se comparte entre hilos
+        self.processes = processes
+        self.cache = None if processes else cache
+        self.queue_batches = queue_batches or ENROLL_QUEUE_BATCHES
+        self.checkpoint_every = checkpoint_every or ENROLL_CHECKPOINT_EVERY
+        self.state_dir = state_dir or ENROLL_STATE_DIR
+
+    def run(self, data_dir=None, restart=False, progress_every=10.0, callback=None, retry_failed=False):
+        """
+        Procesa las imágenes pendientes (y las que fallaron, con retry_failed).
+        Devuelve (galería o None si se interrumpe, estadísticas). callback(estadísticas)
+        se llama cada progress_every segundos.
+        """
+        data_dir = data_dir or TRAIN_DIR
+        paths, labels, identities = list_image_files(data_dir)
+        if not paths:
+            raise FileNotFoundError(f"No hay imágenes para enrolar en {data_dir}")
+        state = EnrollmentState(
+            self.state_dir, paths, _embedding_dim(self.model), getattr(self.model, "cache_key", None),
+            restart=restart, retry_failed=retry_failed,
+        )
+        todo = state.pending()
+        self.images = MonitoredQueue(self.queue_batches * self.batch_size)
+        self.batches = MonitoredQueue(self.queue_batches)
+        self._counts = {"done": 0, "failed": 0, "forward_s": 0.0}
+        stop = threading.Event()
+        errors = []
+
+        def stage(fn):
+            def target():
+                try:
+                    fn()
+                except BaseException as e:
+                    errors.append(e)
+                    stop.set()
+            return threading.Thread(target=target, name=f"enroll-{fn.__name__}", daemon=True)
+
+        def decode():
+            fn = _decode if self.processes else functools.partial(_decode, cache=self.cache)
+            items = ((int(i), paths[i]) for i in todo)
+            for item in _ordered_map(fn, items, self.workers, processes=self.processes):
+                if not _put(self.images, item, stop):
+                    return
+            _put(self.images, None, stop)
+
+        def forward():
+            buffer = np.zeros((self.batch_size, 3, IMAGE_SIZE, IMAGE_SIZE), dtype=np.float32)
+            positions, failed = [], []
+            finished = False
+            while not finished:
+                item = _get(self.images, stop)
+                if stop.is_set():
+                    return
+                if item is None:
+                    finished = True
+                else:
+                    pos, image = item
+                    if image is None:
+                        failed.append(pos)
+                    else:
+                        _normalize(image, out=buffer[len(positions)])
+                        positions.append(pos)
+                if len(positions) == self.batch_size or (finished and (positions or failed)):
+                    n = len(positions)
+                    buffer[n:] = 0.0
+                    t0 = time.perf_counter()
+                    out = self.model.get_embedding(ms.Tensor(buffer)).asnumpy()[:n] if n else None
+                    self._counts["forward_s"] += time.perf_counter() - t0
+                    if not _put(self.batches, (np.array(positions, dtype=np.int64), out, failed), stop):
+                        return
+                    positions, failed = [], []
+            _put(self.batches, None, stop)
+
+        def write():
+            since_flush = 0
+            try:
+                while True:
+                    item = _get(self.batches, stop)
+                    if item is None:
+                        return
+                    positions, out, failed = item
+                    if len(positions):
+                        state.embeddings[positions] = out
+                        state.status[positions] = DONE
+                    state.status[failed] = FAILED
+                    self._counts["done"] += len(positions)
+                    self._counts["failed"] += len(failed)
+                    since_flush += len(positions) + len(failed)
+                    if since_flush >= self.checkpoint_every:
+                        state.flush()
+                        since_flush = 0
+            finally:
+                state.flush()
+
+        threads = [stage(decode), stage(forward), stage(write)]
+        self._t0 = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        try:
+            while threads[-1].is_alive():
+                threads[-1].join(timeout=progress_every)
+                if callback is not None and threads[-1].is_alive():
+                    callback(self.stats(len(paths), state.resumed))
+        except KeyboardInterrupt:
+            stop.set()
+        for thread in threads:
+            thread.join()
+        if errors:
+            raise errors[0]
+        stats = self.stats(len(paths), state.resumed)
+        if stop.is_set():
+            return None, stats
+        ok = state.status == DONE
+        gallery = FaceGallery(embedding_dim=state.embeddings.shape[1])
+        gallery.add(np.asarray(state.embeddings[ok]), [identities[labels[i]] for i in np.flatnonzero(ok)])
+        stats["failed_total"] = int((state.status == FAILED).sum())
+        self.state = state
+        return gallery, stats
+
+    def remove_state(self):
+        """Borra el progreso guardado (tras guardar la galería)."""
+        self.state.remove()
+
+    def stats(self, total, resumed):
+        elapsed = time.perf_counter() - self._t0
+        counts = dict(self._counts)
+        processed = counts["done"] + counts["failed"]
+        return {
+            "total": total,
+            "resumed": resumed,
+            "processed": processed,
+            "done": counts["done"],
+            "failed": counts["failed"],
+            "remaining": total - resumed - processed,
+            "elapsed_s": elapsed,
+            "images_per_s": processed / elapsed if elapsed > 0 else 0.0,
+            "forward_busy_pct": 100.0 * counts["forward_s"] / elapsed if elapsed > 0 else 0.0,
+            "queues": {"images": self.images.stats(), "batches": self.batches.stats()},
+        }
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""
+Evaluación por lotes y en streaming del modelo de clasificación por identidad.
+Los embeddings y logits se escriben en arrays preasignados mientras se recorre el
+directorio; accuracy, top-k y matriz de confusión se calculan al final en una sola
+pasada vectorizada.
+"""
+
+import os
+import sys
+
+import mindspore as ms
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import TRAIN_DIR, VAL_DIR
+from src.dataset import list_image_files
+from src.inference import iter_embeddings
+
+
+def _model_identities(num_classes, train_dir=None):
+    """Identidades del modelo (orden de clases de entrenamiento) si se pueden deducir."""
+    train_dir = train_dir or TRAIN_DIR
+    if not os.path.isdir(train_dir):
+        return None
+    identities = sorted(d for d in os.listdir(train_dir) if os.path.isdir(os.path.join(train_dir, d)))
+    return identities if len(identities) == num_classes else None
+
+
+def classification_metrics(logits, labels, num_classes, top_k=(1, 5)):
+    """
+    Métricas a partir de logits (N, C) y etiquetas (N,):
+    accuracy, top-k, matriz de confusión (C, C) y accuracy por identidad.
+    """
+    labels = np.asarray(labels, dtype=np.int64)
+    pred = logits.argmax(axis=1)
+    confusion = np.bincount(labels * num_classes + pred, minlength=num_classes * num_classes)
+    confusion = confusion.reshape(num_classes, num_classes)
+    support = confusion.sum(axis=1)
+    metrics = {
+        "total": int(labels.size),
+        "correct": int(np.trace(confusion)),
+        "accuracy": float(np.trace(confusion) / labels.size) if labels.size else 0.0,
+        "confusion": confusion,
+        "per_identity": np.divide(
+            np.diag(confusion), support, out=np.full(num_classes, np.nan), where=support > 0
+        ),
+    }
+    # Top-k sin ordenar: posición de la clase correcta = clases con mayor puntuación (O(N·C))
+    rank = (logits > logits[np.arange(labels.size), labels][:, None]).sum(axis=1)
+    for k in top_k:
+        k = min(k, num_classes)
+        metrics[f"top{k}"] = float((rank < k).mean()) if labels.size else 0.0
+    return metrics
+
+
+def evaluate(net, data_dir=None, batch_size=None, workers=0, cache=None, top_k=(1, 5)):
+    """
+    Evalúa net (FaceBiometricsNet) sobre data_dir/<identidad>/<imagen>.
+    Las etiquetas se asignan por nombre de identidad a las clases del modelo
+    (data/train); las identidades desconocidas se excluyen.
+    Devuelve (métricas, embeddings (N, D), nombres de clase).
+    """
+    data_dir = data_dir or VAL_DIR
+    num_classes = net.classifier.out_channels
+    paths, labels, identities = list_image_files(data_dir)
+    class_names = _model_identities(num_classes)
+    if class_names is not None:
+        index = {name: i for i, name in enumerate(class_names)}
+        mapping = np.array([index.get(name, -1) for name in identities], dtype=np.int64)
+    else:
+        class_names = [str(i) for i in range(num_classes)]
+        mapping = np.arange(len(identities), dtype=np.int64)
+        mapping[mapping >= num_classes] = -1
+    labels = mapping[np.asarray(labels, dtype=np.int64)] if labels else np.zeros((0,), dtype=np.int64)
+
+    n = len(paths)
+    embeddings = np.empty((n, net.backbone.embedding_dim), dtype=np.float32)
+    logits = np.empty((n, num_classes), dtype=np.float32)
+    for positions, embs in iter_embeddings(net, paths, batch_size=batch_size, cache=cache, workers=workers):
+        embeddings[positions] = embs
+        logits[positions] = net.classifier(ms.Tensor(embs)).asnumpy()
+
+    known = labels >= 0
+    metrics = classification_metrics(logits[known], labels[known], num_classes, top_k=top_k)
+    metrics["unknown"] = int((~known).sum())
+    return metrics, embeddings, class_names
@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+"""
+Exportación del backbone de embeddings (sin cabeza de clasificación) a un grafo
+congelado MindIR (lote dinámico) u ONNX, y carga ligera para inferencia.
+Junto a cada grafo se guarda <grafo>.json con el checkpoint de origen: solo se carga
+si coincide con el que elige select_checkpoint() (CHECKPOINT_SELECT).
+"""
+
+import json
+import os
+import sys
+
+import mindspore as ms
+import numpy as np
+from mindspore import nn
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import (
+    CHECKPOINT_DIR,
+    EXPORT_NAME,
+    EXPORT_DIR,
+    IMAGE_SIZE,
+    EMBEDDING_DIM,
+    INPUT_CHANNELS,
+    USE_QUANTIZED_MODEL,
+    QUANTIZED_NAME,
+)
+from src.cache import checkpoint_key
+from src.checkpoints import select_checkpoint
+from src.inference import load_embedding_model
+from src.model import RowNormalize
+from src.metrics import profile_call, stage
+
+
+class ExportedEmbeddingModel:
+    """
+    Modelo de embeddings cargado desde un grafo exportado.
+    Expone get_embedding(x) igual que FaceBiometricsNet, para usarlo con
+    get_embedding/get_embeddings/verify_pair y la galería.
+    """
+
+    def __init__(self, path, embedding_dim=EMBEDDING_DIM):
+        self.path = path
+        self.embedding_dim = embedding_dim
+        self.cache_key = checkpoint_key(path)
+        if path.endswith(".onnx"):
+            try:
+                import onnxruntime as ort
+            except ImportError as e:
+                raise ImportError("Para cargar modelos ONNX instala onnxruntime: pip install onnxruntime") from e
+            with stage("load_graph"):
+                self._session = ort.InferenceSession(path, providers=["CPUExecutionProvider"])
+            model_input = self._session.get_inputs()[0]
+            self._input = model_input.name
+            # El grafo ONNX tiene lote fijo: las entradas se procesan en trozos de ese tamaño
+            self._onnx_batch = model_input.shape[0] if isinstance(model_input.shape[0], int) else None
+            self._graph = None
+        else:
+            with stage("load_graph"):
+                self._graph = nn.GraphCell(ms.load(path))
+            self._session = None
+
+    def get_embedding(self, x):
+        if self._graph is not None:
+            return self._graph(x)
+        arr = x.asnumpy() if isinstance(x, ms.Tensor) else np.asarray(x, dtype=np.float32)
+        step = self._onnx_batch or arr.shape[0]
+        outputs = []
+        for start in range(0, arr.shape[0], step):
+            chunk = arr[start:start + step]
+            n = chunk.shape[0]
+            if n < step:
+                chunk = np.concatenate([chunk, np.zeros((step - n,) + chunk.shape[1:], dtype=chunk.dtype)])
+            outputs.append(self._session.run(None, {self._input: chunk})[0][:n])
+        return ms.Tensor(np.concatenate(outputs))
+
+
+class _OnnxEmbeddingNet(nn.Cell):
+    """
+    Backbone registrado (src/model.BACKBONES) con la normalización L2 expresada con
+    operadores exportables a ONNX.
+    """
+
+    def __init__(self, backbone):
+        super().__init__()
+        self.backbone = backbone
+        self.normalize = RowNormalize()
+
+    def construct(self, x):
+        return self.normalize(self.backbone.embed_features(x))
+
+
+def write_export_source(path, source):
+    """Guarda junto al grafo path el checkpoint del que procede (dict con checkpoint_key)."""
+    with open(path + ".json", "w") as f:
+        json.dump(source, f, indent=2)
+
+
+def read_export_source(path):
+    """Checkpoint de origen de un grafo exportado (None si no se registró)."""
+    try:
+        with open(path + ".json") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def export_backbone(backbone, base, file_format="MINDIR", batch_size=None):
+    """
+    Exporta un backbone (cualquiera de src/model.BACKBONES) a base + .mindir/.onnx.
+    MINDIR usa dimensión de lote dinámica; el exportador ONNX de MindSpore no la
+    admite, así que se exporta con batch_size fijo y después se relaja la dimensión
+    de lote si está instalado el paquete onnx. Devuelve la ruta del fichero escrito.
+    """
+    backbone.set_train(False)
+    if file_format == "ONNX":
+        backbone = _OnnxEmbeddingNet(backbone)
+        backbone.set_train(False)
+        shape = [batch_size or 1, INPUT_CHANNELS, IMAGE_SIZE, IMAGE_SIZE]
+        example = ms.Tensor(np.zeros(shape, dtype=np.float32))
+    else:
+        example = ms.Tensor(shape=[None, INPUT_CHANNELS, IMAGE_SIZE, IMAGE_SIZE], dtype=ms.float32)
+    path = base + (".onnx" if file_format == "ONNX" else ".mindir")
+    if os.path.exists(path):
+        os.remove(path)  # MindSpore escribe el fichero como solo lectura
+    os.makedirs(os.path.dirname(base) or ".", exist_ok=True)
+    ms.export(backbone, example, file_name=base, file_format=file_format)
+    if file_format == "ONNX":
+        make_onnx_batch_dynamic(path)
+    return path
+
+
+def default_export_dir(checkpoint_dir=None):
+    """Directorio de los grafos exportados: EXPORT_DIR o, si no, el de checkpoints."""
+    return EXPORT_DIR or checkpoint_dir or CHECKPOINT_DIR
+
+
+def export_embedding_model(checkpoint_dir=None, output_dir=None, file_format="MINDIR", batch_size=None):
+    """
+    Exporta solo el backbone de embeddings del checkpoint elegido por
+    select_checkpoint() (CHECKPOINT_SELECT), y registra ese checkpoint junto al grafo
+    (ver export_backbone) en output_dir (por defecto default_export_dir()).
+    Devuelve la ruta del fichero escrito.
+    """
+    checkpoint_dir = checkpoint_dir or CHECKPOINT_DIR
+    output_dir = output_dir or default_export_dir(checkpoint_dir)
+    full_net = load_embedding_model(checkpoint_dir)
+    path = export_backbone(full_net.backbone, os.path.join(output_dir, EXPORT_NAME), file_format, batch_size)
+    write_export_source(path, {"checkpoint": os.path.basename(full_net.checkpoint_path),
+                               "checkpoint_key": full_net.cache_key})
+    return path
+
+
+def make_onnx_batch_dynamic(path):
+    """
+    Marca como simbólica la dimensión de lote de entradas y salidas de un ONNX
+    (el grafo del backbone no depende del lote: Flatten conserva el eje 0).
+    Requiere el paquete onnx; si no está, el grafo se queda con lote fijo.
+    """
+    try:
+        import onnx
+    except ImportError:
+        return False
+    os.chmod(path, 0o644)
+    model = onnx.load(path)
+    for value in list(model.graph.input) + list(model.graph.output):
+        value.type.tensor_type.shape.dim[0].dim_param = "batch"
+    del model.graph.value_info[:]
+    onnx.save(model, path)
+    return True
+
+
+def load_inference_model(checkpoint_dir=None, export_dir=None):
+    """
+    Carga el modelo para inferencia: el backbone INT8 si USE_QUANTIZED_MODEL, o el
+    grafo MindIR exportado, si existen y se exportaron desde el checkpoint que
+    elige select_checkpoint(); si no, el checkpoint completo. Los grafos se buscan
+    en export_dir (por defecto default_export_dir()).
+    """
+    checkpoint_dir = checkpoint_dir or CHECKPOINT_DIR
+    export_dir = export_dir or default_export_dir(checkpoint_dir)
+    candidates = [os.path.join(export_dir, EXPORT_NAME + ".mindir")]
+    if USE_QUANTIZED_MODEL:
+        candidates.insert(0, os.path.join(export_dir, QUANTIZED_NAME + ".onnx"))
+    with profile_call("load_model"):
+        try:
+            expected = checkpoint_key(select_checkpoint(checkpoint_dir))
+        except FileNotFoundError:
+            expected = None
+        for path in candidates:
+            source = read_export_source(path) if os.path.isfile(path) else None
+            if expected is not None and source is not None and source.get("checkpoint_key") == expected:
+                return ExportedEmbeddingModel(path)
+        return load_embedding_model(checkpoint_dir)
@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+"""Galería persistente de embeddings e identificación 1:N vectorizada."""
+
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import GALLERY_DIR, TRAIN_DIR, EMBEDDING_DIM, ANN_NLIST, ANN_RERANK
+
+EMBEDDINGS_FILE = "embeddings.npy"
+LABELS_FILE = "labels.npy"
+IDENTITIES_FILE = "identities.npy"
+INDEX_FILE = "ivfpq.npz"
+
+
+def l2_normalize(x, axis=-1):
+    """Normaliza vectores a norma 1 (float32)."""
+    x = np.asarray(x, dtype=np.float32)
+    return x / (np.linalg.norm(x, axis=axis, keepdims=True) + 1e-8)
+
+
+class FaceGallery:
+    """
+    Galería de rostros enrolados.
+    - embeddings: matriz contigua (N, D) float32, L2 normalizada.
+    - labels: índice de identidad (N,) int32 de cada fila.
+    - identities: nombres de identidad (índice -> nombre).
+    La búsqueda es un único producto matricial (similitud coseno), o aproximada
+    con IVF-PQ si se ha construido el índice (build_index).
+    """
+
+    def __init__(self, embeddings=None, labels=None, identities=None, embedding_dim=EMBEDDING_DIM, index=None):
+        if embeddings is None:
+            embeddings = np.zeros((0, embedding_dim), dtype=np.float32)
+        self.embeddings = embeddings
+        self.labels = np.zeros((0,), dtype=np.int32) if labels is None else labels
+        self.identities = list(identities or [])
+        self._identity_index = {name: i for i, name in enumerate(self.identities)}
+        self.index = index
+
+    def __len__(self):
+        return int(self.embeddings.shape[0])
+
+    @property
+    def embedding_dim(self):
+        return int(self.embeddings.shape[1])
+
+    def add(self, embeddings, names):
+        """Añade embeddings (N, D) con su nombre de identidad (N,)."""
+        embeddings = l2_normalize(np.atleast_2d(embeddings))
+        if len(names) != embeddings.shape[0]:
+            raise ValueError("embeddings y names deben tener la misma longitud")
+        ids = np.empty(len(names), dtype=np.int32)
+        for i, name in enumerate(names):
+            if name not in self._identity_index:
+                self._identity_index[name] = len(self.identities)
+                self.identities.append(name)
+            ids[i] = self._identity_index[name]
+        if self.index is not None:
+            self.index.add(embeddings, ids=np.arange(len(self), len(self) + embeddings.shape[0]))
+        self.embeddings = np.ascontiguousarray(np.concatenate([self.embeddings, embeddings], axis=0))
+        self.labels = np.concatenate([self.labels, ids])
+
+    def build_index(self, nlist=None, m=None, nprobe=None):
+        """Entrena un índice aproximado IVF-PQ sobre la galería actual."""
+        from src.ann import IVFPQIndex
+
+        if not len(self):
+            raise ValueError("La galería está vacía: no se puede construir el índice IVF-PQ")
+        # ~39 puntos por centroide como mínimo para que k-means sea estable
+        nlist = max(1, min(nlist or ANN_NLIST, len(self) // 39))
+        self.index = IVFPQIndex(nlist=nlist, m=m, nprobe=nprobe).train(self.embeddings)
+        self.index.add(self.embeddings)
+        return self.index
+
+    def search(self, queries, k=5, exact=None, nprobe=None, rerank=None):
+        """
+        Top-k filas más similares para cada consulta.
+        Devuelve (indices (Q, k), similitudes (Q, k)) ordenados de mayor a menor.
+        Si hay índice IVF-PQ se usa salvo exact=True; sus k * rerank mejores candidatos
+        se re-ordenan con los embeddings exactos (rerank=0 lo desactiva).
+        """
+        queries = l2_normalize(np.atleast_2d(queries))
+        if self.index is not None and not exact:
+            return self._search_index(queries, k, nprobe, ANN_RERANK if rerank is None else rerank)
+        k = min(k, len(self))
+        if k == 0:
+            empty = np.zeros((queries.shape[0], 0))
+            return empty.astype(np.int64), empty.astype(np.float32)
+        scores = queries @ self.embeddings.T
+        idx = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        top = np.take_along_axis(scores, idx, axis=1)
+        order = np.argsort(-top, axis=1)
+        return np.take_along_axis(idx, order, axis=1), np.take_along_axis(top, order, axis=1)
+
+    def _search_index(self, queries, k, nprobe, rerank):
+        if not rerank:
+            return self.index.search(queries, k=k, nprobe=nprobe)
+        cand, _ = self.index.search(queries, k=k * rerank, nprobe=nprobe)
+        valid = cand >= 0
+        sims = np.einsum("qd,qcd->qc", queries, self.embeddings[np.where(valid, cand, 0)])
+        sims = np.where(valid, sims, -np.inf).astype(np.float32)
+        order = np.argsort(-sims, axis=1)[:, :k]
+        ids = np.take_along_axis(cand, order, axis=1)
+        return ids, np.take_along_axis(sims, order, axis=1)
+
+    def identify(self, query, k=5):
+        """
+        Identificación 1:N de un embedding: top-k identidades distintas
+        (máxima similitud entre sus imágenes). Devuelve [(identidad, similitud), ...].
+        """
+        if len(self) == 0:
+            return []
+        if self.index is not None:
+            # Búsqueda aproximada: candidatos del índice agrupados por identidad
+            idx, sims = self.search(query, k=4 * k)
+            results, seen = [], set()
+            for i, sim in zip(idx[0], sims[0]):
+                if i < 0:
+                    break
+                name = self.identities[self.labels[i]]
+                if name not in seen:
+                    seen.add(name)
+                    results.append((name, float(sim)))
+            return results[:k]
+        scores = self.embeddings @ l2_normalize(query).reshape(-1)
+        best = np.full(len(self.identities), -np.inf, dtype=np.float32)
+        np.maximum.at(best, self.labels, scores)
+        k = min(k, len(self.identities))
+        top = np.argpartition(-best, k - 1)[:k]
+        top = top[np.argsort(-best[top])]
+        return [(self.identities[i], float(best[i])) for i in top]
+
+    def save(self, gallery_dir=None):
+        """Guarda la galería como ficheros .npy (cargables con memory-map)."""
+        gallery_dir = gallery_dir or GALLERY_DIR
+        os.makedirs(gallery_dir, exist_ok=True)
+        np.save(os.path.join(gallery_dir, EMBEDDINGS_FILE), np.ascontiguousarray(self.embeddings, dtype=np.float32))
+        np.save(os.path.join(gallery_dir, LABELS_FILE), self.labels.astype(np.int32))
+        np.save(os.path.join(gallery_dir, IDENTITIES_FILE), np.array(self.identities, dtype=str))
+        index_path = os.path.join(gallery_dir, INDEX_FILE)
+        if self.index is not None:
+            self.index.save(index_path)
+        elif os.path.isfile(index_path):
+            os.remove(index_path)
+        return gallery_dir
+
+    @classmethod
+    def load(cls, gallery_dir=None, mmap=True):
+        """Carga una galería guardada; con mmap=True los embeddings no se copian a RAM."""
+        gallery_dir = gallery_dir or GALLERY_DIR
+        emb_path = os.path.join(gallery_dir, EMBEDDINGS_FILE)
+        if not os.path.isfile(emb_path):
+            raise FileNotFoundError(
+                f"No se encontró {emb_path}. Crea la galería con: python test.py --build-gallery"
+            )
+        embeddings = np.load(emb_path, mmap_mode="r" if mmap else None)
+        labels = np.load(os.path.join(gallery_dir, LABELS_FILE))
+        identities = np.load(os.path.join(gallery_dir, IDENTITIES_FILE)).tolist()
+        index = None
+        index_path = os.path.join(gallery_dir, INDEX_FILE)
+        if os.path.isfile(index_path):
+            from src.ann import IVFPQIndex
+
+            index = IVFPQIndex.load(index_path)
+        return cls(embeddings, labels, identities, index=index)
+
+
+def build_gallery(model, data_dir=None, batch_size=None, cache=None):
+    """Enrola todas las imágenes de data_dir/<identidad>/ en una galería nueva."""
+    # Importación diferida: los procesos de búsqueda (src/gallery_shards.py) cargan
+    # este módulo sin MindSpore
+    from src.dataset import list_image_files
+    from src.inference import get_embeddings
+
+    data_dir = data_dir or TRAIN_DIR
+    paths, labels, identities = list_image_files(data_dir)
+    if not paths:
+        raise FileNotFoundError(f"No hay imágenes para enrolar en {data_dir}")
+    embeddings = get_embeddings(model, paths, batch_size=batch_size, cache=cache)
+    gallery = FaceGallery(embedding_dim=embeddings.shape[1])
+    gallery.add(embeddings, [identities[label] for label in labels])
+    return gallery
@@ -0,0 +1,277 @@
+# -*- coding: utf-8 -*-
+"""
+Galería repartida en N shards, cada uno servido por un proceso de búsqueda.
+- En disco: gallery_dir/shards.json y gallery_dir/shard-XXX/, cada uno una
+  FaceGallery normal (embeddings .npy con memory-map y, opcionalmente, su índice
+  IVF-PQ). Las filas se reparten en bloques contiguos.
+- Cada consulta (o lote de consultas) se envía a todos los shards y sus top-k se
+  fusionan en el proceso principal (scatter-gather). El resultado es el mismo
+  que con la galería completa: el top-k global está contenido en la unión de los
+  top-k de cada shard.
+- Cada shard es un proceso aparte lanzado con `python -m src.gallery_shards`
+  (no re-importa el script principal, así que no carga MindSpore) y conectado
+  al principal con multiprocessing.connection (autenticado con una clave
+  aleatoria). Los embeddings de cada shard los comparte la caché de páginas del
+  sistema (memory-map) y cada proceso usa CPUs / shards hilos de BLAS.
+"""
+
+import json
+import os
+import secrets
+import shutil
+import subprocess
+import sys
+import threading
+import time
+from multiprocessing.connection import Client, Listener
+
+import numpy as np
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+from config import GALLERY_DIR, GALLERY_SHARDS
+from src.gallery import FaceGallery, EMBEDDINGS_FILE, LABELS_FILE, IDENTITIES_FILE, INDEX_FILE, l2_normalize
+
+SHARDS_FILE = "shards.json"
+BLAS_THREAD_VARS = ["OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS"]
+
+
+def _shard_dir(gallery_dir, i):
+    return os.path.join(gallery_dir, f"shard-{i:03d}")
+
+
+def save_sharded(gallery, num_shards, gallery_dir=None, ann=False):
+    """
+    Guarda gallery en num_shards shards (con índice IVF-PQ por shard si ann).
+    Sustituye a una galería sin repartir guardada en el mismo directorio.
+    """
+    gallery_dir = gallery_dir or GALLERY_DIR
+    num_shards = max(1, min(num_shards, len(gallery)))
+    for name in os.listdir(gallery_dir) if os.path.isdir(gallery_dir) else []:
+        path = os.path.join(gallery_dir, name)
+        if name.startswith("shard-"):
+            shutil.rmtree(path)
+        elif name in (EMBEDDINGS_FILE, LABELS_FILE, IDENTITIES_FILE, INDEX_FILE):
+            os.remove(path)
+    bounds = np.linspace(0, len(gallery), num_shards + 1).astype(np.int64)
+    for i in range(num_shards):
+        labels = np.asarray(gallery.labels[bounds[i]:bounds[i + 1]])
+        # Identidades locales del shard (solo las que aparecen en él)
+        present, local = np.unique(labels, return_inverse=True)
+        shard = FaceGallery(
+            np.ascontiguousarray(gallery.embeddings[bounds[i]:bounds[i + 1]], dtype=np.float32),
+            local.astype(np.int32),
+            [gallery.identities[j] for j in present],
+        )
+        if ann:
+            shard.build_index()
+        shard.save(_shard_dir(gallery_dir, i))
+    with open(os.path.join(gallery_dir, SHARDS_FILE), "w") as f:
+        json.dump({"offsets": bounds.tolist(), "identities": len(gallery.identities)}, f)
+    return gallery_dir
+
+
+def _serve_shard(shard_dir, offset, conn):
+    """Bucle de un proceso de búsqueda: recibe (operación, consultas, k) y responde."""
+    gallery = FaceGallery.load(shard_dir, mmap=True)
+    conn.send(len(gallery))
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:  # el proceso principal terminó
+            break
+        if message is None:
+            break
+        op, queries, k = message
+        try:
+            if op == "search":
+                idx, sims = gallery.search(queries, k=k)
+                result = (np.where(idx >= 0, idx + offset, -1), sims)
+            else:
+                result = [gallery.identify(q, k=k) for q in queries]
+        except Exception as e:  # el error se propaga al proceso principal
+            result = e
+        conn.send(result)
+    conn.close()
+
+
+class ShardedGallery:
+    """
+    Galería repartida con un proceso de búsqueda por shard. Misma interfaz de
+    consulta que FaceGallery (search, identify, len).
+    """
+
+    def __init__(self, gallery_dir=None, threads_per_shard=None):
+        self.gallery_dir = gallery_dir or GALLERY_DIR
+        manifest = os.path.join(self.gallery_dir, SHARDS_FILE)
+        if not os.path.isfile(manifest):
+            raise FileNotFoundError(f"No se encontró {manifest}. Crea la galería con: python test.py --build-gallery --shards N")
+        with open(manifest) as f:
+            info = json.load(f)
+        self.offsets = info["offsets"]
+        self.num_shards = len(self.offsets) - 1
+        self.num_identities = info["identities"]
+        threads = threads_per_shard or max(1, (os.cpu_count() or 1) // self.num_shards)
+        self._conns = []
+        self._procs = []
+        self._lock = threading.Lock()
+        # Hilos de BLAS por shard en el entorno de cada proceso
+        env = dict(os.environ, **{var: str(threads) for var in BLAS_THREAD_VARS})
+        authkey = secrets.token_bytes(32)
+        try:
+            with Listener(authkey=authkey) as listener:
+                for i in range(self.num_shards):
+                    proc = subprocess.Popen(
+                        [sys.executable, "-m", "src.gallery_shards", _shard_dir(self.gallery_dir, i),
+                         str(self.offsets[i]), str(i), str(listener.address)],
+                        stdin=subprocess.PIPE, cwd=ROOT_DIR, env=env,
+                    )
+                    # La clave va por stdin (no aparece en la línea de órdenes)
+                    proc.stdin.write(authkey.hex().encode() + b"\n")
+                    proc.stdin.close()
+                    self._procs.append(proc)
+                self._conns = self._accept(listener)
+            # Espera a que cada shard haya cargado su galería
+            try:
+                self.sizes = [conn.recv() for conn in self._conns]
+            except EOFError:
+                raise RuntimeError(
+                    f"Un proceso de shard de {self.gallery_dir} terminó al cargar su galería (ver su salida de error)"
+                ) from None
+        except BaseException:
+            self.close()
+            raise
+
+    def _accept(self, listener):
+        """Conexiones de los shards ordenadas por índice; falla si alguno termina antes de conectar."""
+        conns = [None] * self.num_shards
+        errors = []
+
+        def accept():
+            try:
+                for _ in range(self.num_shards):
+                    conn = listener.accept()
+                    conns[conn.recv()] = conn
+            except Exception as e:
+                errors.append(e)
+
+        thread = threading.Thread(target=accept, daemon=True)
+        thread.start()
+        while thread.is_alive():
+            thread.join(timeout=0.1)
+            if thread.is_alive() and any(proc.poll() is not None for proc in self._procs):
+                # Cierra el socket para desbloquear accept()
+                listener.close()
+                thread.join()
+                raise RuntimeError("Un proceso de shard terminó antes de conectarse (ver su salida de error)")
+        if errors:
+            raise errors[0]
+        return conns
+
+    def __len__(self):
+        return int(self.offsets[-1])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _scatter_gather(self, op, queries, k):
+        with self._lock:
+            for conn in self._conns:
+                conn.send((op, queries, k))
+            results = [conn.recv() for conn in self._conns]
+        for result in results:
+            if isinstance(result, Exception):
+                raise result
+        return results
+
+    def search(self, queries, k=5):
+        """Top-k filas (índice global en la galería) para cada consulta: (indices (Q, k), similitudes (Q, k))."""
+        queries = l2_normalize(np.atleast_2d(queries))
+        results = self._scatter_gather("search", queries, k)
+        idx = np.concatenate([r[0] for r in results], axis=1)
+        sims = np.concatenate([r[1] for r in results], axis=1).astype(np.float32)
+        sims = np.where(idx >= 0, sims, -np.inf)
+        k = min(k, idx.shape[1])
+        order = np.argsort(-sims, axis=1, kind="stable")[:, :k]
+        return np.take_along_axis(idx, order, axis=1), np.take_along_axis(sims, order, axis=1)
+
+    def identify_many(self, queries, k=5):
+        """identify() para un lote de consultas (Q, D) en un solo viaje a los shards."""
+        queries = l2_normalize(np.atleast_2d(queries))
+        per_shard = self._scatter_gather("identify", queries, k)
+        merged = []
+        for q in range(queries.shape[0]):
+            best = {}
+            for shard in per_shard:
+                for name, sim in shard[q]:
+                    if sim > best.get(name, -np.inf):
+                        best[name] = sim
+            merged.append(sorted(best.items(), key=lambda item: -item[1])[:k])
+        return merged
+
+    def identify(self, query, k=5):
+        """Top-k identidades (máxima similitud entre sus imágenes): [(identidad, similitud), ...]."""
+        return self.identify_many(np.asarray(query).reshape(1, -1), k)[0]
+
+    def close(self):
+        """Detiene los procesos de búsqueda."""
+        for conn in self._conns:
+            if conn is None:
+                continue
+            try:
+                conn.send(None)
+                conn.close()
+            except (BrokenPipeError, OSError):
+                pass
+        deadline = time.monotonic() + 5
+        for proc in self._procs:
+            try:
+                proc.wait(timeout=max(0.0, deadline - time.monotonic()))
+            except subprocess.TimeoutExpired:
+                proc.kill()
+                proc.wait()
+        self._conns, self._procs = [], []
+
+
+def save_gallery(gallery, gallery_dir=None, shards=None, ann=False):
+    """
+    Guarda gallery repartida en shards (por defecto GALLERY_SHARDS) o, con un solo
+    shard, como FaceGallery (eliminando los shards de una galería anterior).
+    """
+    gallery_dir = gallery_dir or GALLERY_DIR
+    shards = GALLERY_SHARDS if shards is None else shards
+    if shards > 1:
+        return save_sharded(gallery, shards, gallery_dir, ann=ann)
+    if os.path.isdir(gallery_dir):
+        for name in os.listdir(gallery_dir):
+            if name.startswith("shard-"):
+                shutil.rmtree(os.path.join(gallery_dir, name))
+            elif name == SHARDS_FILE:
+                os.remove(os.path.join(gallery_dir, name))
+    if ann:
+        gallery.build_index()
+    return gallery.save(gallery_dir)
+
+
+def load_gallery(gallery_dir=None):
+    """Galería guardada: ShardedGallery si está repartida en shards, si no FaceGallery."""
+    gallery_dir = gallery_dir or GALLERY_DIR
+    if os.path.isfile(os.path.join(gallery_dir, SHARDS_FILE)):
+        return ShardedGallery(gallery_dir)
+    return FaceGallery.load(gallery_dir)
+
+
+def _shard_main():
+    """Proceso de un shard: python -m src.gallery_shards DIR OFFSET INDICE DIRECCION (clave por stdin)."""
+    shard_dir, offset, index, address = sys.argv[1], int(sys.argv[2]), int(sys.argv[3]), sys.argv[4]
+    authkey = bytes.fromhex(sys.stdin.readline().strip())
+    conn = Client(address, authkey=authkey)
+    conn.send(index)
+    _serve_shard(shard_dir, offset, conn)
+
+
+if __name__ == "__main__":
+    _shard_main()
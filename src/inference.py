@@ -4,38 +4,128 @@
 import os
 import sys
 import json
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 
 import mindspore as ms
 import numpy as np
 from PIL import Image
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from config import CHECKPOINT_DIR, IMAGE_SIZE, EMBEDDING_DIM
-from src.model import FaceBiometricsNet
+from config import (
+    CHECKPOINT_DIR,
+    IMAGE_SIZE,
+    EMBEDDING_DIM,
+    INFERENCE_BATCH_SIZE,
+    FUSE_BN_INFERENCE,
+    DECODE_DRAFT,
+    DECODE_DRAFT_FACTOR,
+)
+from src.model import FaceBiometricsNet, fold_batchnorm
+from src.cache import checkpoint_key
+from src.checkpoints import select_checkpoint
+from src.alignment import get_aligner
+from src.metrics import count, profile_call, stage
 
 # Normalización ImageNet (igual que en entrenamiento)
 MEAN = np.array([0.485, 0.456, 0.406], dtype=np.float32).reshape(1, 1, 3)
 STD = np.array([0.229, 0.224, 0.225], dtype=np.float32).reshape(1, 1, 3)
 
 
+# Normalización en una sola pasada: (x / 255 - MEAN) / STD = x * SCALE - SHIFT (CHW)
+_SCALE = (1.0 / (255.0 * STD)).reshape(3, 1, 1)
+_SHIFT = (MEAN / STD).reshape(3, 1, 1)
+
+
+def _open_reduced(image_path, size):
+    """
+    Abre una imagen RGB; si es JPEG y DECODE_DRAFT, la decodifica a escala reducida
+    (1/2, 1/4 o 1/8 en el dominio DCT) conservando al menos size px por lado.
+    """
+    pil = Image.open(image_path)
+    if DECODE_DRAFT and pil.format == "JPEG":
+        pil.draft("RGB", (size, size))
+    return pil if pil.mode == "RGB" else pil.convert("RGB")
+
+
+def _load_resized(image_path):
+    """
+    Decodifica una imagen y la redimensiona a IMAGE_SIZE (o recorta la cara
+    alineada si hay un detector configurado, ver src/alignment.py). Devuelve uint8 HWC.
+    """
+    aligner = get_aligner()
+    if aligner is not None:
+        # Los puntos de la cara están en coordenadas de la imagen completa: sin draft
+        with stage("decode"):
+            pil = Image.open(image_path).convert("RGB")
+        with stage("align"):
+            return aligner.align([np.asarray(pil)], [image_path])[0]
+    with stage("decode"):
+        pil = _open_reduced(image_path, DECODE_DRAFT_FACTOR * IMAGE_SIZE)
+        pil.load()
+    # Resize
+    with stage("resize"):
+        return np.asarray(pil.resize((IMAGE_SIZE, IMAGE_SIZE), Image.BILINEAR))
+
+
+def _normalize(arr, out=None):
+    """uint8 HWC -> float32 CHW con normalización ImageNet (escrito en out si se da)."""
+    with stage("normalize"):
+        if out is None:
+            out = np.empty((arr.shape[2], arr.shape[0], arr.shape[1]), dtype=np.float32)
+        # HWC -> CHW y normalización sin arrays intermedios
+        np.multiply(arr.transpose(2, 0, 1), _SCALE, out=out)
+        np.subtract(out, _SHIFT, out=out)
+        return out
+
+
+def _resized_image(image_path, cache=None):
+    """Imagen uint8 HWC redimensionada/alineada, desde la caché si está."""
+    arr = None
+    if cache is not None:
+        with stage("image_cache_get"):
+            arr = cache.get_image(image_path)
+    if arr is not None:
+        count("image_cache_hits")
+    else:
+        arr = _load_resized(image_path)
+        if cache is not None:
+            with stage("image_cache_put"):
+                cache.put_image(image_path, arr)
+    return arr
+
+
+def _preprocess_image(image_path, cache=None, out=None):
+    """
+    Carga una imagen y aplica resize + normalización. Devuelve array CHW float32
+    (out si se da, p. ej. una fila de un buffer de lote preasignado).
+    """
+    return _normalize(_resized_image(image_path, cache), out)
+
+
 def _load_image_tensor(image_path):
     """Carga una imagen y aplica resize + normalización (CHW, batch=1)."""
-    pil = Image.open(image_path).convert("RGB")
-    arr = np.array(pil, dtype=np.float32) / 255.0
-    # Resize
-    img = Image.fromarray((arr * 255).astype(np.uint8))
-    img = img.resize((IMAGE_SIZE, IMAGE_SIZE), Image.BILINEAR)
-    arr = np.array(img, dtype=np.float32) / 255.0
-    # HWC -> CHW
-    arr = np.transpose(arr, (2, 0, 1))
-    # Normalize
-    arr = (arr - MEAN.reshape(3, 1, 1)) / STD.reshape(3, 1, 1)
-    return ms.Tensor(arr[np.newaxis, ...], dtype=ms.float32)
-
-
-def load_embedding_model(checkpoint_dir=None):
-    """Carga el modelo de embeddings desde el directorio de checkpoints."""
+    arr = _preprocess_image(image_path)
+    with stage("to_tensor"):
+        return ms.Tensor(arr[np.newaxis, ...], dtype=ms.float32)
+
+
+def _embedding_dim(model):
+    """Dimensión del embedding del modelo (FaceBiometricsNet o FaceEmbeddingNet)."""
+    backbone = getattr(model, "backbone", model)
+    return getattr(backbone, "embedding_dim", EMBEDDING_DIM)
+
+
+def load_embedding_model(checkpoint_dir=None, fuse_bn=None, select=None):
+    """
+    Carga el modelo de embeddings desde el directorio de checkpoints.
+    select: "best" o "latest" (por defecto CHECKPOINT_SELECT, ver src/checkpoints.py).
+    Con fuse_bn (por defecto FUSE_BN_INFERENCE) el backbone se sustituye por su
+    variante con BatchNorm plegado en las convoluciones.
+    """
     checkpoint_dir = checkpoint_dir or CHECKPOINT_DIR
+    fuse_bn = FUSE_BN_INFERENCE if fuse_bn is None else fuse_bn
     config_path = os.path.join(checkpoint_dir, "model_config.json")
     if not os.path.isfile(config_path):
         raise FileNotFoundError(
@@ -46,34 +136,141 @@ def load_embedding_model(checkpoint_dir=None):
     num_classes = config["num_classes"]
     embedding_dim = config.get("embedding_dim", EMBEDDING_DIM)
 
-    # Buscar último checkpoint
-    ckpts = [f for f in os.listdir(checkpoint_dir) if f.startswith("face_biometrics") and f.endswith(".ckpt")]
-    if not ckpts:
-        raise FileNotFoundError(f"No hay .ckpt en {checkpoint_dir}")
-    ckpt_path = os.path.join(checkpoint_dir, sorted(ckpts)[-1])
+    # Mejor (o último) checkpoint según el manifiesto de entrenamiento
+    ckpt_path = select_checkpoint(checkpoint_dir, select)
 
-    full_net = FaceBiometricsNet(embedding_dim=embedding_dim, num_classes=num_classes)
-    param_dict = ms.load_checkpoint(ckpt_path)
-    ms.load_param_into_net(full_net, param_dict)
+    with stage("build_model"):
+        full_net = FaceBiometricsNet(
+            embedding_dim=embedding_dim, num_classes=num_classes, head=config.get("head", "softmax"),
+            backbone=config.get("backbone", "cnn"),
+        )
+    with stage("load_checkpoint"):
+        param_dict = ms.load_checkpoint(ckpt_path)
+        ms.load_param_into_net(full_net, param_dict)
     full_net.set_train(False)
+    if fuse_bn:
+        with stage("fuse_bn"):
+            full_net.backbone = fold_batchnorm(full_net.backbone)
+    # Identifica el checkpoint en la caché de embeddings y en los grafos exportados
+    full_net.checkpoint_path = ckpt_path
+    full_net.cache_key = checkpoint_key(ckpt_path)
     return full_net
 
 
-def get_embedding(model, image_path):
+def get_embedding(model, image_path, cache=None):
     """Obtiene el vector de embedding (128-d) para una imagen de rostro."""
-    x = _load_image_tensor(image_path)
-    emb = model.get_embedding(x)
-    return emb.asnumpy().flatten()
+    return get_embeddings(model, [image_path], batch_size=1, cache=cache)[0]
+
+
+def _ordered_map(fn, items, workers=0, depth=None, processes=False):
+    """
+    map(fn, items) conservando el orden; con workers > 0 usa un pool de hilos con
+    como mucho depth tareas en vuelo (la decodificación de PIL libera el GIL).
+    Con processes=True el pool es de procesos (fn e items deben poder serializarse).
+    """
+    if not workers or workers <= 1:
+        yield from map(fn, items)
+        return
+    depth = depth or 4 * workers
+    if processes:
+        pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+    else:
+        pool = ThreadPoolExecutor(max_workers=workers)
+    with pool:
+        in_flight = deque()
+        for item in items:
+            in_flight.append(pool.submit(fn, item))
+            if len(in_flight) >= depth:
+                yield in_flight.popleft().result()
+        while in_flight:
+            yield in_flight.popleft().result()
+
+
+def iter_embeddings(model, image_paths, batch_size=None, cache=None, workers=0):
+    """
+    Versión en streaming de get_embeddings: produce (posiciones, embeddings) por lote,
+    donde posiciones son los índices de las imágenes en image_paths.
+    Con workers > 0 la decodificación se reparte en un pool de hilos.
+    """
+    batch_size = batch_size or INFERENCE_BATCH_SIZE
+    model_key = getattr(model, "cache_key", None)
+    use_emb_cache = cache is not None and model_key is not None
+    # Buffer de entrada reutilizado entre lotes; el último lote se rellena con ceros
+    # para mantener siempre la misma forma (evita recompilar el grafo).
+    buffer = np.zeros((batch_size, 3, IMAGE_SIZE, IMAGE_SIZE), dtype=np.float32)
+    pending = []  # (posición, ruta) de las imágenes del lote en curso
+    hits = []     # (posición, embedding) leídos de la caché
+
+    def load(item):
+        pos, path = item
+        emb = cache.get_embedding(path, model_key) if use_emb_cache else None
+        if emb is not None:
+            count("embedding_cache_hits")
+            return pos, path, emb, None
+        return pos, path, None, _resized_image(path, cache)
+
+    def flush():
+        n = len(pending)
+        with stage("forward", items=n):
+            out = model.get_embedding(ms.Tensor(buffer)).asnumpy()[:n]
+        count("forward_padding", batch_size - n)
+        positions = np.array([pos for pos, _ in pending], dtype=np.int64)
+        if use_emb_cache:
+            for j, (_, path) in enumerate(pending):
+                cache.put_embedding(path, model_key, out[j])
+        pending.clear()
+        return positions, out
+
+    def flush_hits():
+        positions = np.array([pos for pos, _ in hits], dtype=np.int64)
+        out = np.stack([emb for _, emb in hits])
+        hits.clear()
+        return positions, out
+
+    for pos, path, emb, image in _ordered_map(load, enumerate(image_paths), workers):
+        if emb is not None:
+            hits.append((pos, emb))
+            if len(hits) == batch_size:
+                yield flush_hits()
+            continue
+        _normalize(image, out=buffer[len(pending)])
+        pending.append((pos, path))
+        if len(pending) == batch_size:
+            yield flush()
+    if hits:
+        yield flush_hits()
+    if pending:
+        buffer[len(pending):] = 0.0
+        yield flush()
+
+
+def get_embeddings(model, image_paths, batch_size=None, cache=None, workers=0):
+    """
+    Extrae embeddings de muchas imágenes ejecutando el backbone una vez por lote.
+    image_paths puede ser una lista o un iterador de rutas.
+    Devuelve un array (N, embedding_dim) float32 en el mismo orden de entrada.
+    Con cache (FaceCache) se reutilizan embeddings e imágenes ya preprocesadas.
+    """
+    with profile_call("get_embeddings"):
+        chunks = list(iter_embeddings(model, image_paths, batch_size=batch_size, cache=cache, workers=workers))
+    if not chunks:
+        return np.zeros((0, _embedding_dim(model)), dtype=np.float32)
+    total = sum(len(positions) for positions, _ in chunks)
+    result = np.empty((total, chunks[0][1].shape[1]), dtype=np.float32)
+    for positions, embs in chunks:
+        result[positions] = embs
+    return result
 
 
-def verify_pair(model, path_a, path_b, threshold=0.5):
+def verify_pair(model, path_a, path_b, threshold=0.5, cache=None):
     """
     Verificación 1:1: ¿son la misma persona?
     Devuelve (es_misma_persona: bool, similitud: float).
     """
-    emb_a = get_embedding(model, path_a)
-    emb_b = get_embedding(model, path_b)
-    sim = np.dot(emb_a, emb_b) / (np.linalg.norm(emb_a) * np.linalg.norm(emb_b) + 1e-8)
+    with profile_call("verify_pair"):
+        emb_a, emb_b = get_embeddings(model, [path_a, path_b], batch_size=2, cache=cache)
+        with stage("cosine"):
+            sim = np.dot(emb_a, emb_b) / (np.linalg.norm(emb_a) * np.linalg.norm(emb_b) + 1e-8)
     return bool(sim >= threshold), float(sim)
 
 
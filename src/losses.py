@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+"""
+Pérdidas con margen angular para embeddings faciales: ArcFace (cos(θ + m)) y
+CosFace (cos θ − m), con muestreo de centros estilo Partial FC.
+
+Con num_sampled > 0 cada paso usa solo num_sampled centros: los de las
+identidades del lote (positivos) más negativos aleatorios. Los logits, su
+gradiente y la normalización de centros pasan de (B, num_classes) a
+(B, num_sampled); el gradiente de los centros solo es distinto de cero en las
+filas usadas.
+"""
+
+import math
+import os
+import sys
+
+import mindspore as ms
+import mindspore.nn as nn
+import numpy as np
+from mindspore import ops
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import ARCFACE_MARGIN, COSFACE_MARGIN, PARTIAL_FC_SAMPLES, SEED
+from src.model import RowNormalize
+
+
+class MarginSoftmaxLoss(nn.Cell):
+    """
+    Entropía cruzada sobre scale * coseno(embedding, centro) con margen en la clase
+    correcta. Recibe embeddings ya normalizados (B, D), los centros (C, D) y las
+    etiquetas (B,).
+    """
+
+    def __init__(self, num_classes, batch_size, head="arcface", scale=64.0, margin=None, num_sampled=None):
+        super().__init__()
+        if head not in ("arcface", "cosface"):
+            raise ValueError(f"Pérdida con margen desconocida: {head} (arcface o cosface)")
+        self.arcface = head == "arcface"
+        self.scale = scale
+        self.margin = margin if margin is not None else (ARCFACE_MARGIN if self.arcface else COSFACE_MARGIN)
+        num_sampled = PARTIAL_FC_SAMPLES if num_sampled is None else num_sampled
+        # Sin muestreo si se piden tantos centros como clases (o no caben los positivos)
+        self.sampled = batch_size < num_sampled < num_classes
+        self.num_classes = num_classes
+        self.num_negatives = num_sampled - batch_size if self.sampled else 0
+        # ArcFace: cos(θ + m) = cos θ cos m − sin θ sin m; si θ + m > π se usa cos θ − m sin m
+        self.cos_m = math.cos(self.margin)
+        self.sin_m = math.sin(self.margin)
+        self.threshold = math.cos(math.pi - self.margin)
+        self.fallback = math.sin(math.pi - self.margin) * self.margin
+        self.normalize = RowNormalize()
+        self.matmul = ops.MatMul(transpose_b=True)
+        self.gather = ops.Gather()
+        self.uniform_int = ops.UniformInt(seed=SEED)
+        self.reduce_max = ops.ReduceMax(keep_dims=True)
+        self.reduce_sum = ops.ReduceSum()
+        self.scatter_update = ops.TensorScatterUpdate()
+        self.positions = ms.Tensor(np.arange(batch_size, dtype=np.int32))
+        if self.sampled:
+            # Columna j != i con la misma identidad que la muestra i: duplicado del positivo
+            not_self = np.arange(num_sampled)[None, :] != np.arange(batch_size)[:, None]
+            self.not_self = ms.Tensor(not_self)
+
+    def _margin(self, cos):
+        if not self.arcface:
+            return cos - self.margin
+        sin = ops.sqrt(ops.clip_by_value(1.0 - cos * cos, 0.0, 1.0))
+        phi = cos * self.cos_m - sin * self.sin_m
+        return ops.select(cos > self.threshold, phi, cos - self.fallback)
+
+    def construct(self, embeddings, weight, labels):
+        labels = ops.cast(labels, ms.int32)
+        if self.sampled:
+            # Columnas: una por muestra (su propio centro) + negativos aleatorios
+            negatives = self.uniform_int(
+                (self.num_negatives,), ms.Tensor(0, ms.int32), ms.Tensor(self.num_classes, ms.int32)
+            )
+            index = ops.concat((labels, negatives))
+            centers = self.normalize(self.gather(weight, index, 0))
+            target = self.positions
+        else:
+            centers = self.normalize(weight)
+            target = labels
+        # El margen solo afecta a B valores (coseno con el centro propio); el resto de
+        # la matriz (B, columnas) es scale * coseno
+        target_cos = self.reduce_sum(embeddings * self.gather(centers, target, 0), 1)
+        target_logit = self._margin(target_cos) * self.scale
+        logits = self.matmul(embeddings, centers) * self.scale
+        logits = self.scatter_update(logits, ops.stack((self.positions, target), 1), target_logit)
+        if self.sampled:
+            # Otras columnas con la misma identidad que la muestra se anulan (no son negativos)
+            same = ops.equal(ops.expand_dims(index, 0), ops.expand_dims(labels, 1))
+            logits = ops.masked_fill(logits, ops.logical_and(same, self.not_self), ms.Tensor(-1e4, logits.dtype))
+        # Entropía cruzada estable (log-sum-exp): con scale = 64 la probabilidad de la
+        # clase correcta puede no ser representable en float32 al inicio
+        top = ops.stop_gradient(self.reduce_max(logits, 1))
+        log_sum = ops.log(self.reduce_sum(ops.exp(logits - top), 1)) + ops.squeeze(top, 1)
+        return ops.reduce_mean(log_sum - target_logit)
+
+
+class MarginTrainCell(nn.Cell):
+    """Red de entrenamiento: backbone + MarginSoftmaxLoss sobre los centros de net.classifier."""
+
+    def __init__(self, net, loss):
+        super().__init__(auto_prefix=False)
+        self.net = net
+        self.loss = loss
+
+    def construct(self, image, label):
+        return self.loss(self.net.backbone(image), self.net.classifier.weight, label)
+
+
+class DistillTrainCell(nn.Cell):
+    """
+    Destilación de embeddings: pérdida de clasificación del alumno (net) más
+    weight * (1 - coseno) entre su embedding y el del profesor congelado.
+    loss: MarginSoftmaxLoss (margin=True) o una pérdida sobre logits.
+    El profesor debe estar plegado (sin BatchNorm), ya que Model.train pone toda
+    la red en modo entrenamiento; sus parámetros se renombran con el prefijo "teacher.".
+    """
+
+    def __init__(self, net, teacher, loss, weight=1.0, margin=False):
+        super().__init__(auto_prefix=False)
+        self.net = net
+        teacher.update_parameters_name("teacher.")
+        for param in teacher.get_parameters():
+            param.requires_grad = False
+        self.teacher = teacher
+        self.loss = loss
+        self.weight = weight
+        self.margin = margin
+        self.reduce_sum = ops.ReduceSum()
+
+    def construct(self, image, label):
+        embeddings = self.net.backbone(image)
+        target = ops.stop_gradient(self.teacher(image))
+        if self.margin:
+            loss = self.loss(embeddings, self.net.classifier.weight, label)
+        else:
+            loss = self.loss(self.net.classifier(embeddings), label)
+        # Ambos embeddings están normalizados: coseno = producto escalar
+        distill = 1.0 - ops.reduce_mean(self.reduce_sum(embeddings * target, 1))
+        return loss + self.weight * distill
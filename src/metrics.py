@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+"""
+Instrumentación ligera de la inferencia: tiempos por etapa (histogramas),
+contadores y un modo de perfilado con el desglose de cada llamada.
+- Desactivada (METRICS_ENABLED = False) stage() devuelve siempre el mismo
+  contexto vacío: el coste es una comprobación de un booleano.
+- Exportación en texto de Prometheus (prometheus_text) o JSON (snapshot).
+- Perfilado (METRICS_PROFILE): profile_call() agrupa las etapas ejecutadas en el
+  mismo hilo durante una llamada y añade su desglose a METRICS_PROFILE_FILE (JSONL).
+"""
+
+import bisect
+import contextlib
+import json
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import METRICS_ENABLED, METRICS_PROFILE, METRICS_BUCKETS_MS, METRICS_PROFILE_FILE
+
+PREFIX = "face"
+_NULL = contextlib.nullcontext()
+
+
+class Histogram:
+    """Histograma de duraciones (segundos) con límites fijos en ms, acumulado a la Prometheus."""
+
+    def __init__(self, buckets_ms=None):
+        self.bounds = [b / 1000.0 for b in (buckets_ms or METRICS_BUCKETS_MS)]
+        self.counts = [0] * (len(self.bounds) + 1)  # el último: +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(self.bounds, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        self.max = max(self.max, seconds)
+
+    def quantile(self, q):
+        """Cuantil aproximado (límite superior del intervalo que lo contiene)."""
+        if not self.count:
+            return 0.0
+        target, seen = q * self.count, 0
+        for bound, n in zip(self.bounds, self.counts):
+            seen += n
+            if seen >= target:
+                return min(bound, self.max)
+        return self.max
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "sum_s": self.sum,
+            "mean_ms": 1000.0 * self.sum / self.count if self.count else 0.0,
+            "p50_ms": 1000.0 * self.quantile(0.5),
+            "p99_ms": 1000.0 * self.quantile(0.99),
+            "max_ms": 1000.0 * self.max,
+        }
+
+
+class _Stage:
+    """Contexto que mide una etapa y la registra al salir."""
+
+    __slots__ = ("metrics", "name", "items", "start")
+
+    def __init__(self, metrics, name, items):
+        self.metrics = metrics
+        self.name = name
+        self.items = items
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.name, time.perf_counter() - self.start, self.items)
+        return False
+
+
+class Metrics:
+    """Registro de histogramas por etapa y contadores (seguro entre hilos)."""
+
+    def __init__(self, enabled=None, profile=None, profile_file=None):
+        self.enabled = METRICS_ENABLED if enabled is None else enabled
+        self.profile = METRICS_PROFILE if profile is None else profile
+        self.profile_file = profile_file or METRICS_PROFILE_FILE
+        self.stages = {}
+        self.counters = {}
+        self.calls = []  # desglose de las últimas llamadas perfiladas
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def enable(self, profile=False):
+        self.enabled = True
+        self.profile = self.profile or profile
+
+    def reset(self):
+        with self._lock:
+            self.stages.clear()
+            self.counters.clear()
+            self.calls.clear()
+
+    def stage(self, name, items=1):
+        """Contexto que mide la etapa name (items: imágenes procesadas en ella)."""
+        if not self.enabled:
+            return _NULL
+        return _Stage(self, name, items)
+
+    def count(self, name, n=1):
+        if self.enabled:
+            with self._lock:
+                self.counters[name] = self.counters.get(name, 0) + n
+
+    def observe(self, name, seconds, items=1):
+        with self._lock:
+            hist = self.stages.get(name)
+            if hist is None:
+                hist = self.stages[name] = Histogram()
+            hist.observe(seconds)
+            self.counters[f"{name}_items"] = self.counters.get(f"{name}_items", 0) + items
+        call = getattr(self._local, "call", None)
+        if call is not None:
+            call[name] = call.get(name, 0.0) + seconds
+
+    @contextlib.contextmanager
+    def profile_call(self, name, **info):
+        """
+        Llamada perfilada: con el modo de perfilado activo, las etapas del mismo hilo
+        se suman en un desglose que se añade a profile_file. Las llamadas anidadas
+        cuentan dentro de la más externa.
+        """
+        if not (self.enabled and self.profile) or getattr(self._local, "call", None) is not None:
+            with self.stage(name):
+                yield
+            return
+        self._local.call = breakdown = {}
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            total = time.perf_counter() - start
+            self._local.call = None
+            self.observe(name, total)
+            record = {"call": name, "total_ms": 1000.0 * total, **info,
+                      "stages_ms": {k: 1000.0 * v for k, v in breakdown.items()}}
+            with self._lock:
+                self.calls.append(record)
+                del self.calls[:-1000]
+                if self.profile_file:
+                    os.makedirs(os.path.dirname(self.profile_file) or ".", exist_ok=True)
+                    with open(self.profile_file, "a") as f:
+                        f.write(json.dumps(record) + "\n")
+
+    def snapshot(self):
+        """Estado actual como dict serializable en JSON."""
+        with self._lock:
+            return {
+                "stages": {name: hist.to_dict() for name, hist in self.stages.items()},
+                "counters": dict(self.counters),
+            }
+
+    def prometheus_text(self):
+        """Métricas en formato de exposición de texto de Prometheus."""
+        lines = []
+        with self._lock:
+            if self.stages:
+                metric = f"{PREFIX}_stage_seconds"
+                lines += [f"# HELP {metric} Duración de cada etapa de la inferencia.",
+                          f"# TYPE {metric} histogram"]
+                for name, hist in sorted(self.stages.items()):
+                    seen = 0
+                    for bound, n in zip(hist.bounds + [float("inf")], hist.counts):
+                        seen += n
+                        le = "+Inf" if bound == float("inf") else repr(bound)
+                        lines.append(f'{metric}_bucket{{stage="{name}",le="{le}"}} {seen}')
+                    lines.append(f'{metric}_sum{{stage="{name}"}} {hist.sum!r}')
+                    lines.append(f'{metric}_count{{stage="{name}"}} {hist.count}')
+            for name, value in sorted(self.counters.items()):
+                metric = f"{PREFIX}_{name}_total"
+                lines += [f"# TYPE {metric} counter", f"{metric} {value}"]
+        return "\n".join(lines) + "\n"
+
+    def summary_table(self):
+        """Tabla de texto con el tiempo por etapa, ordenada por tiempo total."""
+        stats = self.snapshot()["stages"]
+        rows = [f"{'etapa':<22}{'n':>8}{'total s':>10}{'media ms':>10}{'p50 ms':>10}{'p99 ms':>10}{'máx ms':>10}"]
+        for name, s in sorted(stats.items(), key=lambda item: -item[1]["sum_s"]):
+            rows.append(f"{name:<22}{s['count']:>8}{s['sum_s']:>10.3f}{s['mean_ms']:>10.2f}"
+                        f"{s['p50_ms']:>10.2f}{s['p99_ms']:>10.2f}{s['max_ms']:>10.2f}")
+        return "\n".join(rows)
+
+
+# Registro global usado por src/inference.py y src/server.py
+METRICS = Metrics()
+stage = METRICS.stage
+count = METRICS.count
+profile_call = METRICS.profile_call
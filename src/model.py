@@ -3,7 +3,8 @@
 
 import mindspore as ms
 import mindspore.nn as nn
-from mindspore.common.initializer import Normal
+import numpy as np
+from mindspore.common.initializer import Normal, initializer
 
 
 class ConvBlock(nn.Cell):
@@ -26,44 +27,220 @@ class ConvBlock(nn.Cell):
         return x
 
 
+class FusedConvBlock(nn.Cell):
+    """Bloque de inferencia Conv2d (con BatchNorm plegado en pesos y bias) + ReLU + MaxPool."""
+
+    def __init__(self, in_ch, out_ch, kernel_size=3, stride=1):
+        super().__init__()
+        self.conv = nn.Conv2d(
+            in_ch, out_ch, kernel_size=kernel_size, stride=stride, pad_mode="same", has_bias=True
+        )
+        self.relu = nn.ReLU()
+        self.pool = nn.MaxPool2d(kernel_size=2, stride=2)
+
+    def construct(self, x):
+        x = self.conv(x)
+        x = self.relu(x)
+        x = self.pool(x)
+        return x
+
+
 class FaceEmbeddingNet(nn.Cell):
     """
     Red que extrae vectores de embedding (128-d) a partir de caras.
     Entrada: (B, 3, 112, 112), Salida: (B, embedding_dim).
+    fused=True construye la variante de inferencia sin BatchNorm (ver fold_batchnorm).
     """
 
-    def __init__(self, embedding_dim=128):
+    def __init__(self, embedding_dim=128, fused=False):
         super().__init__()
         self.embedding_dim = embedding_dim
+        self.fused = fused
+        block = FusedConvBlock if fused else ConvBlock
         self.features = nn.SequentialCell(
-            ConvBlock(3, 32),   # -> 56x56
-            ConvBlock(32, 64),  # -> 28x28
-            ConvBlock(64, 128), # -> 14x14
-            ConvBlock(128, 256), # -> 7x7
+            block(3, 32),   # -> 56x56
+            block(32, 64),  # -> 28x28
+            block(64, 128), # -> 14x14
+            block(128, 256), # -> 7x7
         )
         self.flatten = nn.Flatten()
         self.fc = nn.Dense(256 * 7 * 7, embedding_dim, weight_init=Normal(0.02), bias_init="zeros")
 
-    def construct(self, x):
+    def embed_features(self, x):
+        """Embedding sin normalizar (común a todos los backbones, ver src/export.py)."""
         x = self.features(x)
         x = self.flatten(x)
-        x = self.fc(x)
-        x = ms.ops.L2Normalize(axis=1)(x)
+        return self.fc(x)
+
+    def construct(self, x):
+        return ms.ops.L2Normalize(axis=1)(self.embed_features(x))
+
+
+class ConvBN(nn.Cell):
+    """
+    Conv2d + BatchNorm (+ ReLU si act). group = in_ch da una convolución depthwise.
+    fused=True: convolución con bias (BatchNorm plegado, ver fold_batchnorm).
+    """
+
+    def __init__(self, in_ch, out_ch, kernel_size=1, stride=1, group=1, act=True, pad_mode="same", fused=False):
+        super().__init__()
+        self.fused = fused
+        self.act = act
+        self.conv = nn.Conv2d(
+            in_ch, out_ch, kernel_size=kernel_size, stride=stride, pad_mode=pad_mode, group=group, has_bias=fused
+        )
+        if not fused:
+            self.bn = nn.BatchNorm2d(out_ch)
+        self.relu = nn.ReLU()
+
+    def construct(self, x):
+        x = self.conv(x)
+        if not self.fused:
+            x = self.bn(x)
+        if self.act:
+            x = self.relu(x)
         return x
 
 
+class Bottleneck(nn.Cell):
+    """
+    Bloque residual invertido (MobileNetV2/MobileFaceNet): expansión 1x1,
+    depthwise 3x3 y proyección lineal 1x1; suma residual si stride 1 y mismos canales.
+    """
+
+    def __init__(self, in_ch, out_ch, stride=1, expansion=2, fused=False):
+        super().__init__()
+        hidden = in_ch * expansion
+        self.residual = stride == 1 and in_ch == out_ch
+        self.block = nn.SequentialCell(
+            ConvBN(in_ch, hidden, fused=fused),
+            ConvBN(hidden, hidden, kernel_size=3, stride=stride, group=hidden, fused=fused),
+            ConvBN(hidden, out_ch, act=False, fused=fused),
+        )
+        self.add = ms.ops.Add()
+
+    def construct(self, x):
+        if self.residual:
+            return self.add(x, self.block(x))
+        return self.block(x)
+
+
+# (expansión, canales, repeticiones, stride) de los bloques de MobileFaceNet, reducidos
+MOBILEFACENET_BLOCKS = [(2, 64, 2, 2), (4, 128, 1, 2), (2, 128, 2, 1), (4, 128, 1, 2), (2, 128, 1, 1)]
+
+
+class MobileFaceNet(nn.Cell):
+    """
+    Backbone ligero tipo MobileFaceNet: convoluciones separables en profundidad y,
+    en lugar de Flatten + Dense (12544 -> 128), una cabeza de pooling global
+    (depthwise 7x7 sobre el mapa final, GDC) y una proyección 1x1 al embedding.
+    Entrada: (B, 3, 112, 112), Salida: (B, embedding_dim) L2 normalizada.
+    """
+
+    def __init__(self, embedding_dim=128, fused=False, width=256):
+        super().__init__()
+        self.embedding_dim = embedding_dim
+        self.fused = fused
+        layers = [
+            ConvBN(3, 64, kernel_size=3, stride=2, fused=fused),                 # -> 56x56
+            ConvBN(64, 64, kernel_size=3, group=64, fused=fused),
+        ]
+        in_ch = 64
+        for expansion, out_ch, repeats, stride in MOBILEFACENET_BLOCKS:      # -> 7x7
+            for i in range(repeats):
+                layers.append(Bottleneck(in_ch, out_ch, stride if i == 0 else 1, expansion, fused=fused))
+                in_ch = out_ch
+        layers.append(ConvBN(in_ch, width, fused=fused))
+        self.features = nn.SequentialCell(layers)
+        # Pooling global ponderado (GDC) y embedding lineal
+        self.pool = ConvBN(width, width, kernel_size=7, group=width, act=False, pad_mode="valid", fused=fused)
+        self.embed = ConvBN(width, embedding_dim, act=False, fused=fused)
+        self.flatten = nn.Flatten()
+
+    def embed_features(self, x):
+        """Embedding sin normalizar (común a todos los backbones, ver src/export.py)."""
+        x = self.features(x)
+        x = self.embed(self.pool(x))
+        return self.flatten(x)
+
+    def construct(self, x):
+        return ms.ops.L2Normalize(axis=1)(self.embed_features(x))
+
+
+# Backbones seleccionables con BACKBONE en config.py; cada uno expone embed_features(x)
+# (embedding sin normalizar) y construct(x) = L2Normalize(embed_features(x))
+BACKBONES = {"cnn": FaceEmbeddingNet, "mobilefacenet": MobileFaceNet}
+
+
+def create_backbone(name="cnn", embedding_dim=128, fused=False):
+    """Crea el backbone registrado como name."""
+    if name not in BACKBONES:
+        raise ValueError(f"Backbone desconocido: {name} ({', '.join(BACKBONES)})")
+    return BACKBONES[name](embedding_dim=embedding_dim, fused=fused)
+
+
+class RowNormalize(nn.Cell):
+    """
+    Normalización L2 por filas con operadores elementales. Equivale a
+    L2Normalize(axis=1), cuyo gradiente en CPU es muy lento para matrices de
+    centros grandes (num_classes, dim).
+    """
+
+    def __init__(self, eps=1e-12):
+        super().__init__()
+        self.mul = ms.ops.Mul()
+        self.add = ms.ops.Add()
+        self.div = ms.ops.Div()
+        self.sqrt = ms.ops.Sqrt()
+        self.reduce_sum = ms.ops.ReduceSum(keep_dims=True)
+        self.eps = ms.Tensor(eps, ms.float32)
+
+    def construct(self, x):
+        return self.div(x, self.sqrt(self.add(self.reduce_sum(self.mul(x, x), 1), self.eps)))
+
+
+class CosineClassifier(nn.Cell):
+    """
+    Cabeza de las pérdidas con margen (ArcFace/CosFace): un centro por identidad
+    (weight (num_classes, in_channels), como nn.Dense) y logits = scale * coseno.
+    El margen solo se aplica en entrenamiento (src/losses.py).
+    """
+
+    def __init__(self, in_channels, out_channels, scale=64.0):
+        super().__init__()
+        self.in_channels = in_channels
+        self.out_channels = out_channels
+        self.scale = scale
+        self.weight = ms.Parameter(initializer(Normal(0.02), (out_channels, in_channels), ms.float32), name="weight")
+        self.normalize = RowNormalize()
+        self.matmul = ms.ops.MatMul(transpose_b=True)
+        self.mul = ms.ops.Mul()
+        self._scale = ms.Tensor(scale, ms.float32)
+
+    def construct(self, x):
+        return self.mul(self.matmul(x, self.normalize(self.weight)), self._scale)
+
+
 class FaceBiometricsNet(nn.Cell):
     """
     Modelo completo para entrenamiento: backbone + cabeza de clasificación.
     Para inferencia/verificación se usa solo el backbone (FaceEmbeddingNet).
+    head: "softmax" (nn.Dense) o "arcface"/"cosface" (CosineClassifier).
+    backbone: nombre en BACKBONES ("cnn" o "mobilefacenet").
     """
 
-    def __init__(self, embedding_dim=128, num_classes=10):
+    def __init__(self, embedding_dim=128, num_classes=10, head="softmax", scale=64.0, backbone="cnn"):
         super().__init__()
-        self.backbone = FaceEmbeddingNet(embedding_dim=embedding_dim)
-        self.classifier = nn.Dense(
-            embedding_dim, num_classes, weight_init=Normal(0.02), bias_init="zeros"
-        )
+        self.head = head
+        self.backbone = create_backbone(backbone, embedding_dim=embedding_dim)
+        if head == "softmax":
+            self.classifier = nn.Dense(
+                embedding_dim, num_classes, weight_init=Normal(0.02), bias_init="zeros"
+            )
+        elif head in ("arcface", "cosface"):
+            self.classifier = CosineClassifier(embedding_dim, num_classes, scale=scale)
+        else:
+            raise ValueError(f"Cabeza desconocida: {head} (softmax, arcface o cosface)")
 
     def construct(self, x):
         embeddings = self.backbone(x)
@@ -75,3 +252,27 @@ class FaceBiometricsNet(nn.Cell):
         return self.backbone(x)
 
 
+def _bn_units(net):
+    """Capas convolución + BatchNorm (o su variante plegada) en orden de definición."""
+    return [cell for _, cell in net.cells_and_names() if isinstance(cell, (ConvBlock, FusedConvBlock, ConvBN))]
+
+
+def fold_batchnorm(backbone):
+    """
+    Pliega los BatchNorm (estadísticas congeladas) de cada ConvBlock/ConvBN en la convolución:
+    W' = W * gamma / sqrt(var + eps), b' = beta - mean * gamma / sqrt(var + eps).
+    Devuelve el mismo tipo de backbone con fused=True, equivalente y en modo inferencia.
+    """
+    fused = type(backbone)(embedding_dim=backbone.embedding_dim, fused=True)
+    for src, dst in zip(_bn_units(backbone), _bn_units(fused)):
+        bn = src.bn
+        scale = bn.gamma.asnumpy() / np.sqrt(bn.moving_variance.asnumpy() + bn.eps)
+        weight = src.conv.weight.asnumpy() * scale[:, None, None, None]
+        bias = bn.beta.asnumpy() - bn.moving_mean.asnumpy() * scale
+        dst.conv.weight.set_data(ms.Tensor(weight.astype(np.float32)))
+        dst.conv.bias.set_data(ms.Tensor(bias.astype(np.float32)))
+    if isinstance(backbone, FaceEmbeddingNet):
+        fused.fc.weight.set_data(backbone.fc.weight.value())
+        fused.fc.bias.set_data(backbone.fc.bias.value())
+    fused.set_train(False)
+    return fused
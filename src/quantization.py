@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""
+Cuantización post-entrenamiento del backbone de embeddings a INT8 (ONNX Runtime).
+- static: pesos INT8 por canal y activaciones UINT8 calibradas con imágenes de data/train.
+- dynamic: pesos INT8; el rango de las activaciones se calcula en tiempo de ejecución.
+Requiere los paquetes opcionales onnx y onnxruntime.
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import IMAGE_SIZE, INFERENCE_BATCH_SIZE, VERIFICATION_THRESHOLD
+from src.inference import _preprocess_image, get_embeddings
+
+ONNX_QUANT_OPSET = 13
+
+
+def _require_onnxruntime():
+    try:
+        import onnx  # noqa: F401
+        import onnxruntime.quantization as ortq
+    except ImportError as e:
+        raise ImportError("La cuantización requiere onnx y onnxruntime: pip install onnx onnxruntime") from e
+    return ortq
+
+
+def _calibration_reader(ortq, image_paths, input_name, batch_size):
+    """CalibrationDataReader que entrega lotes de imágenes preprocesadas."""
+
+    class Reader(ortq.CalibrationDataReader):
+        def __init__(self):
+            self._batches = iter(range(0, len(image_paths), batch_size))
+
+        def get_next(self):
+            start = next(self._batches, None)
+            if start is None:
+                return None
+            chunk = image_paths[start:start + batch_size]
+            batch = np.empty((len(chunk), 3, IMAGE_SIZE, IMAGE_SIZE), dtype=np.float32)
+            for i, path in enumerate(chunk):
+                _preprocess_image(path, out=batch[i])
+            return {input_name: batch}
+
+    return Reader()
+
+
+def quantize_embedding_model(float_path, output_path, calibration_paths=None, mode="static", batch_size=None):
+    """
+    Cuantiza el ONNX float float_path y escribe output_path.
+    En modo static calibra con calibration_paths (formato QDQ, pesos por canal).
+    """
+    ortq = _require_onnxruntime()
+    import onnx
+    import onnxruntime as ort
+
+    # MindSpore exporta opset 11; la cuantización por canal (QDQ con eje) necesita >= 13
+    prepared = output_path + ".prep.onnx"
+    model = onnx.load(float_path)
+    if model.opset_import[0].version < ONNX_QUANT_OPSET:
+        model = onnx.version_converter.convert_version(model, ONNX_QUANT_OPSET)
+    onnx.save(model, prepared)
+    # Pre-proceso recomendado por ONNX Runtime (inferencia de formas y fusión Conv+BN)
+    ortq.shape_inference.quant_pre_process(prepared, prepared, skip_symbolic_shape=True)
+    try:
+        if mode == "dynamic":
+            ortq.quantize_dynamic(prepared, output_path, weight_type=ortq.QuantType.QInt8, per_channel=True)
+        elif mode == "static":
+            if not calibration_paths:
+                raise ValueError("La cuantización estática necesita imágenes de calibración")
+            input_name = ort.InferenceSession(prepared, providers=["CPUExecutionProvider"]).get_inputs()[0].name
+            reader = _calibration_reader(ortq, list(calibration_paths), input_name, batch_size or INFERENCE_BATCH_SIZE)
+            ortq.quantize_static(
+                prepared, output_path, reader,
+                quant_format=ortq.QuantFormat.QDQ,
+                per_channel=True,
+                weight_type=ortq.QuantType.QInt8,
+                activation_type=ortq.QuantType.QUInt8,
+            )
+        else:
+            raise ValueError(f"Modo de cuantización desconocido: {mode}")
+    finally:
+        if os.path.exists(prepared):
+            os.remove(prepared)
+    # El modelo INT8 procede del mismo checkpoint que el ONNX float
+    from src.export import read_export_source, write_export_source
+
+    source = read_export_source(float_path)
+    if source is not None:
+        write_export_source(output_path, source)
+    return output_path
+
+
+def verification_accuracy(embeddings, labels, threshold=None):
+    """Accuracy de verificación 1:1 sobre todos los pares (i < j) con el umbral dado."""
+    threshold = VERIFICATION_THRESHOLD if threshold is None else threshold
+    labels = np.asarray(labels)
+    sims = embeddings @ embeddings.T
+    iu = np.triu_indices(len(labels), k=1)
+    genuine = labels[iu[0]] == labels[iu[1]]
+    return float(np.mean((sims[iu] >= threshold) == genuine)) if genuine.size else 0.0
+
+
+def compare_models(float_model, quant_model, image_paths, labels, batch_size=None, threshold=None):
+    """
+    Compara el modelo cuantizado con el float: deriva coseno de los embeddings,
+    accuracy de verificación y throughput. Devuelve un diccionario de métricas.
+    """
+    import mindspore as ms
+
+    batch_size = batch_size or INFERENCE_BATCH_SIZE
+    # Lote fijo ya preprocesado: la velocidad mide solo la pasada forward
+    batch = np.stack([_preprocess_image(p) for p in (list(image_paths) * batch_size)[:batch_size]])
+    result = {}
+    embs = {}
+    for name, model in (("float", float_model), ("int8", quant_model)):
+        embs[name] = get_embeddings(model, image_paths, batch_size=batch_size)
+        result[f"{name}_verif_acc"] = verification_accuracy(embs[name], labels, threshold)
+        model.get_embedding(ms.Tensor(batch))  # calentamiento
+        t0 = time.perf_counter()
+        runs = 5
+        for _ in range(runs):
+            model.get_embedding(ms.Tensor(batch)).asnumpy()
+        result[f"{name}_img_per_s"] = runs * batch_size / (time.perf_counter() - t0)
+    cos = np.sum(embs["float"] * embs["int8"], axis=1)
+    result["cos_mean"] = float(cos.mean())
+    result["cos_min"] = float(cos.min())
+    return result
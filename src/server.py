@@ -0,0 +1,246 @@
+# -*- coding: utf-8 -*-
+"""
+Servicio local de inferencia (HTTP o socket Unix) con micro-batching dinámico.
+El modelo se carga una sola vez; las peticiones concurrentes se agrupan en lotes
+de hasta max_batch imágenes o max_wait_ms milisegundos de espera.
+
+Endpoints (JSON; las imágenes se envían en base64 con {"image_b64": ...}; con
+SERVER_PATH_ROOT o serve.py --path-root también como ruta dentro de ese directorio):
+- POST /embed     {"image": ...}                       -> {"embedding": [...]}
+- POST /verify    {"a": ..., "b": ..., "threshold": t} -> {"same_person": bool, "similarity": s}
+- POST /identify  {"image": ..., "k": 5}               -> {"candidates": [[identidad, s], ...]}
+- GET  /health, GET /stats
+- GET  /metrics (texto de Prometheus; requiere METRICS_ENABLED o serve.py --metrics)
+"""
+
+import base64
+import io
+import json
+import os
+import queue
+import socketserver
+import sys
+import threading
+import time
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import mindspore as ms
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import (
+    SERVER_HOST,
+    SERVER_PORT,
+    SERVER_MAX_BATCH,
+    SERVER_MAX_WAIT_MS,
+    SERVER_PATH_ROOT,
+    VERIFICATION_THRESHOLD,
+    IDENTIFY_TOP_K,
+    IMAGE_SIZE,
+)
+from src.inference import _preprocess_image
+from src.export import load_inference_model
+from src.metrics import METRICS, stage
+
+
+class MicroBatcher:
+    """
+    Agrupa tensores (3, H, W) enviados desde varios hilos y ejecuta el backbone
+    una vez por lote en un hilo dedicado. submit() devuelve un Future con el embedding.
+    """
+
+    def __init__(self, model, max_batch=None, max_wait_ms=None):
+        self.model = model
+        self.max_batch = max_batch or SERVER_MAX_BATCH
+        self.max_wait = (SERVER_MAX_WAIT_MS if max_wait_ms is None else max_wait_ms) / 1000.0
+        self._queue = queue.Queue()
+        self._stop = threading.Event()
+        self.batches = 0
+        self.items = 0
+        self._thread = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, tensor):
+        future = Future()
+        self._queue.put((tensor, future))
+        return future
+
+    def close(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _bucket(self, n):
+        """Tamaño de lote rellenado (potencia de 2) para limitar las formas distintas."""
+        size = 1
+        while size < n:
+            size *= 2
+        return min(size, self.max_batch)
+
+    def _run(self):
+        buffer = np.zeros((self.max_batch, 3, IMAGE_SIZE, IMAGE_SIZE), dtype=np.float32)
+        while not self._stop.is_set():
+            try:
+                first = self._queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            pending = [first]
+            deadline = time.perf_counter() + self.max_wait
+            while len(pending) < self.max_batch:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    pending.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            n = len(pending)
+            size = self._bucket(n)
+            for i, (tensor, _) in enumerate(pending):
+                buffer[i] = tensor
+            buffer[n:size] = 0.0
+            try:
+                with stage("forward", items=n):
+                    out = self.model.get_embedding(ms.Tensor(buffer[:size])).asnumpy()
+            except Exception as e:  # el error se propaga a cada petición del lote
+                for _, future in pending:
+                    future.set_exception(e)
+                continue
+            self.batches += 1
+            self.items += n
+            for i, (_, future) in enumerate(pending):
+                future.set_result(out[i].copy())
+
+
+class InferenceService:
+    """Lógica de los endpoints sobre un modelo y una galería cargados una vez."""
+
+    def __init__(self, model=None, gallery=None, cache=None, max_batch=None, max_wait_ms=None, path_root=None):
+        self.model = model or load_inference_model()
+        self.gallery = gallery
+        self.cache = cache
+        self.batcher = MicroBatcher(self.model, max_batch=max_batch, max_wait_ms=max_wait_ms)
+        path_root = path_root or SERVER_PATH_ROOT
+        self.path_root = os.path.realpath(path_root) if path_root else None
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def count_request(self):
+        with self._lock:
+            self.requests += 1
+
+    def _resolve(self, path):
+        """Ruta real de una imagen pedida por ruta; solo dentro de path_root."""
+        if self.path_root is None:
+            raise PermissionError("Imágenes por ruta deshabilitadas: envía image_b64 (o arranca con --path-root)")
+        real = os.path.realpath(os.path.join(self.path_root, path))
+        if os.path.commonpath([real, self.path_root]) != self.path_root:
+            raise PermissionError(f"Ruta fuera de {self.path_root}: {path}")
+        return real
+
+    def _tensor(self, image):
+        if isinstance(image, dict) and "image_b64" in image:
+            return _preprocess_image(io.BytesIO(base64.b64decode(image["image_b64"])))
+        path = image["path"] if isinstance(image, dict) else image
+        return _preprocess_image(self._resolve(path), self.cache)
+
+    def embed_many(self, images):
+        futures = [self.batcher.submit(self._tensor(img)) for img in images]
+        return [f.result() for f in futures]
+
+    def embed(self, body):
+        return {"embedding": self.embed_many([body["image"]])[0].tolist()}
+
+    def verify(self, body):
+        emb_a, emb_b = self.embed_many([body["a"], body["b"]])
+        threshold = body.get("threshold", VERIFICATION_THRESHOLD)
+        sim = float(np.dot(emb_a, emb_b) / (np.linalg.norm(emb_a) * np.linalg.norm(emb_b) + 1e-8))
+        return {"same_person": sim >= threshold, "similarity": sim}
+
+    def identify(self, body):
+        if self.gallery is None:
+            raise ValueError("El servicio se inició sin galería (python test.py --build-gallery)")
+        emb = self.embed_many([body["image"]])[0]
+        return {"candidates": self.gallery.identify(emb, k=body.get("k", IDENTIFY_TOP_K))}
+
+    def stats(self):
+        b = self.batcher
+        return {
+            "requests": self.requests,
+            "batches": b.batches,
+            "images": b.items,
+            "mean_batch": b.items / b.batches if b.batches else 0.0,
+            "gallery_size": len(self.gallery) if self.gallery is not None else 0,
+            "metrics": METRICS.snapshot() if METRICS.enabled else None,
+        }
+
+
+def make_handler(service):
+    """Crea la clase de handler HTTP ligada a un InferenceService."""
+    routes = {"/embed": service.embed, "/verify": service.verify, "/identify": service.identify}
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def _reply(self, code, payload, content_type="application/json"):
+            data = payload.encode() if isinstance(payload, str) else json.dumps(payload).encode()
+            self.send_response(code)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path == "/health":
+                self._reply(200, {"status": "ok"})
+            elif self.path == "/stats":
+                self._reply(200, service.stats())
+            elif self.path == "/metrics":
+                self._reply(200, METRICS.prometheus_text(), "text/plain; version=0.0.4")
+            else:
+                self._reply(404, {"error": f"ruta desconocida: {self.path}"})
+
+        def do_POST(self):
+            route = routes.get(self.path)
+            if route is None:
+                self._reply(404, {"error": f"ruta desconocida: {self.path}"})
+                return
+            try:
+                length = int(self.headers.get("Content-Length", 0))
+                body = json.loads(self.rfile.read(length) or b"{}")
+                service.count_request()
+                self._reply(200, route(body))
+            except PermissionError as e:
+                self._reply(403, {"error": str(e)})
+            except (KeyError, ValueError, OSError) as e:
+                self._reply(400, {"error": str(e)})
+            except Exception as e:
+                self._reply(500, {"error": str(e)})
+
+    return Handler
+
+
+class ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Servidor HTTP sobre socket Unix (un hilo por conexión)."""
+
+    daemon_threads = True
+
+    def get_request(self):
+        request, _ = super().get_request()
+        # BaseHTTPRequestHandler espera (host, puerto) como dirección de cliente
+        return request, ("unix", 0)
+
+
+def create_server(service, host=None, port=None, unix_socket=None):
+    """Crea el servidor (TCP o socket Unix) sin arrancarlo."""
+    handler = make_handler(service)
+    if unix_socket:
+        if os.path.exists(unix_socket):
+            os.remove(unix_socket)
+        return ThreadingUnixHTTPServer(unix_socket, handler)
+    server = ThreadingHTTPServer((host or SERVER_HOST, SERVER_PORT if port is None else port), handler)
+    server.daemon_threads = True
+    return server
@@ -0,0 +1,270 @@
+# -*- coding: utf-8 -*-
+"""
+Verificación 1:1 en streaming (vídeo, cámara o carpeta de fotogramas).
+- La imagen de referencia se procesa una sola vez.
+- Los fotogramas se decodifican en un hilo aparte y pasan por el backbone en lotes
+  de tamaño fijo (sin recompilar el grafo).
+- Salto de fotogramas: se procesa uno de cada stride; con target_fps el stride se
+  ajusta solo según la velocidad medida para seguir el ritmo de la fuente.
+- Con un detector de caras (FACE_DETECTOR) los puntos se detectan cada
+  detect_every fotogramas procesados y entre medias se reutilizan los últimos
+  (seguimiento simple: la cara apenas se mueve entre fotogramas cercanos).
+- Suavizado temporal (media exponencial) de la similitud y agregación final.
+"""
+
+import os
+import queue
+import shutil
+import subprocess
+import sys
+import threading
+import time
+
+import mindspore as ms
+import numpy as np
+from PIL import Image, ImageSequence
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import (
+    IMAGE_SIZE,
+    VERIFICATION_THRESHOLD,
+    STREAM_BATCH_SIZE,
+    STREAM_FRAME_STRIDE,
+    STREAM_TARGET_FPS,
+    STREAM_MAX_STRIDE,
+    STREAM_SMOOTHING,
+    STREAM_DETECT_EVERY,
+)
+from src.alignment import FaceAligner, get_aligner
+from src.dataset import IMAGE_EXTENSIONS
+from src.inference import _normalize, get_embedding
+
+VIDEO_EXTENSIONS = [".mp4", ".avi", ".mov", ".mkv", ".webm", ".m4v"]
+
+
+class FrameSource:
+    """
+    Fotogramas RGB uint8 de una carpeta de imágenes (orden alfabético), de un
+    fichero multi-imagen de PIL (GIF, WebP/PNG animado, TIFF) o de un vídeo
+    (requiere ffmpeg en el PATH). stride se puede cambiar durante la iteración;
+    los fotogramas saltados de una carpeta no llegan a decodificarse.
+    """
+
+    def __init__(self, source, stride=None):
+        self.source = source
+        self.stride = max(1, stride or STREAM_FRAME_STRIDE)
+        self.frames_seen = 0
+
+    def __iter__(self):
+        if os.path.isdir(self.source):
+            frames = self._iter_directory()
+        elif os.path.splitext(self.source)[1].lower() in VIDEO_EXTENSIONS:
+            frames = self._iter_video()
+        else:
+            frames = self._iter_sequence()
+        next_index = 0
+        for index, frame in frames:
+            self.frames_seen = index + 1
+            if index >= next_index:
+                next_index = index + self.stride
+                yield index, frame() if callable(frame) else frame
+
+    def _iter_directory(self):
+        files = sorted(
+            f for f in os.listdir(self.source) if os.path.splitext(f)[1].lower() in IMAGE_EXTENSIONS
+        )
+        for index, name in enumerate(files):
+            path = os.path.join(self.source, name)
+            # Decodificación diferida: solo si el fotograma no se salta
+            yield index, lambda path=path: np.asarray(Image.open(path).convert("RGB"))
+
+    def _iter_sequence(self):
+        with Image.open(self.source) as image:
+            for index, frame in enumerate(ImageSequence.Iterator(image)):
+                yield index, np.asarray(frame.convert("RGB"))
+
+    def _iter_video(self):
+        if shutil.which("ffmpeg") is None or shutil.which("ffprobe") is None:
+            raise RuntimeError(
+                "Para leer vídeo hace falta ffmpeg en el PATH; alternativa: extraer los fotogramas a una carpeta"
+            )
+        probe = subprocess.run(
+            ["ffprobe", "-v", "error", "-select_streams", "v:0", "-show_entries", "stream=width,height",
+             "-of", "csv=p=0", self.source],
+            capture_output=True, text=True, check=True,
+        )
+        width, height = (int(v) for v in probe.stdout.strip().split(",")[:2])
+        frame_bytes = width * height * 3
+        proc = subprocess.Popen(
+            ["ffmpeg", "-v", "error", "-i", self.source, "-f", "rawvideo", "-pix_fmt", "rgb24", "-"],
+            stdout=subprocess.PIPE,
+        )
+        try:
+            index = 0
+            while True:
+                raw = proc.stdout.read(frame_bytes)
+                if len(raw) < frame_bytes:
+                    break
+                yield index, np.frombuffer(raw, dtype=np.uint8).reshape(height, width, 3)
+                index += 1
+        finally:
+            proc.kill()
+            proc.wait()
+
+
+class TrackingDetector:
+    """
+    Envuelve un detector: solo detecta en uno de cada detect_every fotogramas y en
+    el resto reutiliza los últimos puntos encontrados. Todas las detecciones de un
+    lote se hacen en una llamada.
+    """
+
+    def __init__(self, detector, detect_every=None):
+        self.detector = detector
+        self.name = detector.name
+        self.detect_every = max(1, detect_every or STREAM_DETECT_EVERY)
+        self.frames = 0
+        self.last = None
+        self.detections = 0
+
+    def signature(self):
+        return self.detector.signature()
+
+    def detect(self, images, paths=None):
+        due = [i for i in range(len(images)) if (self.frames + i) % self.detect_every == 0]
+        found = dict(zip(due, self.detector.detect([images[i] for i in due]))) if due else {}
+        self.detections += len(due)
+        self.frames += len(images)
+        result = []
+        for i in range(len(images)):
+            if i in found:
+                self.last = found[i]  # None si se ha perdido la cara
+            result.append(self.last)
+        return result
+
+
+def _frame_batch(frames, aligner, out):
+    """Preprocesa fotogramas uint8 HWC en out (B, 3, H, W) float32; devuelve la máscara de cara encontrada."""
+    if aligner is not None:
+        faces = aligner.align(frames)
+        found = aligner.last_found
+    else:
+        faces = np.stack([
+            np.asarray(Image.fromarray(f).resize((IMAGE_SIZE, IMAGE_SIZE), Image.BILINEAR)) for f in frames
+        ])
+        found = np.ones(len(frames), dtype=bool)
+    for i, face in enumerate(faces):
+        _normalize(face, out=out[i])
+    return found
+
+
+class StreamVerifier:
+    """
+    Compara cada fotograma procesado con una referencia (embedding calculado una
+    vez). run() devuelve (registros por fotograma, resumen).
+    """
+
+    def __init__(self, model, reference_path, threshold=None, batch_size=None, stride=None, target_fps=None,
+                 smoothing=None, detect_every=None, cache=None):
+        self.model = model
+        self.threshold = VERIFICATION_THRESHOLD if threshold is None else threshold
+        self.batch_size = batch_size or STREAM_BATCH_SIZE
+        self.stride = max(1, stride or STREAM_FRAME_STRIDE)
+        self.target_fps = STREAM_TARGET_FPS if target_fps is None else target_fps
+        self.smoothing = STREAM_SMOOTHING if smoothing is None else smoothing
+        reference = get_embedding(model, reference_path, cache=cache)
+        self.reference = reference / (np.linalg.norm(reference) + 1e-8)
+        base = get_aligner()
+        self.aligner = None
+        if base is not None:
+            self.aligner = FaceAligner(TrackingDetector(base.detector, detect_every), size=base.size)
+
+    def _frames(self, source):
+        """Decodifica en un hilo aparte (cola acotada) para solaparlo con el backbone."""
+        frames = queue.Queue(maxsize=2 * self.batch_size)
+        errors = []
+
+        def produce():
+            try:
+                for item in source:
+                    frames.put(item)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                frames.put(None)
+
+        threading.Thread(target=produce, name="stream-decoder", daemon=True).start()
+        while True:
+            item = frames.get()
+            if item is None:
+                break
+            yield item
+        if errors:
+            raise errors[0]
+
+    def _adapt_stride(self, source, frames_per_second):
+        """Stride mínimo con el que frames_per_second procesados cubren target_fps de la fuente."""
+        if self.target_fps and frames_per_second > 0:
+            source.stride = int(min(STREAM_MAX_STRIDE, max(self.stride, np.ceil(self.target_fps / frames_per_second))))
+
+    def run(self, source, callback=None):
+        """
+        source: ruta (carpeta, vídeo o GIF) o FrameSource. callback(registro) se
+        llama por fotograma procesado. Registro: (índice, similitud, similitud
+        suavizada, misma persona); similitud None si no se detectó cara.
+        """
+        if not isinstance(source, FrameSource):
+            source = FrameSource(source, self.stride)
+        buffer = np.zeros((self.batch_size, 3, IMAGE_SIZE, IMAGE_SIZE), dtype=np.float32)
+        records = []
+        smoothed = None
+        processed = 0
+        t0 = time.perf_counter()
+
+        def flush(batch):
+            nonlocal smoothed, processed
+            found = _frame_batch([frame for _, frame in batch], self.aligner, buffer)
+            buffer[len(batch):] = 0.0
+            emb = self.model.get_embedding(ms.Tensor(buffer)).asnumpy()[:len(batch)]
+            scores = emb @ self.reference / (np.linalg.norm(emb, axis=1) + 1e-8)
+            processed += len(batch)
+            for (index, _), score, ok in zip(batch, scores, found):
+                score = float(score) if ok else None
+                if score is not None:
+                    smoothed = score if smoothed is None else self.smoothing * score + (1 - self.smoothing) * smoothed
+                record = (index, score, smoothed, smoothed is not None and smoothed >= self.threshold)
+                records.append(record)
+                if callback is not None:
+                    callback(record)
+            self._adapt_stride(source, processed / (time.perf_counter() - t0))
+
+        batch = []
+        for item in self._frames(source):
+            batch.append(item)
+            if len(batch) == self.batch_size:
+                flush(batch)
+                batch = []
+        if batch:
+            flush(batch)
+        elapsed = time.perf_counter() - t0
+        return records, self._summary(records, source.frames_seen, processed, elapsed, source.stride)
+
+    def _summary(self, records, frames, processed, elapsed, stride):
+        scores = np.array([r[1] for r in records if r[1] is not None], dtype=np.float64)
+        # Agregado: media de la similitud de los fotogramas con cara (robusta a picos aislados)
+        aggregate = float(scores.mean()) if len(scores) else None
+        detector = self.aligner.detector if self.aligner is not None else None
+        return {
+            "frames": frames,
+            "processed": processed,
+            "with_face": len(scores),
+            "fps": frames / elapsed if elapsed > 0 else 0.0,
+            "processed_fps": processed / elapsed if elapsed > 0 else 0.0,
+            "final_stride": stride,
+            "detections": detector.detections if detector is not None else 0,
+            "mean_similarity": aggregate,
+            "max_similarity": float(scores.max()) if len(scores) else None,
+            "match_ratio": float((scores >= self.threshold).mean()) if len(scores) else 0.0,
+            "final_smoothed": records[-1][2] if records else None,
+            "same_person": aggregate is not None and aggregate >= self.threshold,
+        }
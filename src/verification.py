@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark de verificación a gran escala: puntuaciones de todos los pares
+(genuinos e impostores) a partir de embeddings, con memoria acotada.
+Los pares se recorren en bloques (B x B productos matriciales) y solo se guardan
+histogramas de similitud, de los que salen la curva ROC, el EER y TAR@FAR.
+"""
+
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import ROC_BLOCK_SIZE, ROC_BINS
+
+
+def pair_score_histograms(embeddings, labels, block_size=None, bins=None):
+    """
+    Histogramas de similitud coseno de pares genuinos e impostores (i < j).
+    Devuelve (genuinos, impostores, bordes) con `bins` intervalos en [-1, 1].
+    Memoria: O(block_size^2) además de los embeddings.
+    """
+    block_size = block_size or ROC_BLOCK_SIZE
+    bins = bins or ROC_BINS
+    emb = np.asarray(embeddings, dtype=np.float32)
+    emb = emb / (np.linalg.norm(emb, axis=1, keepdims=True) + 1e-8)
+    labels = np.asarray(labels)
+    n = emb.shape[0]
+    genuine = np.zeros(bins, dtype=np.int64)
+    impostor = np.zeros(bins, dtype=np.int64)
+    for i in range(0, n, block_size):
+        a, la = emb[i:i + block_size], labels[i:i + block_size]
+        for j in range(i, n, block_size):
+            b, lb = emb[j:j + block_size], labels[j:j + block_size]
+            sims = a @ b.T
+            idx = np.clip(((sims + 1.0) * (bins / 2.0)).astype(np.int64), 0, bins - 1)
+            same = la[:, None] == lb[None, :]
+            if i == j:
+                # Bloque diagonal: solo pares i < j
+                upper = np.triu(np.ones(sims.shape, dtype=bool), k=1)
+                genuine += np.bincount(idx[same & upper], minlength=bins)
+                impostor += np.bincount(idx[~same & upper], minlength=bins)
+            else:
+                genuine += np.bincount(idx[same], minlength=bins)
+                impostor += np.bincount(idx[~same], minlength=bins)
+    edges = np.linspace(-1.0, 1.0, bins + 1)
+    return genuine, impostor, edges
+
+
+def roc_from_histograms(genuine, impostor, edges):
+    """
+    Curva ROC para los umbrales edges[:-1] (se acepta si similitud >= umbral).
+    Devuelve (umbrales, FAR, TAR).
+    """
+    # Pares con similitud >= umbral: suma acumulada desde el final
+    tar = np.cumsum(genuine[::-1])[::-1] / max(genuine.sum(), 1)
+    far = np.cumsum(impostor[::-1])[::-1] / max(impostor.sum(), 1)
+    return edges[:-1], far, tar
+
+
+def tar_at_far(thresholds, far, tar, target):
+    """TAR y umbral en el menor umbral con FAR <= target."""
+    ok = np.flatnonzero(far <= target)
+    if ok.size == 0:
+        return 0.0, float(thresholds[-1])
+    i = ok[0]
+    return float(tar[i]), float(thresholds[i])
+
+
+def equal_error_rate(thresholds, far, tar):
+    """EER (punto en que FAR = FRR) y su umbral."""
+    frr = 1.0 - tar
+    i = int(np.argmin(np.abs(far - frr)))
+    return float((far[i] + frr[i]) / 2.0), float(thresholds[i])
+
+
+def verification_report(embeddings, labels, far_targets=(1e-3, 1e-4), block_size=None, bins=None):
+    """Métricas de verificación de todos los pares: EER, TAR@FAR y curva ROC."""
+    genuine, impostor, edges = pair_score_histograms(embeddings, labels, block_size, bins)
+    thresholds, far, tar = roc_from_histograms(genuine, impostor, edges)
+    eer, eer_threshold = equal_error_rate(thresholds, far, tar)
+    report = {
+        "genuine_pairs": int(genuine.sum()),
+        "impostor_pairs": int(impostor.sum()),
+        "eer": eer,
+        "eer_threshold": eer_threshold,
+        "roc": (thresholds, far, tar),
+    }
+    for target in far_targets:
+        report[f"tar@far={target:g}"] = tar_at_far(thresholds, far, tar, target)
+    return report
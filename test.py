@@ -3,88 +3,282 @@
 Pruebas locales del modelo de biometría facial.
 - Evaluación en validación (accuracy por identidad).
 - Verificación 1:1 con pares de imágenes (opcional).
+- Verificación en streaming de vídeo o fotogramas contra una referencia (opcional).
+- Identificación 1:N contra la galería de identidades enroladas (opcional).
 """
 
 import argparse
 import os
 import sys
 
-import mindspore as ms
 import numpy as np
 
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
-from config import CHECKPOINT_DIR, VAL_DIR, VERIFICATION_THRESHOLD
-from src.dataset import create_val_dataset, get_num_classes_from_dir
-from src.inference import load_embedding_model, verify_pair
+from config import (
+    VAL_DIR,
+    RESULTS_DIR,
+    VERIFICATION_THRESHOLD,
+    IDENTIFY_TOP_K,
+    GALLERY_DIR,
+    CACHE_ENABLED,
+    DECODE_WORKERS,
+    VERIFICATION_TARGET_FAR,
+)
+from src.dataset import get_num_classes_from_dir
+from src.inference import load_embedding_model, verify_pair, get_embedding
+from src.export import load_inference_model
+from src.metrics import METRICS
 
 
-def eval_validation():
-    """Evalúa el modelo en el dataset de validación (clasificación)."""
-    from src.model import FaceBiometricsNet
-    from config import EMBEDDING_DIM
+def _make_cache(use_cache=None):
+    """FaceCache si la caché está activada (config o argumento), si no None."""
+    from src.cache import FaceCache
+
+    use_cache = CACHE_ENABLED if use_cache is None else use_cache
+    return FaceCache() if use_cache else None
+
+
+def _report_metrics():
+    """Tiempo por etapa de la ejecución (--profile); guarda el detalle en results/."""
     import json
 
+    print("\nTiempo por etapa:")
+    print(METRICS.summary_table())
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    path = os.path.join(RESULTS_DIR, "metrics.json")
+    with open(path, "w") as f:
+        json.dump(METRICS.snapshot(), f, indent=1)
+    print(f"Métricas: {path} | desglose por llamada: {METRICS.profile_file}")
+
+
+def eval_validation(cache=None, batch_size=None, workers=None, top_k=None):
+    """
+    Evalúa el modelo en el dataset de validación (clasificación).
+    Evaluación por lotes y en streaming (src/evaluation.py): accuracy, top-k y
+    matriz de confusión por identidad (guardada en results/).
+    """
+    from src.evaluation import evaluate
+
     if not os.path.isdir(VAL_DIR):
         print(f"No existe directorio de validación: {VAL_DIR}. Omisión de eval.")
         return
 
-    config_path = os.path.join(CHECKPOINT_DIR, "model_config.json")
-    if not os.path.isfile(config_path):
-        print("No hay modelo entrenado. Ejecuta primero: python train.py")
+    try:
+        net = load_embedding_model()
+    except FileNotFoundError as e:
+        print(f"No hay modelo entrenado ({e}). Ejecuta primero: python train.py")
         return
-
-    with open(config_path) as f:
-        config = json.load(f)
-    num_classes = config["num_classes"]
+    num_classes = net.classifier.out_channels
     val_num = get_num_classes_from_dir(VAL_DIR)
     if val_num != num_classes:
         print(f"Aviso: validación tiene {val_num} clases, modelo {num_classes}. Usando num_classes del modelo.")
 
-    val_ds = create_val_dataset(batch_size=1)
-    net = FaceBiometricsNet(embedding_dim=EMBEDDING_DIM, num_classes=num_classes)
-    ckpts = [f for f in os.listdir(CHECKPOINT_DIR) if f.endswith(".ckpt") and "face_biometrics" in f]
-    if not ckpts:
-        print("No se encontró checkpoint.")
-        return
-    ms.load_param_into_net(net, ms.load_checkpoint(os.path.join(CHECKPOINT_DIR, sorted(ckpts)[-1])))
-    net.set_train(False)
+    workers = DECODE_WORKERS if workers is None else workers
+    ks = sorted({1, top_k or 5})
+    metrics, _, class_names = evaluate(net, VAL_DIR, batch_size=batch_size, workers=workers, cache=cache, top_k=ks)
+    if metrics["unknown"]:
+        print(f"Aviso: {metrics['unknown']} imágenes de identidades que el modelo no conoce (excluidas).")
+    print(f"Validación: {metrics['correct']}/{metrics['total']} correctos, accuracy = {metrics['accuracy']:.4f}")
+    print(" | ".join(f"top-{k}: {metrics[f'top{k}']:.4f}" for k in ks))
+
+    per_identity = metrics["per_identity"]
+    worst = [i for i in np.argsort(per_identity) if not np.isnan(per_identity[i])][:10]
+    if worst:
+        print("Identidades con menor accuracy:")
+        for i in worst:
+            print(f"  {class_names[i]:<30} {per_identity[i]:.4f} ({int(metrics['confusion'][i].sum())} imágenes)")
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    path = os.path.join(RESULTS_DIR, "confusion_matrix.csv")
+    with open(path, "w") as f:
+        f.write("real/predicha," + ",".join(class_names) + "\n")
+        for name, row in zip(class_names, metrics["confusion"]):
+            f.write(name + "," + ",".join(str(int(v)) for v in row) + "\n")
+    print(f"Matriz de confusión: {path}")
+    return metrics
+
+
+def run_roc_benchmark(data_dir=None, cache=None, batch_size=None, workers=None, block_size=None):
+    """
+    Verificación de todos los pares del árbol de validación: ROC, EER, TAR@FAR
+    y umbral recomendado. Los embeddings se calculan una vez (y se cachean).
+    """
+    from src.dataset import list_image_files
+    from src.inference import get_embeddings
+    from src.verification import verification_report
+
+    data_dir = data_dir or VAL_DIR
+    paths, labels, identities = list_image_files(data_dir)
+    if len(paths) < 2:
+        print(f"Se necesitan al menos 2 imágenes en {data_dir}.")
+        return None
+    model = load_inference_model()
+    workers = DECODE_WORKERS if workers is None else workers
+    embeddings = get_embeddings(model, paths, batch_size=batch_size, cache=cache, workers=workers)
+    targets = sorted({1e-3, 1e-4, VERIFICATION_TARGET_FAR}, reverse=True)
+    report = verification_report(embeddings, labels, far_targets=targets, block_size=block_size)
+
+    print(f"Imágenes: {len(paths)} | identidades: {len(identities)}")
+    print(f"Pares genuinos: {report['genuine_pairs']} | impostores: {report['impostor_pairs']}")
+    print(f"EER: {report['eer']:.4f} (umbral {report['eer_threshold']:.4f})")
+    for target in targets:
+        tar, thr = report[f"tar@far={target:g}"]
+        print(f"TAR@FAR={target:g}: {tar:.4f} (umbral {thr:.4f})")
+    recommended = report[f"tar@far={VERIFICATION_TARGET_FAR:g}"][1]
+    print(f"Umbral recomendado (FAR={VERIFICATION_TARGET_FAR:g}): {recommended:.4f} "
+          f"| actual VERIFICATION_THRESHOLD = {VERIFICATION_THRESHOLD}")
 
-    correct, total = 0, 0
-    for batch in val_ds.create_dict_iterator():
-        logits = net(batch["image"])
-        pred = np.argmax(logits.asnumpy(), axis=1)
-        label = batch["label"].asnumpy().flatten()
-        correct += (pred == label).sum()
-        total += label.size
-    acc = correct / total if total else 0
-    print(f"Validación: {correct}/{total} correctos, accuracy = {acc:.4f}")
+    thresholds, far, tar = report["roc"]
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    path = os.path.join(RESULTS_DIR, "roc.csv")
+    keep = np.flatnonzero(np.diff(far, prepend=-1.0) != 0)
+    np.savetxt(path, np.stack([thresholds[keep], far[keep], tar[keep]], axis=1),
+               delimiter=",", header="umbral,far,tar", comments="", fmt="%.6g")
+    print(f"Curva ROC: {path}")
+    return report
 
 
-def run_verification(pair1, pair2, threshold=None):
+def run_verification(pair1, pair2, threshold=None, cache=None):
     """Verificación 1:1 entre dos imágenes."""
     threshold = threshold or VERIFICATION_THRESHOLD
-    model = load_embedding_model()
-    misma, sim = verify_pair(model, pair1, pair2, threshold=threshold)
+    model = load_inference_model()
+    misma, sim = verify_pair(model, pair1, pair2, threshold=threshold, cache=cache)
     print(f"Similitud: {sim:.4f} | Misma persona: {misma}")
     return misma, sim
 
 
+def run_stream(reference, source, threshold=None, cache=None, batch_size=None, stride=None, target_fps=None):
+    """
+    Verificación en streaming de los fotogramas de source (vídeo, GIF o carpeta)
+    contra la imagen reference. Guarda la similitud por fotograma en results/.
+    """
+    from src.stream import StreamVerifier
+
+    model = load_inference_model()
+    verifier = StreamVerifier(
+        model, reference, threshold=threshold, batch_size=batch_size, stride=stride, target_fps=target_fps,
+        cache=cache,
+    )
+    records, summary = verifier.run(source)
+    print(f"Fotogramas: {summary['frames']} | procesados: {summary['processed']} "
+          f"(con cara: {summary['with_face']}) | stride final: {summary['final_stride']}")
+    print(f"Velocidad: {summary['fps']:.1f} fotogramas/s de la fuente "
+          f"({summary['processed_fps']:.1f} procesados/s)")
+    if summary["mean_similarity"] is None:
+        print("No se detectó ninguna cara.")
+    else:
+        print(f"Similitud media: {summary['mean_similarity']:.4f} | máxima: {summary['max_similarity']:.4f} "
+              f"| suavizada final: {summary['final_smoothed']:.4f} | fotogramas por encima del umbral: "
+              f"{summary['match_ratio']:.0%}")
+        print(f"Misma persona: {summary['same_person']}")
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    path = os.path.join(RESULTS_DIR, "stream_scores.csv")
+    with open(path, "w") as f:
+        f.write("fotograma,similitud,suavizada,misma_persona\n")
+        for index, score, smoothed, match in records:
+            f.write(f"{index},{'' if score is None else f'{score:.6f}'},"
+                    f"{'' if smoothed is None else f'{smoothed:.6f}'},{int(match)}\n")
+    print(f"Similitud por fotograma: {path}")
+    return summary
+
+
+def run_build_gallery(data_dir=None, ann=False, cache=None, shards=None):
+    """
+    Enrola data/train (o data_dir) y guarda la galería en disco (opcional: índice
+    IVF-PQ y reparto en shards buscados por procesos separados). Devuelve la
+    galería en memoria (sin arrancar los procesos de los shards).
+    """
+    from src.gallery import build_gallery
+    from src.gallery_shards import save_gallery
+
+    model = load_inference_model()
+    gallery = build_gallery(model, data_dir, cache=cache)
+    save_gallery(gallery, shards=shards, ann=ann)
+    print(f"Galería: {len(gallery)} imágenes, {len(gallery.identities)} identidades -> {GALLERY_DIR}")
+    return gallery
+
+
+def run_identification(image_path, top_k=None, threshold=None, cache=None):
+    """Identificación 1:N de una imagen contra la galería guardada."""
+    from src.gallery_shards import load_gallery
+
+    top_k = top_k or IDENTIFY_TOP_K
+    threshold = threshold or VERIFICATION_THRESHOLD
+    model = load_inference_model()
+    try:
+        gallery = load_gallery()
+    except FileNotFoundError:
+        print("No hay galería guardada; enrolando data/train...")
+        run_build_gallery(cache=cache)
+        gallery = load_gallery()
+    try:
+        results = gallery.identify(get_embedding(model, image_path, cache=cache), k=top_k)
+    finally:
+        # Una galería con shards tiene procesos de búsqueda propios
+        if hasattr(gallery, "close"):
+            gallery.close()
+    for rank, (identity, sim) in enumerate(results, 1):
+        print(f"{rank}. {identity:<30} similitud: {sim:.4f}")
+    if results and results[0][1] >= threshold:
+        print(f"Identidad: {results[0][0]}")
+    else:
+        print("Identidad: desconocida (ningún candidato supera el umbral)")
+    return results
+
+
 def main():
     parser = argparse.ArgumentParser(description="Pruebas del modelo de biometría facial")
     parser.add_argument("--eval", action="store_true", help="Evaluar en dataset de validación")
     parser.add_argument("--verify", nargs=2, metavar=("IMG1", "IMG2"), help="Verificar par de imágenes")
+    parser.add_argument("--roc", action="store_true", help="ROC/EER/TAR@FAR de todos los pares de validación")
+    parser.add_argument("--stream", nargs=2, metavar=("REF", "FUENTE"),
+                        help="Verificar en streaming los fotogramas de FUENTE (vídeo, GIF o carpeta) contra REF")
+    parser.add_argument("--stride", type=int, default=None, help="Con --stream: procesar uno de cada N fotogramas")
+    parser.add_argument("--target-fps", type=float, default=None,
+                        help="Con --stream: ajustar el salto para seguir N fotogramas/s (0 = salto fijo)")
+    parser.add_argument("--identify", metavar="IMG", help="Identificar una imagen contra la galería (1:N)")
+    parser.add_argument("--build-gallery", action="store_true", help="Enrolar data/train en la galería")
+    parser.add_argument("--ann", action="store_true", help="Con --build-gallery: construir índice aproximado IVF-PQ")
+    parser.add_argument("--shards", type=int, default=None,
+                        help="Con --build-gallery: repartir la galería en N shards (default: GALLERY_SHARDS)")
+    parser.add_argument("--top-k", type=int, default=None, help="Candidatos en --identify / top-k en --eval")
+    parser.add_argument("--batch-size", type=int, default=None, help="Tamaño de lote de inferencia (default: config)")
+    parser.add_argument("--workers", type=int, default=None, help="Hilos de decodificación (default: config)")
     parser.add_argument("--threshold", type=float, default=None, help="Umbral de verificación (default: config)")
+    parser.add_argument("--no-cache", action="store_true", help="No usar la caché de imágenes/embeddings")
+    parser.add_argument("--profile", action="store_true",
+                        help="Medir cada etapa (decodificación, forward...) y guardar el desglose por llamada")
     args = parser.parse_args()
+    if args.profile:
+        METRICS.enable(profile=True)
+    cache = _make_cache(False if args.no_cache else None)
 
     if args.eval:
-        eval_validation()
+        eval_validation(cache=cache, batch_size=args.batch_size, workers=args.workers, top_k=args.top_k)
+    elif args.roc:
+        run_roc_benchmark(cache=cache, batch_size=args.batch_size, workers=args.workers)
     elif args.verify:
-        run_verification(args.verify[0], args.verify[1], threshold=args.threshold)
+        run_verification(args.verify[0], args.verify[1], threshold=args.threshold, cache=cache)
+    elif args.stream:
+        run_stream(
+            args.stream[0], args.stream[1], threshold=args.threshold, cache=cache, batch_size=args.batch_size,
+            stride=args.stride, target_fps=args.target_fps,
+        )
+    elif args.build_gallery:
+        run_build_gallery(ann=args.ann, cache=cache, shards=args.shards)
+    elif args.identify:
+        run_identification(args.identify, top_k=args.top_k, threshold=args.threshold, cache=cache)
     else:
         parser.print_help()
         print("\nEjemplos:")
         print("  python test.py --eval")
         print("  python test.py --verify foto1.jpg foto2.jpg")
+        print("  python test.py --roc")
+        print("  python test.py --stream referencia.jpg fotogramas/")
+        print("  python test.py --build-gallery")
+        print("  python test.py --identify foto.jpg")
+        return
+    if METRICS.enabled:
+        _report_metrics()
 
 
 if __name__ == "__main__":
@@ -2,16 +2,26 @@
 """
 Entrenamiento local del modelo de biometría facial con MindSpore.
 Todo se ejecuta en tu máquina (CPU o GPU).
+
+Modo distribuido (paralelismo de datos en varios procesos, p. ej. en CPU):
+    python scripts/train_distributed.py --nproc 4
+    (equivale a: msrun --worker_num=4 --local_worker_num=4 train.py --distributed)
+
+Destilación (alumno ligero que imita los embeddings del modelo entrenado):
+    python train.py --backbone mobilefacenet --distill
 """
 
+import argparse
 import json
 import os
 import sys
+import time
 
 import mindspore as ms
 from mindspore import nn
+from mindspore.amp import DynamicLossScaleManager, FixedLossScaleManager
 from mindspore.train import Model, LossMonitor, TimeMonitor
-from mindspore.train.callback import CheckpointConfig, ModelCheckpoint
+from mindspore.train.callback import Callback
 
 # Añadir raíz del proyecto
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
@@ -25,62 +35,235 @@ from config import (
     LEARNING_RATE,
     EMBEDDING_DIM,
     SEED,
+    USE_SHARDS,
+    SHARDS_TRAIN_DIR,
+    DATASET_WORKERS,
+    AMP_LEVEL,
+    LOSS_SCALE,
+    LOSS_SCALE_VALUE,
+    DATASET_SINK_MODE,
+    SINK_SIZE,
+    BALANCED_SAMPLER,
+    HEAD,
+    MARGIN_SCALE,
+    BACKBONE,
+    DISTILL_TEACHER_DIR,
+    DISTILL_CHECKPOINT_DIR,
+    DISTILL_WEIGHT,
 )
-from src.dataset import create_train_dataset, create_val_dataset, get_num_classes_from_dir
-from src.model import FaceBiometricsNet
+from src.dataset import configure_pipeline, create_train_dataset, create_val_dataset, get_num_classes_from_dir
+from src.model import BACKBONES, FaceBiometricsNet, fold_batchnorm
+from src.checkpoints import CheckpointManager, resume_training
+from src.losses import DistillTrainCell, MarginSoftmaxLoss, MarginTrainCell
+
+
+class ThroughputMonitor(Callback):
+    """
+    Muestras/s y tiempo por paso (todos los procesos), sin contar la primera
+    llamada (compilación). En sink mode cada llamada cubre sink_size pasos.
+    """
+
+    def __init__(self, global_batch_size):
+        super().__init__()
+        self.global_batch_size = global_batch_size
+        self._t0 = None
+        self._step0 = 0
+        self._steps = 0
+
+    def on_train_step_end(self, run_context):
+        step = run_context.original_args().cur_step_num
+        if self._t0 is None:
+            self._t0, self._step0 = time.perf_counter(), step
+        self._steps = step - self._step0
+
+    def on_train_end(self, run_context):
+        if self._steps:
+            elapsed = time.perf_counter() - self._t0
+            rate = self._steps * self.global_batch_size / elapsed
+            print(f"Rendimiento: {rate:.1f} muestras/s ({1000 * elapsed / self._steps:.1f} ms/paso)")
+
+
+def make_loss_scale_manager(amp_level, loss_scale=None, device_target="CPU"):
+    """Escalado de pérdida para O2/O3 (None en O0). En CPU solo se admite escala fija."""
+    if amp_level == "O0" or not loss_scale:
+        return None
+    if loss_scale == "dynamic" and device_target != "CPU":
+        return DynamicLossScaleManager(init_loss_scale=LOSS_SCALE_VALUE)
+    return FixedLossScaleManager(LOSS_SCALE_VALUE, drop_overflow_update=False)
+
+
+def load_teacher(teacher_dir, embedding_dim):
+    """Backbone del profesor con BatchNorm plegado (congelado) para destilación."""
+    from src.inference import load_embedding_model
+
+    teacher = load_embedding_model(teacher_dir, fuse_bn=False).backbone
+    if teacher.embedding_dim != embedding_dim:
+        raise ValueError(
+            f"El profesor de {teacher_dir} tiene embeddings de {teacher.embedding_dim} dimensiones, "
+            f"el alumno {embedding_dim} (EMBEDDING_DIM)"
+        )
+    return fold_batchnorm(teacher)
+
+
+def init_distributed():
+    """
+    Inicializa la comunicación entre procesos (lanzados con msrun) y el modo de
+    paralelismo de datos: los gradientes se promedian entre procesos en cada paso.
+    Devuelve (rank, número de procesos).
+    """
+    from mindspore.communication import init, get_rank, get_group_size
+
+    init()
+    rank, group_size = get_rank(), get_group_size()
+    ms.set_auto_parallel_context(
+        parallel_mode=ms.ParallelMode.DATA_PARALLEL,
+        gradients_mean=True,
+        device_num=group_size,
+    )
+    return rank, group_size
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Entrenamiento del modelo de biometría facial")
+    parser.add_argument("--distributed", action="store_true", help="Paralelismo de datos (lanzar con msrun)")
+    parser.add_argument("--epochs", type=int, default=EPOCHS)
+    parser.add_argument("--checkpoint-dir", default=None,
+                        help="Destino de los checkpoints (default: CHECKPOINT_DIR, o DISTILL_CHECKPOINT_DIR con --distill)")
+    parser.add_argument("--head", default=HEAD, choices=["softmax", "arcface", "cosface"], help="Cabeza y pérdida")
+    parser.add_argument("--backbone", default=BACKBONE, choices=list(BACKBONES), help="Backbone de embeddings")
+    parser.add_argument("--distill", action="store_true",
+                        help="Destilar los embeddings del modelo de --teacher-dir en el backbone elegido")
+    parser.add_argument("--teacher-dir", default=DISTILL_TEACHER_DIR, help="Checkpoints del profesor")
+    parser.add_argument("--distill-weight", type=float, default=DISTILL_WEIGHT,
+                        help="Peso de la pérdida de destilación (1 - coseno)")
+    parser.add_argument("--balanced", action=argparse.BooleanOptionalAction, default=BALANCED_SAMPLER,
+                        help="Lotes P×K equilibrados por identidad")
+    parser.add_argument("--resume", action="store_true", help="Reanudar desde el último checkpoint (con optimizador)")
+    parser.add_argument("--amp-level", default=AMP_LEVEL, choices=["O0", "O2", "O3"], help="Precisión mixta")
+    parser.add_argument("--loss-scale", default=LOSS_SCALE, choices=["dynamic", "fixed"])
+    parser.add_argument("--sink", action=argparse.BooleanOptionalAction, default=DATASET_SINK_MODE,
+                        help="Dataset sink mode")
+    parser.add_argument("--sink-size", type=int, default=SINK_SIZE, help="Pasos por envío en sink mode (-1 = época)")
+    args = parser.parse_args()
+
+    # Misma semilla en todos los procesos: los pesos iniciales coinciden
     ms.set_seed(SEED)
     # Contexto: CPU o GPU según disponibilidad
     ms.set_context(mode=ms.GRAPH_MODE, device_target="CPU")  # Cambiar a "GPU" si tienes CUDA
+    rank, group_size = init_distributed() if args.distributed else (0, 1)
+    is_main = rank == 0
+    checkpoint_dir = args.checkpoint_dir or (DISTILL_CHECKPOINT_DIR if args.distill else CHECKPOINT_DIR)
+    if args.distill and os.path.abspath(checkpoint_dir) == os.path.abspath(args.teacher_dir):
+        raise ValueError("Con --distill los checkpoints del alumno no pueden ir al directorio del profesor")
 
-    num_classes = get_num_classes_from_dir(TRAIN_DIR)
+    num_classes = get_num_classes_from_dir(SHARDS_TRAIN_DIR if USE_SHARDS else TRAIN_DIR)
     if num_classes < 2:
         raise ValueError(
             f"Se necesitan al menos 2 identidades en {TRAIN_DIR}. "
             "Estructura: data/train/<nombre_persona>/<fotos>.jpg"
         )
 
-    print(f"Identidades en entrenamiento: {num_classes}")
-    train_ds = create_train_dataset(batch_size=BATCH_SIZE)
-    val_ds = create_val_dataset(batch_size=BATCH_SIZE)
+    if is_main:
+        print(f"Identidades en entrenamiento: {num_classes}")
+        if group_size > 1:
+            print(f"Procesos: {group_size} | lote global: {BATCH_SIZE * group_size}")
+    # Cada proceso lee su parte del dataset; los workers de datos se reparten entre
+    # los procesos de la misma máquina
+    workers = max(1, DATASET_WORKERS // group_size)
+    configure_pipeline()
+    shards = {"num_shards": group_size, "shard_id": rank} if group_size > 1 else {}
+    train_ds = create_train_dataset(batch_size=BATCH_SIZE, workers=workers, balanced=args.balanced, **shards)
+    val_ds = create_val_dataset(batch_size=BATCH_SIZE, workers=workers) if is_main else None
 
-    net = FaceBiometricsNet(embedding_dim=EMBEDDING_DIM, num_classes=num_classes)
+    net = FaceBiometricsNet(
+        embedding_dim=EMBEDDING_DIM, num_classes=num_classes, head=args.head, scale=MARGIN_SCALE,
+        backbone=args.backbone,
+    )
+    teacher = load_teacher(args.teacher_dir, EMBEDDING_DIM) if args.distill else None
+    if teacher is not None and is_main:
+        print(f"Destilación: profesor {args.teacher_dir} -> alumno {args.backbone} (peso {args.distill_weight})")
     loss_fn = nn.SoftmaxCrossEntropyWithLogits(sparse=True, reduction="mean")
     opt = nn.Adam(net.trainable_params(), learning_rate=LEARNING_RATE)
+    # En sink mode con sink_size > 0 cada "época" de MindSpore son sink_size pasos:
+    # se ajusta el número de épocas para recorrer los mismos datos
+    steps = train_ds.get_dataset_size()
+    epoch_steps = args.sink_size if args.sink and 0 < args.sink_size < steps else steps
+    epochs = args.epochs * steps // epoch_steps
+    # El manifiesto guarda el paso global, que no depende del sink: se convierte a
+    # épocas de MindSpore con los ajustes de esta ejecución
+    resumed_step = resume_training(net, opt, checkpoint_dir) if args.resume else 0
+    initial_epoch = resumed_step // epoch_steps
+    if resumed_step and is_main:
+        print(f"Reanudando tras el paso {resumed_step} (época {resumed_step / steps:.2f} del dataset)")
 
-    model = Model(network=net, loss_fn=loss_fn, optimizer=opt, metrics={"acc"})
-
-    os.makedirs(CHECKPOINT_DIR, exist_ok=True)
-    ckpt_config = CheckpointConfig(
-        save_checkpoint_steps=train_ds.get_dataset_size(),
-        keep_checkpoint_max=3,
-    )
-    ckpt_cb = ModelCheckpoint(
-        prefix="face_biometrics",
-        directory=CHECKPOINT_DIR,
-        config=ckpt_config,
-    )
+    loss_scale_manager = make_loss_scale_manager(args.amp_level, args.loss_scale, ms.get_context("device_target"))
+    if teacher is not None:
+        # Destilación: el profesor solo interviene en la pérdida de entrenamiento
+        margin = args.head != "softmax"
+        train_loss = MarginSoftmaxLoss(num_classes, BATCH_SIZE, head=args.head, scale=MARGIN_SCALE) if margin else loss_fn
+        model = Model(
+            network=DistillTrainCell(net, teacher, train_loss, weight=args.distill_weight, margin=margin),
+            optimizer=opt,
+            eval_network=nn.WithEvalCell(net, loss_fn),
+            eval_indexes=[0, 1, 2],
+            metrics={"acc"},
+            amp_level=args.amp_level,
+            loss_scale_manager=loss_scale_manager,
+        )
+    elif args.head == "softmax":
+        model = Model(
+            network=net,
+            loss_fn=loss_fn,
+            optimizer=opt,
+            metrics={"acc"},
+            amp_level=args.amp_level,
+            loss_scale_manager=loss_scale_manager,
+        )
+    else:
+        # ArcFace/CosFace: el margen (y el muestreo Partial FC) va en la pérdida de
+        # entrenamiento; la evaluación usa los logits coseno de net.classifier
+        margin_loss = MarginSoftmaxLoss(num_classes, BATCH_SIZE, head=args.head, scale=MARGIN_SCALE)
+        model = Model(
+            network=MarginTrainCell(net, margin_loss),
+            optimizer=opt,
+            eval_network=nn.WithEvalCell(net, loss_fn),
+            eval_indexes=[0, 1, 2],
+            metrics={"acc"},
+            amp_level=args.amp_level,
+            loss_scale_manager=loss_scale_manager,
+        )
 
-    print("Iniciando entrenamiento local...")
+    callbacks = []
+    if is_main:
+        # Solo el proceso 0 escribe checkpoints (los pesos son iguales en todos).
+        # model_config.json se escribe antes de entrenar para poder usar los
+        # checkpoints de un entrenamiento interrumpido
+        os.makedirs(checkpoint_dir, exist_ok=True)
+        config_path = os.path.join(checkpoint_dir, "model_config.json")
+        with open(config_path, "w") as f:
+            json.dump({"num_classes": num_classes, "embedding_dim": EMBEDDING_DIM, "head": args.head,
+                       "backbone": args.backbone}, f)
+        eval_fn = (lambda: model.eval(val_ds, dataset_sink_mode=False)) if val_ds is not None else None
+        ckpt_cb = CheckpointManager(checkpoint_dir, eval_fn=eval_fn, reset=not args.resume, exclude=("teacher.",))
+        callbacks = [LossMonitor(50), TimeMonitor(50), ckpt_cb, ThroughputMonitor(BATCH_SIZE * group_size)]
+        print(f"Iniciando entrenamiento local (AMP {args.amp_level}, sink mode: {args.sink})...")
     model.train(
-        EPOCHS,
+        epochs,
         train_ds,
-        callbacks=[LossMonitor(50), TimeMonitor(50), ckpt_cb],
-        dataset_sink_mode=False,
+        callbacks=callbacks,
+        dataset_sink_mode=args.sink,
+        sink_size=args.sink_size if args.sink else -1,
+        initial_epoch=initial_epoch,
     )
+    if not is_main:
+        return
 
     if val_ds is not None:
         acc = model.eval(val_ds, dataset_sink_mode=False)
         print(f"Precisión en validación: {acc}")
 
-    # Guardar config para inferencia (num_classes, embedding_dim)
-    config_path = os.path.join(CHECKPOINT_DIR, "model_config.json")
-    with open(config_path, "w") as f:
-        json.dump({"num_classes": num_classes, "embedding_dim": EMBEDDING_DIM}, f)
     print(f"Config guardada en: {config_path}")
-    print(f"Checkpoints guardados en: {CHECKPOINT_DIR}")
+    print(f"Checkpoints guardados en: {checkpoint_dir}")
 
 
 if __name__ == "__main__":